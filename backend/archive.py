@@ -0,0 +1,290 @@
+import os
+import re
+import sys
+from contextlib import contextmanager
+from datetime import date
+
+import clock
+
+# 🗄️ Archivage mensuel : les mois clos de presence_log / presence_journaliere quittent
+# la base principale pour un fichier par mois (archives/presence_AAAA-MM.db), relu
+# par ATTACH quand une plage historique est demandée. Les tables chaudes et leurs
+# index restent ainsi petits quelle que soit l'ancienneté de l'installation.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archives"))
+ARCHIVE_HOT_MONTHS = int(os.getenv("ARCHIVE_HOT_MONTHS", "3"))              # mois gardés, mois courant compris
+ARCHIVE_RETENTION_MONTHS = int(os.getenv("ARCHIVE_RETENTION_MONTHS", "0"))  # 0 = archives conservées
+ARCHIVE_CHUNK = int(os.getenv("ARCHIVE_CHUNK", "5000"))                     # lignes supprimées par transaction
+ARCHIVE_EVERY_HOURS = float(os.getenv("ARCHIVE_EVERY_HOURS", "0"))          # archivage périodique, 0 = manuel
+ARCHIVE_WRITE_TIMEOUT = float(os.getenv("ARCHIVE_WRITE_TIMEOUT", "30"))      # attente max d'un paquet en file (s)
+
+# Table archivée → colonne horodatée (secondes UTC) qui la partitionne
+TABLES = {
+    "presence_log": "ts",
+    "presence_journaliere": "entry_ts",
+}
+# Colonnes entières de la migration 9 → texte d'origine, pour les archives plus anciennes
+DERIVED = {"ts": "date_heure", "entry_ts": "entry_time", "exit_ts": "exit_time"}
+# Textes d'affichage relus depuis leur horodatage : les archives écrites avant la
+# migration 13 gardent l'heure du serveur dans ces textes
+DISPLAY = {
+    "date_heure": ("ts", clock.sql_format),
+    "date": ("entry_ts", clock.sql_day),
+    "entry_time": ("entry_ts", clock.sql_format),
+    "exit_time": ("exit_ts", clock.sql_format),
+}
+
+ALIAS = "archive"
+_MONTH = re.compile(r"^presence_(\d{4}-\d{2})\.db$")
+
+
+def month_of(day: date) -> str:
+    return day.strftime("%Y-%m")
+
+
+def shift_month(month: str, delta: int) -> str:
+    year, mon = map(int, month.split("-"))
+    index = year * 12 + mon - 1 + delta
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def month_bounds(month: str):
+    # [premier jour du mois, premier jour du mois suivant[ en texte (clés des cumuls)
+    return f"{month}-01", f"{shift_month(month, 1)}-01"
+
+
+def month_range(month: str):
+    # Même mois en secondes UTC, heure du site : bornes des colonnes de TABLES
+    low, high = month_bounds(month)
+    return clock.midnight(date.fromisoformat(low)), clock.midnight(date.fromisoformat(high))
+
+
+def months_between(start: date, end: date):
+    months, month = [], month_of(start)
+    while month <= month_of(end):
+        months.append(month)
+        month = shift_month(month, 1)
+    return months
+
+
+def segments(start: date, end: date, directory=None):
+    # Plage [start, end] découpée en (début, fin exclue, mois archivé ou None), bornes
+    # en secondes UTC ; les mois encore chauds consécutifs forment un seul segment
+    first, last = clock.day_bounds(start, end)
+    result = []
+    for month in months_between(start, end):
+        low, high = month_range(month)
+        low, high = max(low, first), min(high, last)
+        archived = month if has_archive(month, directory) else None
+        if archived is None and result and result[-1][2] is None:
+            result[-1] = (result[-1][0], high, None)
+        else:
+            result.append((low, high, archived))
+    return result
+
+
+def archive_path(month: str, directory=None) -> str:
+    return os.path.join(directory or ARCHIVE_DIR, f"presence_{month}.db")
+
+
+def archived_months(directory=None):
+    directory = directory or ARCHIVE_DIR
+    if not os.path.isdir(directory):
+        return []
+    return sorted(m.group(1) for m in map(_MONTH.match, os.listdir(directory)) if m)
+
+
+def has_archive(month: str, directory=None) -> bool:
+    return os.path.exists(archive_path(month, directory))
+
+
+def _columns(conn, schema, table):
+    return [c[1] for c in conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()]
+
+
+@contextmanager
+def attached(conn, month: str, directory=None):
+    # ATTACH du mois s'il est archivé (jamais de création de fichier vide) ; DETACH en sortie
+    path = archive_path(month, directory) if month else None
+    if path is None or not os.path.exists(path):
+        yield None
+        return
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS}", (path,))
+    try:
+        yield ALIAS
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"DETACH DATABASE {ALIAS}")
+
+
+def select_columns(conn, schema, table):
+    # Colonnes de la table chaude lues dans `schema` : les absentes (archive plus ancienne)
+    # sont recalculées depuis leur texte (DERIVED) ou NULL ; les textes d'affichage depuis
+    # leur horodatage (DISPLAY)
+    present = set(_columns(conn, schema, table))
+    columns = _columns(conn, "main", table)
+
+    def epoch(c):
+        if c in present:
+            return c
+        return clock.sql_epoch(DERIVED[c]) if DERIVED.get(c) in present else None
+
+    def select(c):
+        if c in DISPLAY and c in present and epoch(DISPLAY[c][0]) is not None:
+            source, render = DISPLAY[c]
+            return f"COALESCE({render(epoch(source))}, {c}) AS {c}"
+        if c in present:
+            return c
+        return f"{epoch(c) or 'NULL'} AS {c}"
+
+    return columns, ", ".join(select(c) for c in columns)
+
+
+def union_source(conn, table: str) -> str:
+    # Lignes archivées + retardataires restées dans la table chaude (scans hors ligne rejoués)
+    columns, select = select_columns(conn, ALIAS, table)
+    return f"(SELECT {select} FROM {ALIAS}.{table} UNION ALL SELECT {', '.join(columns)} FROM main.{table})"
+
+
+def _prepare_archive(conn):
+    # Même schéma que la table chaude (colonnes ajoutées depuis comprises) et mêmes index
+    for table in TABLES:
+        create = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        conn.execute(re.sub(
+            rf"^CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?\"?{table}\"?",
+            f"CREATE TABLE IF NOT EXISTS {ALIAS}.{table}", create.strip(), flags=re.I
+        ))
+        existing = set(_columns(conn, ALIAS, table))
+        for info in conn.execute(f"PRAGMA main.table_info({table})").fetchall():
+            if info[1] not in existing:
+                conn.execute(f"ALTER TABLE {ALIAS}.{table} ADD COLUMN {info[1]} {info[2]}")
+                if DERIVED.get(info[1]) in existing:
+                    conn.execute(f"UPDATE {ALIAS}.{table} SET {info[1]} = {clock.sql_epoch(DERIVED[info[1]])}")
+        # Index recopiés depuis la base principale : les requêtes par plage restent indexées
+        for (index_sql,) in conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+        ).fetchall():
+            conn.execute(re.sub(
+                r"^CREATE\s+(UNIQUE\s+)?INDEX\s+(IF\s+NOT\s+EXISTS\s+)?\"?(\w+)\"?",
+                lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS {ALIAS}.{m.group(3)}", index_sql.strip(), flags=re.I
+            ))
+    conn.commit()
+
+
+def archive_month(conn, month: str, directory=None, chunk=ARCHIVE_CHUNK, delete=None):
+    # Copie puis suppression, chacune rejouable : une coupure entre les deux ne perd rien.
+    # delete(table, ids) supprime un paquet de la table chaude et renvoie le nombre de lignes :
+    # dans le serveur, par le thread d'écriture (comme les scans) ; par défaut sur `conn`.
+    directory = directory or ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    low, high = month_range(month)
+    moved = {}
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS}", (archive_path(month, directory),))
+    try:
+        _prepare_archive(conn)
+        for table, column in TABLES.items():
+            columns = ", ".join(_columns(conn, "main", table))
+            # Lecture seule de la base principale : les scans ne sont pas bloqués pendant la copie
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {ALIAS}.{table} ({columns})
+                SELECT {columns} FROM main.{table} WHERE {column} >= ? AND {column} < ?
+            """, (low, high))
+            conn.commit()
+
+            # Suppression par paquets, uniquement des lignes bien présentes dans l'archive
+            deleted = 0
+            while True:
+                ids = [r[0] for r in conn.execute(f"""
+                    SELECT t.id FROM main.{table} t
+                    WHERE t.{column} >= ? AND t.{column} < ?
+                      AND EXISTS (SELECT 1 FROM {ALIAS}.{table} a WHERE a.id = t.id)
+                    LIMIT ?
+                """, (low, high, chunk))]
+                if ids:
+                    if delete is not None:
+                        deleted += delete(table, ids)
+                    else:
+                        deleted += delete_rows(conn.cursor(), table, ids)
+                        conn.commit()
+                if len(ids) < chunk:
+                    break
+            moved[table] = deleted
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"DETACH DATABASE {ALIAS}")
+    return moved
+
+
+def delete_rows(cursor, table, ids):
+    # Un paquet de lignes déjà copiées (sans commit)
+    cursor.execute(f"DELETE FROM main.{table} WHERE id IN ({', '.join('?' * len(ids))})", ids)
+    return cursor.rowcount
+
+
+def months_to_archive(conn, today: date, hot_months=ARCHIVE_HOT_MONTHS):
+    # Mois clos plus anciens que les `hot_months` derniers, présents dans une table chaude
+    cutoff = shift_month(month_of(today), -(max(1, hot_months) - 1))
+    months = set()
+    for table, column in TABLES.items():
+        oldest = conn.execute(
+            f"SELECT MIN({column}) FROM {table} WHERE {column} < ?", (month_range(cutoff)[0],)
+        ).fetchone()[0]
+        if oldest is None:
+            continue
+        month = month_of(clock.from_epoch(oldest))
+        while month < cutoff:
+            low, high = month_range(month)
+            if conn.execute(
+                f"SELECT 1 FROM {table} WHERE {column} >= ? AND {column} < ? LIMIT 1", (low, high)
+            ).fetchone():
+                months.add(month)
+            month = shift_month(month, 1)
+    return sorted(months)
+
+
+def apply_retention(today: date, retention_months=ARCHIVE_RETENTION_MONTHS, directory=None):
+    if retention_months <= 0:
+        return []
+    limit = shift_month(month_of(today), -retention_months)
+    removed = []
+    for month in archived_months(directory):
+        if month < limit:
+            os.remove(archive_path(month, directory))
+            removed.append(month)
+    return removed
+
+
+def drop_all(directory=None):
+    # Effacement total (reset_presence, wipe_all) : l'historique archivé part aussi
+    removed = archived_months(directory)
+    for month in removed:
+        os.remove(archive_path(month, directory))
+    return removed
+
+
+def run(conn, today=None, hot_months=ARCHIVE_HOT_MONTHS, retention_months=ARCHIVE_RETENTION_MONTHS, directory=None,
+        delete=None):
+    today = today or clock.today()
+    archived = {}
+    for month in months_to_archive(conn, today, hot_months):
+        archived[month] = archive_month(conn, month, directory, delete=delete)
+    return {"archived": archived, "expired": apply_retention(today, retention_months, directory)}
+
+
+if __name__ == "__main__":
+    # python archive.py  → archive les mois clos de DB_FILE puis applique la rétention
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    with main.db_pool.connection() as conn:
+        report = run(conn)
+    for month, moved in report["archived"].items():
+        print(f"✅ {month} archivé : {moved}")
+    for month in report["expired"]:
+        print(f"🗑️ archive {month} supprimée (rétention {ARCHIVE_RETENTION_MONTHS} mois)")
+    if not report["archived"] and not report["expired"]:
+        print("Rien à archiver")
@@ -0,0 +1,72 @@
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+# 🕰️ Horloge unique de l'application : toute heure est celle du site (GMT+3 par défaut),
+# stockée en secondes UTC entières dans les colonnes *_ts (presence_log.ts,
+# entry_ts / exit_ts). Ce sont les seules colonnes comparées et indexées ; les textes
+# "AAAA-MM-JJ HH:MM:SS" ne servent plus qu'à l'affichage et aux exports.
+SITE_TZ_OFFSET_MINUTES = int(os.getenv("SITE_TZ_OFFSET_MINUTES", "180"))
+SITE_TZ = timezone(timedelta(minutes=SITE_TZ_OFFSET_MINUTES))
+FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def server_offset_minutes() -> int:
+    return int(datetime.now().astimezone().utcoffset().total_seconds() // 60)
+
+
+# Avant la migration 9, les textes étaient écrits à l'heure locale du serveur
+LEGACY_TZ_OFFSET_MINUTES = int(os.getenv("LEGACY_TZ_OFFSET_MINUTES", str(server_offset_minutes())))
+
+
+def now() -> datetime:
+    return datetime.now(SITE_TZ)
+
+
+def today() -> date:
+    return now().date()
+
+
+def local(moment: datetime) -> datetime:
+    # Un horodatage sans fuseau (tablette hors ligne) est lu à l'heure du site
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=SITE_TZ)
+    return moment.astimezone(SITE_TZ)
+
+
+def epoch(moment: datetime) -> int:
+    return int(local(moment).timestamp())
+
+
+def from_epoch(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts, SITE_TZ)
+
+
+def format(moment) -> str:
+    # datetime ou secondes UTC → texte d'affichage, heure du site
+    if not isinstance(moment, datetime):
+        moment = from_epoch(moment)
+    return local(moment).strftime(FORMAT)
+
+
+def midnight(day: date, tz=SITE_TZ) -> int:
+    return int(datetime.combine(day, time(), tz).timestamp())
+
+
+def day_bounds(start: date, end: date = None, tz=SITE_TZ):
+    # [minuit de start, minuit du lendemain de end[ en secondes UTC : bornes d'index
+    return midnight(start, tz), midnight((end or start) + timedelta(days=1), tz)
+
+
+def sql_format(column: str) -> str:
+    # Secondes UTC → texte d'affichage, heure du site, en SQL (NULL reste NULL)
+    return f"strftime('{FORMAT}', {column} + {SITE_TZ_OFFSET_MINUTES * 60}, 'unixepoch')"
+
+
+def sql_day(column: str) -> str:
+    # Secondes UTC → jour "AAAA-MM-JJ" du site, en SQL
+    return f"date({column} + {SITE_TZ_OFFSET_MINUTES * 60}, 'unixepoch')"
+
+
+def sql_epoch(column: str, offset_minutes: int = LEGACY_TZ_OFFSET_MINUTES) -> str:
+    # Texte "AAAA-MM-JJ HH:MM:SS" → secondes UTC, en SQL (reprise des anciennes lignes)
+    return f"CAST(strftime('%s', {column}, '{-offset_minutes:+d} minutes') AS INTEGER)"
@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import InstrumentedConnection, DB_POOL_ACQUIRE
+from profiling import run_traced
+
+# ⚙️ Réglages du pool (surchargeables par variables d’environnement)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+DB_METRICS = os.getenv("DB_METRICS", "1") != "0"  # chronométrage par requête SQL (metrics.py)
+# Travail SQLite simultané depuis les routes async : lectures/écritures courtes d'un
+# côté, opérations admin sur des tables entières de l'autre (une place du pool chacune)
+DB_ADMIN_CONCURRENCY = int(os.getenv("DB_ADMIN_CONCURRENCY", "1"))
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", str(max(1, DB_POOL_SIZE - DB_ADMIN_CONCURRENCY))))
+# Lectures des tableaux de bord (GET) : connexions en lecture seule et threads à part,
+# un par cœur par défaut (SQLite relâche le GIL pendant l'exécution des requêtes)
+DB_READ_CONCURRENCY = int(os.getenv("DB_READ_CONCURRENCY", str(os.cpu_count() or 4)))
+
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -DB_CACHE_SIZE_KB,  # valeur négative = taille en KiB
+    "mmap_size": DB_MMAP_SIZE,
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+    "temp_store": "MEMORY",
+}
+
+# Connexions en lecture seule (mode=ro) : le mode WAL est déjà fixé par la base
+READ_PRAGMAS = {
+    "cache_size": -DB_CACHE_SIZE_KB,
+    "mmap_size": DB_MMAP_SIZE,
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+    "temp_store": "MEMORY",
+    "query_only": 1,
+}
+
+
+class ConnectionPool:
+    # Pool borné de connexions longue durée. Avec size=0, chaque emprunt ouvre
+    # puis ferme sa propre connexion (comportement historique, utile pour comparer).
+    # readonly=True : connexions ouvertes en mode=ro, pour les lectures seules.
+
+    def __init__(self, path, size=DB_POOL_SIZE, pragmas=None, timeout=DB_POOL_TIMEOUT,
+                 factory=None, readonly=False):
+        self.path = path
+        self.size = size
+        self.readonly = readonly
+        self.pragmas = pragmas if pragmas is not None else (READ_PRAGMAS if readonly else DEFAULT_PRAGMAS)
+        self.timeout = timeout
+        self.factory = factory or (InstrumentedConnection if DB_METRICS else sqlite3.Connection)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            f"{Path(self.path).absolute().as_uri()}?mode=ro" if self.readonly else self.path,
+            uri=self.readonly,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE,
+            factory=self.factory,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _acquire(self):
+        if self.size <= 0:
+            return self._connect()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Pool de connexions SQLite épuisé")
+
+    def _release(self, conn):
+        if self.size <= 0:
+            conn.close()
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        start = time.perf_counter()
+        conn = self._acquire()
+        DB_POOL_ACQUIRE.observe(time.perf_counter() - start)
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def dedicated(self):
+        # Connexion réglée comme celles du pool mais hors pool : pour les longs
+        # flux (exports) qui ne doivent pas monopoliser une place du pool
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+
+@contextmanager
+def snapshot(conn):
+    # Plusieurs SELECT lus dans le même instantané WAL (version et lignes cohérentes) ;
+    # pas d'ATTACH possible à l'intérieur (voir archive.attached)
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+
+
+class AsyncDatabase:
+    # Accès aux données pour les routes async : aucun appel sqlite3 ne tourne dans
+    # la boucle asyncio. Chaque appel emprunte une connexion du pool dans un
+    # exécuteur borné ; les opérations admin ont leur propre exécuteur, si bien
+    # qu'un UPDATE de toute la table ne prive jamais les scans et lectures de threads.
+    # Les lectures des tableaux de bord (read) ont elles aussi leurs threads et leur
+    # pool en lecture seule : un rapport lourd ne retarde jamais un pointage.
+
+    def __init__(self, pool, writer, concurrency=DB_MAX_CONCURRENCY, admin_concurrency=DB_ADMIN_CONCURRENCY,
+                 readers=None, read_concurrency=DB_READ_CONCURRENCY):
+        self.pool = pool
+        self.writer = writer
+        self.concurrency = max(1, concurrency)
+        self.admin_concurrency = max(1, admin_concurrency)
+        self.read_concurrency = max(1, read_concurrency)
+        self.readers = readers or ConnectionPool(pool.path, size=self.read_concurrency, readonly=True)
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, kind):
+        # Créés à la demande : close() puis réutilisation (tests, benchmarks) restent possibles
+        with self._lock:
+            executor = self._executors.get(kind)
+            if executor is None:
+                workers = {"admin": self.admin_concurrency, "read": self.read_concurrency}.get(kind, self.concurrency)
+                executor = ThreadPoolExecutor(workers, thread_name_prefix=f"db-{kind}")
+                self._executors[kind] = executor
+            return executor
+
+    async def _submit(self, kind, fn, *args):
+        # Le contexte (contextvars) de la requête suit le travail dans le thread
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor(kind), functools.partial(context.run, run_traced, fn, *args)
+        )
+
+    def _with_connection(self, fn, *args):
+        with self.pool.connection() as conn:
+            return fn(conn, *args)
+
+    def _with_reader(self, fn, *args):
+        with self.readers.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn, *args):
+        # fn(conn, *args) : lectures et écritures courtes du chemin des scans et de l'annuaire
+        return await self._submit("default", self._with_connection, fn, *args)
+
+    async def read(self, fn, *args):
+        # fn(conn, *args) : lectures des routes GET, connexion en lecture seule
+        return await self._submit("read", self._with_reader, fn, *args)
+
+    async def render(self, fn, *args):
+        # fn(*args) sans connexion : sérialisation des réponses GET, sur les threads de lecture
+        return await self._submit("read", fn, *args)
+
+    async def admin(self, fn, *args):
+        # fn(conn, *args) : opérations longues sur des tables entières
+        return await self._submit("admin", self._with_connection, fn, *args)
+
+    async def call(self, fn, *args):
+        # Travail bloquant sans connexion (parsing, validation)
+        return await self._submit("default", fn, *args)
+
+    async def write(self, fn, *args, timeout=None):
+        # fn(cursor, *args) exécuté par le thread d'écriture unique (writer.WriteQueue).
+        # Le délai ne borne que l'attente en file : un job encore en file est annulé (le
+        # thread d'écriture l'ignore), un job déjà commencé est attendu jusqu'au bout,
+        # sinon l'appelant recevrait une erreur pour une écriture bel et bien faite.
+        job = self.writer.submit(fn, *args)
+        future = asyncio.wrap_future(job)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if job.cancel():
+                raise
+            return await future
+
+    def close(self):
+        with self._lock:
+            executors = list(self._executors.values())
+            self._executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=True)
+        self.readers.close_all()
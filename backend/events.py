@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+
+# ⚙️ Réglages du hub d’événements
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "1000"))
+EVENTS_CLIENT_BUFFER = int(os.getenv("EVENTS_CLIENT_BUFFER", "256"))
+
+# Marqueurs envoyés à la place d'un événement
+OVERFLOW = "overflow"  # client trop lent : il doit se reconnecter avec Last-Event-ID
+RESYNC = "resync"      # Last-Event-ID sorti de l'historique : il doit tout recharger
+
+
+def format_sse(event_id, event_type, payload) -> str:
+    # Sans id, le navigateur conserve le dernier Last-Event-ID reçu
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event_type}\ndata: {payload}\n\n"
+
+
+class Subscriber:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def push(self, message):
+        # Exécuté dans la boucle asyncio
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Pas de mémoire illimitée pour un client lent : on vide et on le déconnecte
+            self.closed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class EventHub:
+    # Diffusion en mémoire : un événement est sérialisé une fois puis copié
+    # dans la file bornée de chaque client abonné.
+
+    def __init__(self, history=EVENTS_HISTORY, client_buffer=EVENTS_CLIENT_BUFFER):
+        self.client_buffer = client_buffer
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._loop = None
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def publish(self, event_type, data):
+        # Appelable depuis n'importe quel thread (routes sync du threadpool)
+        with self._lock:
+            self._seq += 1
+            message = format_sse(self._seq, event_type, json.dumps(data, ensure_ascii=False))
+            self._history.append((self._seq, message))
+            subscribers = list(self._subscribers)
+        if self._loop is None or not subscribers:
+            return
+        for subscriber in subscribers:
+            self._loop.call_soon_threadsafe(subscriber.push, message)
+
+    def subscribe(self, last_event_id=None):
+        subscriber = Subscriber(self.client_buffer)
+        with self._lock:
+            backlog = []
+            if last_event_id is not None:
+                if self._history and last_event_id < self._history[0][0] - 1:
+                    backlog.append(RESYNC)
+                elif last_event_id > self._seq:
+                    backlog.append(RESYNC)  # serveur redémarré depuis
+                else:
+                    backlog.extend(message for seq, message in self._history if seq > last_event_id)
+            self._subscribers.add(subscriber)
+        return subscriber, backlog
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def client_count(self):
+        return len(self._subscribers)
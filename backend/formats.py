@@ -0,0 +1,119 @@
+import json
+import os
+import zlib
+
+# Encodeurs rapides facultatifs : sans eux, json de la bibliothèque standard et pas de
+# MessagePack ni de brotli (pip install orjson msgpack brotli)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 📦 Représentations des listes (/api/students, /api/logs) : JSON classique (un objet par
+# ligne, clés répétées), JSON en colonnes {columns, rows} ou MessagePack (même forme en
+# colonnes). Choix par ?format= ou par l'en-tête Accept ; réponses compressées (brotli,
+# sinon gzip) au-delà de COMPRESS_MIN_BYTES si le client l'accepte.
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "4"))  # à peine plus gros qu'en 6, bien moins de CPU
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))  # 11 par défaut dans brotli : trop lent à la volée
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columns": "application/vnd.baobab.columns+json",
+    "msgpack": "application/msgpack",
+}
+VARY = "Accept, Accept-Encoding"
+ACCEPTED = {**{media: fmt for fmt, media in MEDIA_TYPES.items()}, "application/x-msgpack": "msgpack"}
+
+
+def available(fmt: str) -> bool:
+    return fmt in MEDIA_TYPES and (fmt != "msgpack" or msgpack is not None)
+
+
+def _preferences(header):
+    # "a/b;q=0.5, c/d" → valeurs acceptées (q > 0), q décroissant puis ordre du client
+    found = []
+    for position, part in enumerate((header or "").split(",")):
+        value, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        if value and q > 0:
+            found.append((-q, position, value.lower()))
+    return [value for _, _, value in sorted(found)]
+
+
+def negotiate(accept, requested=None) -> str:
+    # ?format= prioritaire (ValueError si inconnu ou indisponible) ; sinon Accept, JSON par défaut
+    if requested is not None:
+        if not available(requested):
+            raise ValueError(requested)
+        return requested
+    for media in _preferences(accept):
+        fmt = ACCEPTED.get(media)
+        if fmt is not None and available(fmt):
+            return fmt
+        if media in ("*/*", "application/*"):
+            return "json"
+    return "json"
+
+
+def negotiate_encoding(accept_encoding):
+    accepted = _preferences(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def shape(fmt: str, envelope: dict, columns, rows):
+    # La clé "data" de l'enveloppe devient la liste d'objets ou, en colonnes, columns + rows
+    payload = {}
+    for key, value in envelope.items():
+        if key != "data":
+            payload[key] = value
+        elif fmt == "json":
+            payload["data"] = [dict(zip(columns, row)) for row in rows]
+        else:
+            payload["columns"] = list(columns)
+            payload["rows"] = rows
+    return payload
+
+
+def encode(fmt: str, payload) -> bytes:
+    if fmt == "msgpack":
+        return msgpack.packb(payload, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def compress(body: bytes, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    gzipper = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return gzipper.compress(body) + gzipper.flush()
+
+
+def render(fmt: str, encoding, envelope: dict, columns, rows, headers=None):
+    # Octets prêts à envoyer et en-têtes (les caches HTTP distinguent format et compression)
+    body = encode(fmt, shape(fmt, envelope, columns, rows))
+    headers = {**(headers or {}), "Content-Type": MEDIA_TYPES[fmt], "Vary": VARY}
+    if encoding is not None and len(body) >= COMPRESS_MIN_BYTES:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return body, headers
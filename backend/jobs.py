@@ -0,0 +1,186 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+import clock
+
+# 🧹 Tâches d'administration en arrière-plan (reset_presence, reset_entry_exit, wipe_all).
+# Chaque étape traite JOB_CHUNK lignes par job du thread d'écriture : la transaction
+# reste courte et les scans en file passent entre deux paquets. Suivi par GET /api/jobs/{id}.
+JOB_CHUNK = int(os.getenv("JOB_CHUNK", "500"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "50"))  # tâches terminées gardées pour le suivi
+
+
+class Step:
+    # chunk(cursor, state, *args) -> (lignes traitées, état suivant ou None une fois terminé)
+    def __init__(self, label, total, chunk, *args, state=0):
+        self.label = label
+        self.total = total
+        self.chunk = chunk
+        self.args = args
+        self.state = state
+        self.done = 0
+        self.site = None  # base par site (voir shards.py) ; None = base unique
+        self.db = None
+
+    def to_dict(self):
+        step = {"label": self.label, "total": self.total, "done": self.done}
+        if self.site is not None:
+            step["site"] = self.site
+        return step
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = "pending"
+        self.steps = []
+        self.result = None
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def running(self):
+        return self.status in ("pending", "running")
+
+    def to_dict(self):
+        total = sum(s.total for s in self.steps)
+        done = sum(min(s.done, s.total) for s in self.steps)
+        progress = 1.0 if self.status == "done" else (round(done / total, 4) if total else 0.0)
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": progress,
+            "done": done,
+            "total": total,
+            "steps": [s.to_dict() for s in self.steps],
+            "started_at": clock.format(int(self.started_at)),
+            "finished_at": clock.format(int(self.finished_at)) if self.finished_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobRegistry:
+    def __init__(self, history=JOB_HISTORY):
+        self.history = max(1, history)
+        self._jobs = OrderedDict()
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def active(self):
+        return next((job for job in self._jobs.values() if job.running), None)
+
+    def _add(self, kind):
+        job = Job(kind)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.running:
+                break
+            self._jobs.popitem(last=False)
+        return job
+
+    def start(self, db, kind, plan, finish=None):
+        # plan(conn, job) -> [Step] sur une connexion de lecture ; finish(job) (async) une fois tout traité.
+        # `db` peut être un dict {site: AsyncDatabase} : le plan est alors établi sur chaque base
+        job = self._add(kind)
+        job.task = asyncio.create_task(self._run(db, job, plan, finish))
+        return job
+
+    def track(self, kind, work):
+        # Tâche sans étapes (archivage) : work() (async) occupe la même place que les tâches
+        # à paquets, active() la voit et aucune autre tâche admin ne démarre en parallèle
+        job = self._add(kind)
+        job.task = asyncio.create_task(self._track(job, work))
+        return job
+
+    async def _track(self, job, work):
+        try:
+            job.status = "running"
+            job.result = await work()
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Tâche interrompue"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    async def _run(self, db, job, plan, finish):
+        try:
+            targets = db if isinstance(db, dict) else {None: db}
+            for site, target in targets.items():
+                steps = await target.run(plan, job)
+                for step in steps:
+                    step.site, step.db = site, target
+                job.steps += steps
+            job.status = "running"
+            for step in job.steps:
+                while step.state is not None:
+                    # Sans délai d'attente : un paquet abandonné tournerait quand même plus tard
+                    processed, step.state = await step.db.write(step.chunk, step.state, *step.args)
+                    step.done += processed
+                step.total = max(step.total, step.done)
+            job.result = await finish(job) if finish else None
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Tâche interrompue"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def cancel_all(self):
+        for job in self._jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+
+
+# 🔪 Paquets génériques
+def count_rows(conn, table, key="rowid", upto=None):
+    if upto is None:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {key} <= ?", (upto,)).fetchone()[0]
+
+
+def max_key(conn, table, key="rowid"):
+    return conn.execute(f"SELECT MAX({key}) FROM {table}").fetchone()[0] or 0
+
+
+def delete_chunk(cursor, state, table, key="rowid", upto=None):
+    # Supprime au plus JOB_CHUNK lignes ; `upto` borne aux lignes présentes au lancement
+    # (les scans arrivés pendant la tâche sont conservés). `key` peut être une clé composée
+    # pour les tables WITHOUT ROWID.
+    where, params = ("", ()) if upto is None else (f"WHERE {key} <= ?", (upto,))
+    cursor.execute(
+        f"DELETE FROM {table} WHERE ({key}) IN (SELECT {key} FROM {table} {where} LIMIT ?)",
+        params + (JOB_CHUNK,)
+    )
+    deleted = cursor.rowcount
+    return deleted, (state if deleted >= JOB_CHUNK else None)
+
+
+def next_ids(cursor, table, after, upto):
+    # Paquet suivant d'une table parcourue par id croissant : (nombre de lignes, dernier id)
+    rows = cursor.execute(
+        f"SELECT id FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?", (after, upto, JOB_CHUNK)
+    ).fetchall()
+    return len(rows), (rows[-1][0] if rows else None)
+
+
+def next_state(count, last):
+    return last if count >= JOB_CHUNK else None
@@ -1,18 +1,154 @@
-from fastapi import FastAPI, Request, HTTPException, Path
+from fastapi import FastAPI, Request, HTTPException, Path, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from typing import List, Optional
 from zoneinfo import ZoneInfo
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, date, timedelta
 import sqlite3
 import os
 import hashlib
+import threading
+import base64
+import json
+import logging
+import asyncio
+import concurrent.futures
+import csv
+import io
+import heapq
+import zlib
+import re
+from itertools import chain, islice
+
+from database import ConnectionPool, AsyncDatabase, snapshot
+from migrations import migrate
+from events import EventHub, OVERFLOW, RESYNC, format_sse
+from response_cache import ResponseCache
+from writer import WriteQueue
+import metrics
+import profiling
+import archive
+import clock
+import formats
+import jobs
+import overtime
+import presence
+import shards
+
+# 📝 Journal du serveur : celui d'uvicorn (démarrage, erreurs), sur la sortie d'erreur
+log = logging.getLogger("uvicorn.error")
 
 def hash_matricule(matricule: str) -> str:
     return hashlib.sha256(str(matricule).encode()).hexdigest()
 
+# Matricule tel que la colonne INTEGER le stocke ("0105", " +105 " → "105") : le hash
+# (QR code) est celui de la valeur relue par les clients, jamais celui du texte saisi
+INTEGER_LITERAL = re.compile(r"\s*[+-]?[0-9]+\s*", re.ASCII)
+
+def normalize_matricule(matricule: str) -> str:
+    return str(int(matricule)) if INTEGER_LITERAL.fullmatch(matricule) else matricule
+
+# 🗂️ Cache mémoire hash → matricule (et hash → site avec une base par site),
+# vidé à chaque écriture sur gestion_employe
+_hash_cache = {}
+_site_cache = {}
+_hash_cache_generation = 0
+_hash_cache_lock = threading.Lock()
+
+def invalidate_hash_cache():
+    global _hash_cache_generation
+    with _hash_cache_lock:
+        _hash_cache.clear()
+        _site_cache.clear()
+        _hash_cache_generation += 1
+
+SQL_FIND_BY_HASH = "SELECT Matricule FROM gestion_employe WHERE matricule_hash = ? LIMIT 1"
+
+def find_matricule_by_hash(cursor, student_hash: str):
+    matricule = _hash_cache.get(student_hash)
+    if matricule is not None:
+        metrics.HASH_LOOKUPS.inc("cache")
+        return matricule
+
+    generation = _hash_cache_generation
+    row = cursor.execute(SQL_FIND_BY_HASH, (student_hash,)).fetchone()
+    if not row:
+        metrics.HASH_LOOKUPS.inc("unknown")
+        return None
+    metrics.HASH_LOOKUPS.inc("db")
+
+    # On ne mémorise pas un résultat lu avant une invalidation concurrente
+    with _hash_cache_lock:
+        if generation == _hash_cache_generation:
+            _hash_cache[student_hash] = row[0]
+    return row[0]
+
+# 🔢 Version des données : incrémentée par chaque écriture (ETag et flux de changements)
+def bump_version(cursor, reset: bool = False) -> int:
+    if site_shards is None:
+        cursor.execute("UPDATE sync_state SET version = version + 1 WHERE id = 1")
+        version = cursor.execute("SELECT version FROM sync_state WHERE id = 1").fetchone()[0]
+    else:
+        # Une base par site : numéro tiré de l'horloge commune à tous les sites
+        version = site_shards.versions.next()
+        cursor.execute("UPDATE sync_state SET version = ? WHERE id = 1", (version,))
+    if reset:
+        cursor.execute("UPDATE sync_state SET reset_version = ? WHERE id = 1", (version,))
+    return version
+
+def current_version(cursor):
+    return cursor.execute("SELECT version, reset_version FROM sync_state WHERE id = 1").fetchone()
+
+# 📣 Hub des événements temps réel (/api/events), alimenté après chaque commit
+event_hub = EventHub()
+
+def publish_directory(action: str, version: int, matricule=None):
+    invalidate_responses(matricule)
+    event_hub.publish("directory", {"action": action, "Matricule": matricule, "version": version})
+
+# 📦 Réponses GET déjà sérialisées (annuaire, logs d'un employé) : un rechargement de
+# tableau de bord est une copie mémoire, sans SQL ni JSON. Invalidées après chaque commit,
+# avec les événements : un scan ne périme que les logs de l'employé et les listes qui
+# affichent l'état de présence ; une fiche modifiée, tout l'annuaire et ses logs.
+response_cache = ResponseCache()
+
+def invalidate_responses(matricule=None, scan=False):
+    if scan:
+        response_cache.invalidate("directory", "state")
+    elif matricule is None:
+        response_cache.clear()
+        return
+    else:
+        response_cache.invalidate("directory")
+    response_cache.invalidate("logs", str(matricule))
+
+def cached_response(route, key, tag=None):
+    # Pendant une tâche admin, la base change paquet par paquet : lecture directe
+    if admin_jobs.active() is not None:
+        return None
+    found = response_cache.get(route, key, tag)
+    if found is None:
+        return None
+    body, headers = found
+    return Response(body, headers=headers)
+
+def cache_response(key, token, body: bytes, headers, tag=None) -> Response:
+    response_cache.put(key, token, body, headers, tag)
+    return Response(body, headers=headers)
+
+# 🗜️ Format (?format= ou Accept) et compression (Accept-Encoding) des listes, voir formats.py
+def negotiate_response(request: Request, requested: Optional[str]):
+    if requested is not None and requested not in formats.MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Format inconnu : {requested} (json, columns, msgpack)")
+    try:
+        fmt = formats.negotiate(request.headers.get("accept"), requested)
+    except ValueError:
+        raise HTTPException(status_code=406, detail=f"Format {requested} indisponible sur ce serveur")
+    return fmt, formats.negotiate_encoding(request.headers.get("accept-encoding"))
+
 # 🔐 Mot de passe admin via variable d’environnement
 admin_password = os.getenv("ADMIN_PASSWORD", "baobab123")
 
@@ -37,67 +173,105 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# 📈 Compteurs, durées et requêtes en cours de chaque route (voir metrics.py)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# 🔬 Profilage SQL à la demande (PROFILE=1 ou en-têtes X-Debug-Profile + X-Admin-Password)
+app.add_middleware(
+    profiling.ProfilingMiddleware,
+    admin_password=admin_password,
+    route_template=metrics.route_template
+)
+
 # 📂 Chemin vers la base SQLite
 BASE_DIR = os.path.dirname(__file__)
-DB_FILE = os.path.join(BASE_DIR, "SystemManagement.db")
+DB_FILE = os.getenv("DB_FILE", os.path.join(BASE_DIR, "SystemManagement.db"))
+
+# 🏊 Connexions SQLite longue durée (WAL, cache, mmap) partagées par toutes les routes
+db_pool = ConnectionPool(DB_FILE)
+
+# ✍️ Thread d'écriture unique des scans : les commits sont regroupés (voir writer.py)
+scan_writer = WriteQueue(db_pool)
+SCAN_WRITE_TIMEOUT = float(os.getenv("SCAN_WRITE_TIMEOUT", "10"))
+
+# ⚡ Accès async : le travail SQLite tourne dans des exécuteurs bornés, hors de la boucle
+db = AsyncDatabase(db_pool, scan_writer)
+
+# 🧩 Une base par site si SHARD_DIR est défini (voir shards.py) ; sinon `db` sert tout
+site_shards = shards.ShardSet(shards.SHARD_DIR) if shards.SHARD_DIR else None
+
+def all_shards():
+    # Bases parcourues par les listes, rapports, exports et tâches admin
+    if site_shards is None:
+        return [shards.Shard(None, db_pool, scan_writer, db)]
+    return site_shards.all()
+
+async def run_write(fn, *args, target=None):
+    # `target` : base du site concerné (AsyncDatabase) ; par défaut la base unique
+    try:
+        return await (target or db).write(fn, *args, timeout=SCAN_WRITE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="File d'écriture saturée, réessayez")
+
+# 🧭 Base du site d'un employé : par hash pour les scans, par matricule pour l'annuaire
+async def locate(sql, params, cache_key=None):
+    generation = _hash_cache_generation
+    targets = site_shards.all()
+    found = await asyncio.gather(*(s.db.run(fetch_all, sql, params) for s in targets))
+    shard = next((s for s, rows in zip(targets, found) if rows), None)
+    if shard is not None and cache_key is not None:
+        with _hash_cache_lock:
+            if generation == _hash_cache_generation:
+                _site_cache[cache_key] = shard.site
+    return shard
+
+async def shard_for_hash(student_hash):
+    site = _site_cache.get(student_hash)
+    if site is not None:
+        return site_shards.find(site)
+    return await locate(SQL_FIND_BY_HASH, (student_hash,), student_hash)
+
+async def shard_for_matricule(matricule):
+    return await locate("SELECT 1 FROM gestion_employe WHERE Matricule = ?", (matricule,))
+
+async def site_db(affectation):
+    # Base du site d'une affectation, créée au premier employé du site
+    return (await db.call(site_shards.get, shards.site_of(affectation))).db
 
 # ✅ Route de test pour Render
 @app.get("/api/status")
-def status():
+async def status():
     return {"status": "ok"}
 
-# 🎯 Création et migration des tables au démarrage
+# 🎯 Création et migration des tables au démarrage (voir migrations.py)
 @app.on_event("startup")
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    global search_fts
+    with db_pool.connection() as conn:
+        migrate(conn)
+        employees = conn.execute("SELECT COUNT(*) FROM gestion_employe").fetchone()[0]
+        search_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'employe_fts'").fetchone() is not None
+    scan_writer.start()
+    if site_shards is not None:
+        site_shards.open_all()
+        if employees and not site_shards.all():
+            log.warning("⚠️ %s contient %s employés : lancer `python shards.py split`", DB_FILE, employees)
 
-    cursor.execute("""
-      CREATE TABLE IF NOT EXISTS gestion_employe (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        Matricule INTEGER UNIQUE,
-        Nom TEXT,
-        Prenom TEXT,
-        Emploi TEXT,
-        Affectation TEXT,
-        Numero TEXT,
-        Mail TEXT
-      )
-    """)
-    cols = [c[1] for c in cursor.execute("PRAGMA table_info(gestion_employe)").fetchall()]
-    if "Presence" not in cols:
-        cursor.execute("ALTER TABLE gestion_employe ADD COLUMN Presence INTEGER DEFAULT 0")
-    if "entry_time" not in cols:
-        cursor.execute("ALTER TABLE gestion_employe ADD COLUMN entry_time TEXT")
-    if "exit_time" not in cols:
-        cursor.execute("ALTER TABLE gestion_employe ADD COLUMN exit_time TEXT")
-    if "overtime" not in cols:
-        cursor.execute("ALTER TABLE gestion_employe ADD COLUMN overtime TEXT DEFAULT '0H00'")
-    if "overtime_amount" not in cols:
-        cursor.execute("ALTER TABLE gestion_employe ADD COLUMN overtime_amount INTEGER DEFAULT 0")
-
-    cursor.execute("""
-      CREATE TABLE IF NOT EXISTS presence_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        Matricule INTEGER,
-        date_heure TEXT
-      )
-    """)
+@app.on_event("startup")
+async def bind_event_hub():
+    event_hub.bind(asyncio.get_running_loop())
 
-    cursor.execute("""
-      CREATE TABLE IF NOT EXISTS presence_journaliere (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        Matricule INTEGER,
-        date TEXT,
-        entry_time TEXT,
-        exit_time TEXT,
-        overtime TEXT,
-        overtime_amount INTEGER
-      )
-    """)
-
-    conn.commit()
-    conn.close()
+@app.on_event("shutdown")
+def close_db():
+    if archive_task is not None:
+        archive_task.cancel()
+    admin_jobs.cancel_all()
+    scan_writer.stop()
+    db.close()
+    db_pool.close_all()
+    if site_shards is not None:
+        site_shards.close_all()
+    response_cache.clear()
 
 # 📦 Modèle Pydantic
 class Etudiant(BaseModel):
@@ -120,222 +294,1268 @@ async def login(request: Request):
     else:
         raise HTTPException(status_code=401, detail="Mot de passe incorrect")
 
-# ♻️ API : réinitialiser présences et logs
-@app.post("/api/reset_presence")
+# 🧹 Tâches admin en arrière-plan : paquets courts via le thread d'écriture (voir jobs.py),
+# les scans ne restent jamais bloqués derrière un UPDATE/DELETE de toute une table
+admin_jobs = jobs.JobRegistry()
+
+# Tables WITHOUT ROWID : supprimées par clé primaire
+ROLLUP_KEYS = {"overtime_journalier": "date, Matricule", "overtime_mensuel": "mois, Matricule"}
+
+def start_admin_job(kind, plan, finish):
+    if admin_jobs.active() is not None:
+        raise HTTPException(status_code=409, detail="Une tâche d'administration est déjà en cours")
+    # Une base par site : le plan est établi puis déroulé sur chaque base
+    targets = db if site_shards is None else {s.site: s.db for s in site_shards.all()}
+    # Réponses en cache oubliées au lancement et à la fin, même en cas d'échec
+    response_cache.clear()
+    job = admin_jobs.start(targets, kind, plan, finish)
+    job.task.add_done_callback(lambda _: response_cache.clear())
+    return job
+
+def read_version(conn):
+    return current_version(conn.cursor())[0]
+
+async def latest_version():
+    if site_shards is None:
+        return await db.run(read_version)
+    return site_shards.versions.value
+
+def drop_archives():
+    for shard in all_shards():
+        archive.drop_all(shard.archive_dir)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = admin_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Tâche introuvable")
+    return job.to_dict()
+
+# ♻️ API : réinitialiser présences et logs (tâche de fond, cumuls sauvegardés si "snapshot")
+@app.post("/api/reset_presence", status_code=202)
 async def reset_presence(request: Request):
     data = await request.json()
     if data.get("password") != admin_password:
         raise HTTPException(status_code=401, detail="Mot de passe admin incorrect")
+    snapshot = bool(data.get("snapshot"))
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    try:
+    async def finish(job):
+        await db.call(drop_archives)
+        publish_directory("reset_presence", await latest_version())
+        return {"snapshot_id": job.id if snapshot else None}
+
+    job = start_admin_job("reset_presence", lambda conn, job: plan_reset_presence(conn, job, snapshot), finish)
+    return {"status": "ok", "message": "Réinitialisation des présences, HS et logs lancée", "job_id": job.id}
+
+def plan_reset_presence(conn, job, snapshot):
+    # Bornes prises au lancement : les scans arrivés pendant la tâche sont conservés
+    upto = {t: jobs.max_key(conn, t, "id") for t in ("gestion_employe", "presence_log", "presence_journaliere")}
+    taken_at = clock.format(clock.now())
+    steps = [jobs.Step(
+        "gestion_employe", jobs.count_rows(conn, "gestion_employe", "id", upto["gestion_employe"]),
+        reset_presence_chunk, upto["gestion_employe"], (job.id, taken_at) if snapshot else None
+    )]
+    for table in ("presence_log", "presence_journaliere"):
+        steps.append(jobs.Step(
+            table, jobs.count_rows(conn, table, "id", upto[table]), jobs.delete_chunk, table, "id", upto[table]
+        ))
+    for table, key in ROLLUP_KEYS.items():
+        steps.append(jobs.Step(table, jobs.count_rows(conn, table), jobs.delete_chunk, table, key))
+    return steps
+
+def reset_presence_chunk(cursor, after, upto, snapshot):
+    count, last = jobs.next_ids(cursor, "gestion_employe", after, upto)
+    if not count:
+        return 0, None
+    if snapshot:
+        # Instantané et remise à zéro dans le même paquet : aucun scan ne s'intercale
         cursor.execute("""
-            UPDATE gestion_employe
-            SET Presence = 0,
-                entry_time = NULL,
-                exit_time = NULL,
-                overtime = '0H00',
-                overtime_amount = 0
-        """)
-        cursor.execute("DELETE FROM presence_log")
-        cursor.execute("DELETE FROM presence_journaliere")
-        conn.commit()
-        return {"status": "ok", "message": "Présences, HS et logs réinitialisés"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
-    finally:
-        conn.close()
-# 📡 API : marquer la présence, gérer entrée/sortie et heures sup.
-@app.post("/api/mark_presence/{student_id}")
-def mark_presence(student_id: str):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+            INSERT OR IGNORE INTO presence_snapshot
+            (snapshot_id, taken_at, Matricule, Nom, Prenom, Affectation, Presence, overtime_minutes, overtime_amount)
+            SELECT ?, ?, g.Matricule, g.Nom, g.Prenom, g.Affectation,
+                   COALESCE(s.Presence, 0), COALESCE(s.overtime_minutes, 0), COALESCE(s.overtime_amount, 0)
+            FROM gestion_employe g
+            LEFT JOIN presence_state s ON s.Matricule = g.Matricule
+            WHERE g.id > ? AND g.id <= ?
+        """, snapshot + (after, last))
+    version = bump_version(cursor)
+    cursor.execute("""
+        UPDATE presence_state
+        SET Presence = 0,
+            entry_ts = NULL,
+            exit_ts = NULL,
+            day_overtime_minutes = 0,
+            overtime_minutes = 0,
+            overtime_amount = 0,
+            version = ?
+        WHERE Matricule IN (SELECT Matricule FROM gestion_employe WHERE id > ? AND id <= ?)
+    """, (version, after, last))
+    return count, jobs.next_state(count, last)
 
-    # 🔍 Trouver l'employé dont le hash SHA256(matricule) correspond
-    cursor.execute("SELECT Matricule FROM gestion_employe")
-    all_matricules = cursor.fetchall()
-    matched_id = None
-    for (matricule,) in all_matricules:
-        if hash_matricule(matricule) == student_id:
-            matched_id = matricule
-            break
-
-    if not matched_id:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Matricule crypté non reconnu")
+# 🧮 API : recalcul des HS d'une plage depuis presence_log (tâche de fond, voir overtime.py).
+# Toujours avec la règle en vigueur (OVERTIME_POLICY), celle des scans suivants : pour en
+# changer, modifier OVERTIME_THRESHOLD / OVERTIME_RATE / OVERTIME_TZ_OFFSET_MINUTES,
+# redémarrer le serveur, puis recalculer la plage concernée.
+@app.post("/api/overtime/recompute", status_code=202)
+async def recompute_overtime(request: Request):
+    data = await request.json()
+    if data.get("password") != admin_password:
+        raise HTTPException(status_code=401, detail="Mot de passe admin incorrect")
+    try:
+        start, end = date.fromisoformat(data["from"]), date.fromisoformat(data["to"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Paramètres invalides : {e}")
+    if end < start:
+        raise HTTPException(status_code=400, detail="La date de fin précède la date de début")
+    archived = await db.call(archived_in_range, start, end)
+    if archived:
+        raise HTTPException(status_code=400, detail=f"Mois archivés dans la plage : {', '.join(archived)}")
 
-    now_dt = datetime.now()
-    now_str = now_dt.strftime("%Y-%m-%d %H:%M:%S")
-    today = now_dt.strftime("%Y-%m-%d")
+    async def finish(job):
+        publish_directory("overtime_recompute", await latest_version())
+        return {"policy": OVERTIME_POLICY.to_dict(), "from": start.isoformat(), "to": end.isoformat()}
 
-    cursor.execute(
-        "SELECT entry_time, overtime, overtime_amount FROM gestion_employe WHERE Matricule = ?",
-        (matched_id,)
+    job = start_admin_job(
+        "overtime_recompute", lambda conn, job: plan_overtime_recompute(OVERTIME_POLICY, start, end), finish
     )
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Employé introuvable")
+    return {"status": "ok", "message": "Recalcul des heures sup. lancé", "job_id": job.id}
 
-    entry_time_str, old_ot_str, old_ot_amt = row
-    old_ot_str = old_ot_str or "0H00"
-    old_ot_amt = old_ot_amt or 0
+def archived_in_range(start, end):
+    return sorted({month for shard in all_shards() for month in overtime.archived_in_range(start, end, shard.archive_dir)})
 
-    if not entry_time_str or not entry_time_str.startswith(today):
-        cursor.execute(
-            "UPDATE gestion_employe SET entry_time = ? WHERE Matricule = ?",
-            (now_str, matched_id)
-        )
+def plan_overtime_recompute(policy, start, end):
+    months = archive.months_between(start, end)
+    return [
+        jobs.Step("presence_journaliere", (end - start).days + 1, recompute_overtime_chunk, policy, end, state=start),
+        jobs.Step("overtime_mensuel", len(months), rebuild_overtime_month_chunk, months, state=0),
+        jobs.Step("gestion_employe", 1, rebuild_overtime_totals_chunk),
+    ]
+
+def recompute_overtime_chunk(cursor, day, policy, end):
+    _, last = next(overtime.chunks(day, end))
+    overtime.recompute_days(cursor, policy, day, last)
+    following = last + timedelta(days=1)
+    return (last - day).days + 1, (following if following <= end else None)
+
+def rebuild_overtime_month_chunk(cursor, index, months):
+    overtime.rebuild_month(cursor, months[index])
+    return 1, (index + 1 if index + 1 < len(months) else None)
+
+def rebuild_overtime_totals_chunk(cursor, state):
+    overtime.rebuild_totals(cursor, bump_version(cursor))
+    return 1, None
+
+# 🔁 API : reconstruction de l'état de présence depuis presence_log (tâche de fond, voir presence.py)
+@app.post("/api/presence/rebuild", status_code=202)
+async def rebuild_presence(request: Request):
+    data = await request.json()
+    if data.get("password") != admin_password:
+        raise HTTPException(status_code=401, detail="Mot de passe admin incorrect")
+
+    async def finish(job):
+        publish_directory("presence_rebuild", await latest_version())
+
+    job = start_admin_job("presence_rebuild", plan_presence_rebuild, finish)
+    return {"status": "ok", "message": "Reconstruction de l'état de présence lancée", "job_id": job.id}
+
+def archive_dir_of(conn):
+    # Dossier d'archives de la base de cette connexion (base unique ou base d'un site)
+    path = os.path.abspath(conn.execute("PRAGMA database_list").fetchone()[2])
+    return next((s.archive_dir for s in all_shards() if os.path.abspath(s.pool.path) == path), None)
+
+def plan_presence_rebuild(conn, job):
+    # Scans archivés comptés une fois au lancement (l'archivage attend la fin de la tâche)
+    archived = presence.archived_counts(conn, archive_dir_of(conn))
+    upto = jobs.max_key(conn, "gestion_employe", "id")
+    return [jobs.Step(
+        "presence_state", jobs.count_rows(conn, "gestion_employe", "id", upto),
+        rebuild_presence_chunk, upto, archived
+    )]
+
+def rebuild_presence_chunk(cursor, after, upto, archived):
+    count, last = jobs.next_ids(cursor, "gestion_employe", after, upto)
+    if not count:
+        return 0, None
+    presence.rebuild(cursor, after, last, archived, bump_version(cursor))
+    return count, jobs.next_state(count, last)
+
+# ⏰ Règle des heures sup. (seuil, fuseau du site, taux) : voir overtime.py
+OVERTIME_POLICY = overtime.Policy()
+
+# 🕐 Minutes → "1H30" (format historique des colonnes overtime)
+def format_minutes(minutes: int) -> str:
+    h, m = divmod(minutes or 0, 60)
+    return f"{h}H{m:02d}"
+
+# 📡 Logique commune entrée/sortie/HS pour un scan horodaté (sans commit) : un INSERT dans
+# presence_log et un UPSERT de presence_state (voir presence.py), plus les cumuls d'HS
+# quand la sortie augmente les HS du jour
+def apply_scan(cursor, matched_id, scanned_at: datetime, scan_id=None, live=False):
+    local_dt = clock.local(scanned_at)
+    now_ts = clock.epoch(local_dt)
+    today = local_dt.date().isoformat()
+    day_start, day_end = clock.day_bounds(local_dt.date())
+
+    state = presence.load(cursor, matched_id)
+    if state is None:
+        return None
+    scans, entry_ts, exit_ts, day_minutes, total_minutes, total_amount = state
+    latest = exit_ts if exit_ts is not None else entry_ts
+    # Scan en direct (heure du serveur) : jamais rejoué, même derrière un horodatage en avance
+    if not live and latest is not None and now_ts < latest:
+        return replay_scan(cursor, matched_id, local_dt, state, scan_id)
+
+    # Même journée (heure du site) : simple comparaison d'entiers
+    if entry_ts is None or not day_start <= entry_ts < day_end:
+        entry_ts, exit_ts, day_minutes = now_ts, None, 0
         message = "Entrée enregistrée"
-        exit_time = ""
-        new_ot_str = old_ot_str
-        new_ot_amt = old_ot_amt
+        event = "entry"
     else:
-        cursor.execute(
-            "UPDATE gestion_employe SET exit_time = ? WHERE Matricule = ?",
-            (now_str, matched_id)
-        )
-
-        gmt_plus_3 = timezone(timedelta(hours=3))
-        now_dt = datetime.now(gmt_plus_3)
-        seuil = now_dt.replace(hour=16, minute=0, second=0, microsecond=0)
-        overtime_minutes = max(0, int((now_dt - seuil).total_seconds() // 60))
+        exit_ts = now_ts
+        overtime_minutes = OVERTIME_POLICY.overtime_minutes(scanned_at)
 
         if overtime_minutes > 0:
-            h_day, m_day = divmod(overtime_minutes, 60)
-            daily_ot_str = f"{h_day}H{m_day:02d}"
-            daily_ot_amount = int((overtime_minutes / 60) * 10000)
-
-            try:
-                h_old, m_old = map(int, old_ot_str.replace("H", ":").split(":"))
-            except:
-                h_old, m_old = 0, 0
-
-            total_min = h_old * 60 + m_old + overtime_minutes
-            h_tot, m_tot = divmod(total_min, 60)
-            new_ot_str = f"{h_tot}H{m_tot:02d}"
-            new_ot_amt = old_ot_amt + daily_ot_amount
-
-            cursor.execute("""
-                UPDATE gestion_employe
-                SET overtime = ?, overtime_amount = ?
-                WHERE Matricule = ?
-            """, (new_ot_str, new_ot_amt, matched_id))
-
-            cursor.execute("""
-                INSERT INTO presence_journaliere
-                (Matricule, date, entry_time, exit_time, overtime, overtime_amount)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                matched_id, today,
-                entry_time_str, now_str,
-                daily_ot_str, daily_ot_amount
-            ))
-
-            message = f"Sortie enregistrée – HS du jour : {daily_ot_str} ({daily_ot_amount} Ar)"
+            # Sorties répétées : les HS du jour sont celles de la dernière sortie, pas leur somme
+            if overtime_minutes > day_minutes:
+                daily_amount = OVERTIME_POLICY.amount(overtime_minutes)
+                previous_amount = OVERTIME_POLICY.amount(day_minutes)
+                presence.record_overtime(
+                    cursor, matched_id, today, entry_ts, now_ts,
+                    overtime_minutes, daily_amount, day_minutes, previous_amount
+                )
+                total_minutes += overtime_minutes - day_minutes
+                total_amount += daily_amount - previous_amount
+                day_minutes = overtime_minutes
+            daily_amount = OVERTIME_POLICY.amount(day_minutes)
+            message = f"Sortie enregistrée – HS du jour : {format_minutes(day_minutes)} ({daily_amount} Ar)"
+            event = "overtime"
         else:
             message = "Sortie enregistrée – Pas d'heure sup"
-            new_ot_str = old_ot_str
-            new_ot_amt = old_ot_amt
-        exit_time = now_str
+            event = "exit"
+
+    insert_log(cursor, matched_id, now_ts, scan_id)
+    return save_scan(
+        cursor, matched_id, (scans + 1, entry_ts, exit_ts, day_minutes, total_minutes, total_amount), message, event
+    )
 
-    cursor.execute("UPDATE gestion_employe SET Presence = Presence + 1 WHERE Matricule = ?", (matched_id,))
-    cursor.execute("INSERT INTO presence_log (Matricule, date_heure) VALUES (?, ?)", (matched_id, now_str))
+def insert_log(cursor, matched_id, ts, scan_id=None):
+    cursor.execute(
+        "INSERT INTO presence_log (Matricule, date_heure, ts, scan_id) VALUES (?, ?, ?, ?)",
+        (matched_id, clock.format(ts), ts, scan_id)
+    )
+    if scan_id is not None:
+        cursor.execute("INSERT INTO scan_recu (scan_id, Matricule, ts) VALUES (?, ?, ?)", (scan_id, matched_id, ts))
 
-    conn.commit()
-    conn.close()
+# Identifiant d'un scan hors ligne déjà enregistré (lot renvoyé par la tablette), gardé
+# dans scan_recu même une fois le mois archivé
+SQL_SCAN_SEEN = "SELECT 1 FROM scan_recu WHERE scan_id = ?"
 
+def scan_seen(cursor, scan_id) -> bool:
+    return cursor.execute(SQL_SCAN_SEEN, (scan_id,)).fetchone() is not None
+
+def save_scan(cursor, matched_id, state, message, event):
+    version = bump_version(cursor)
+    presence.save(cursor, matched_id, state, version)
+    _, entry_ts, exit_ts, _, total_minutes, total_amount = state
     return {
-        "status": "ok",
         "message": message,
-        "entry_time": entry_time_str or now_str,
-        "exit_time": exit_time,
-        "overtime": new_ot_str,
-        "overtime_amount": new_ot_amt
+        "event": event,
+        "version": version,
+        "entry_time": clock.format(entry_ts),
+        "exit_time": clock.format(exit_ts) if exit_ts is not None else "",
+        "overtime": format_minutes(total_minutes),
+        "overtime_amount": total_amount
     }
 
+# ⏪ Scan plus ancien que l'état (lot hors ligne rejoué après des scans en direct) : il ne
+# pilote pas la machine entrée/sortie. Il rejoint presence_log et sa journée est recalculée
+# depuis les logs (premier scan = entrée, dernier = sortie) ; l'état ne change que si c'est
+# la journée en cours.
+def replay_scan(cursor, matched_id, local_dt: datetime, state, scan_id=None):
+    scans, entry_ts, exit_ts, day_minutes, total_minutes, total_amount = state
+    scan_ts = clock.epoch(local_dt)
+    day = local_dt.date()
+    low, high = clock.day_bounds(day)
+    insert_log(cursor, matched_id, scan_ts, scan_id)
+
+    count, first, last = presence.day_scans(cursor, matched_id, low, high)
+    last = last if count >= 2 else None
+    minutes = OVERTIME_POLICY.overtime_minutes(clock.from_epoch(last)) if last is not None else 0
+    delta_minutes, delta_amount = presence.replace_day(
+        cursor, matched_id, day.isoformat(), low, high, first, last, minutes, OVERTIME_POLICY.amount(minutes)
+    )
+    total_minutes += delta_minutes
+    total_amount += delta_amount
+    if low <= entry_ts < high:
+        entry_ts, exit_ts, day_minutes = first, last, minutes
+
+    return save_scan(
+        cursor, matched_id, (scans + 1, entry_ts, exit_ts, day_minutes, total_minutes, total_amount),
+        f"Scan antérieur du {day.isoformat()} ajouté à l'historique", "out_of_order"
+    )
+
+# 📣 Diffusion d'un scan aux tableaux de bord abonnés (après commit)
+def publish_scan(matricule, result):
+    metrics.SCANS.inc(result["event"])
+    invalidate_responses(matricule, scan=True)
+    event_hub.publish("presence", {"Matricule": matricule, **result})
+
+# 📦 Scan rejoué par une tablette restée hors ligne
+class Scan(BaseModel):
+    hash: str
+    client_timestamp: datetime
+    scan_id: str
+
+SCAN_BATCH_MAX = int(os.getenv("SCAN_BATCH_MAX", "1000"))
+# Avance tolérée de l'horloge d'un scanner sur celle du serveur ; au-delà, le scan est refusé
+SCAN_CLOCK_SKEW_SECONDS = int(os.getenv("SCAN_CLOCK_SKEW_SECONDS", "120"))
+
+# 📡 API : rejouer un lot de scans hors ligne en une seule transaction
+# (déclarée avant /api/mark_presence/{student_id} pour ne pas être capturée par la route paramétrée)
+@app.post("/api/mark_presence/batch")
+async def mark_presence_batch(scans: List[Scan]):
+    if len(scans) > SCAN_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Lot limité à {SCAN_BATCH_MAX} scans")
+
+    # Les horodatages sans fuseau sont lus à l'heure du site (voir clock.py). Un scan daté
+    # dans le futur deviendrait le dernier passage de l'employé : refusé, le reste du lot passe
+    horizon = clock.now() + timedelta(seconds=SCAN_CLOCK_SKEW_SECONDS)
+    stamped = [(clock.local(scan.client_timestamp), position, scan) for position, scan in enumerate(scans)]
+    refused = [(position, future_scan(scan)) for scanned_at, position, scan in stamped if scanned_at > horizon]
+    ordered = sorted(
+        (item for item in stamped if item[0] <= horizon),
+        key=lambda item: (item[0], item[1])
+    )
+
+    try:
+        if site_shards is None:
+            results, applied = await run_write(apply_scan_batch, ordered, len(scans))
+        else:
+            results, applied = await apply_scan_batch_by_site(ordered, len(scans))
+    except sqlite3.Error as e:
+        metrics.SCANS.inc("error", amount=len(ordered))
+        raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
+    for position, result in refused:
+        results[position] = result
+
+    for matched_id, result in applied:
+        publish_scan(matched_id, result)
+
+    return {"status": "ok", "results": results}
+
+# Exécuté par le thread d'écriture : le lot entier tient dans un seul SAVEPOINT
+def apply_scan_batch(cursor, ordered, size):
+    results = [None] * size
+    applied = []
+    seen = set()
+    for scanned_at, position, scan in ordered:
+        # Doublon dans le lot ou scan déjà reçu lors d'un envoi précédent
+        if scan.scan_id in seen or scan_seen(cursor, scan.scan_id):
+            results[position] = duplicate_scan(scan)
+            continue
+        seen.add(scan.scan_id)
+
+        matched_id = find_matricule_by_hash(cursor, scan.hash)
+        result = apply_scan(cursor, matched_id, scanned_at, scan.scan_id) if matched_id is not None else None
+        if result is None:
+            results[position] = unknown_scan(scan)
+        else:
+            status = "out_of_order" if result["event"] == "out_of_order" else "ok"
+            results[position] = {"scan_id": scan.scan_id, "status": status, **result}
+            applied.append((matched_id, result))
+    return results, applied
+
+def duplicate_scan(scan):
+    metrics.SCANS.inc("duplicate")
+    return {"scan_id": scan.scan_id, "status": "duplicate"}
+
+def future_scan(scan):
+    metrics.SCANS.inc("future_timestamp")
+    return {"scan_id": scan.scan_id, "status": "error", "detail": "Horodatage dans le futur : horloge du scanner à vérifier"}
+
+def unknown_scan(scan):
+    metrics.SCANS.inc("unknown_hash")
+    return {"scan_id": scan.scan_id, "status": "error", "detail": "Matricule crypté non reconnu"}
+
+# Une base par site : le lot est réparti par site, chaque part dans un SAVEPOINT de sa base,
+# toutes en parallèle. Un site en échec n'annule pas les autres (statut par scan).
+async def apply_scan_batch_by_site(ordered, size):
+    hashes = list({scan.hash for _, _, scan in ordered})
+    located = dict(zip(hashes, await asyncio.gather(*(shard_for_hash(h) for h in hashes))))
+
+    results = [None] * size
+    groups = {}
+    seen = set()
+    for item in ordered:
+        scan = item[2]
+        if scan.scan_id in seen:
+            results[item[1]] = duplicate_scan(scan)
+            continue
+        seen.add(scan.scan_id)
+        shard = located[scan.hash]
+        if shard is None:
+            results[item[1]] = unknown_scan(scan)
+        else:
+            groups.setdefault(shard.site, (shard, []))[1].append(item)
+
+    parts = list(groups.values())
+    outcomes = await asyncio.gather(
+        *(run_write(apply_scan_batch, items, size, target=shard.db) for shard, items in parts),
+        return_exceptions=True
+    )
+    applied = []
+    for (shard, items), outcome in zip(parts, outcomes):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, (sqlite3.Error, HTTPException)) or len(parts) == 1:
+                raise outcome
+            metrics.SCANS.inc("error", amount=len(items))
+            detail = outcome.detail if isinstance(outcome, HTTPException) else f"Erreur SQL : {outcome}"
+            for _, position, scan in items:
+                results[position] = {"scan_id": scan.scan_id, "status": "error", "detail": detail}
+            continue
+        for position, result in enumerate(outcome[0]):
+            if result is not None:
+                results[position] = result
+        applied += outcome[1]
+    return results, applied
+
+# 📡 API : marquer la présence, gérer entrée/sortie et heures sup.
+@app.post("/api/mark_presence/{student_id}")
+async def mark_presence(student_id: str):
+    # L'heure du scan est celle de la requête, pas celle du passage dans la file
+    scanned_at = clock.now()
+    target = None
+    if site_shards is not None:
+        shard = await shard_for_hash(student_id)
+        if shard is None:
+            metrics.SCANS.inc("unknown_hash")
+            raise HTTPException(status_code=404, detail="Matricule crypté non reconnu")
+        target = shard.db
+    try:
+        matched_id, result = await run_write(apply_single_scan, student_id, scanned_at, target=target)
+    except sqlite3.Error as e:
+        metrics.SCANS.inc("error")
+        raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
+
+    publish_scan(matched_id, result)
+    return {"status": "ok", **result}
+
+def apply_single_scan(cursor, student_id, scanned_at):
+    # 🔍 Trouver l'employé dont le hash SHA256(matricule) correspond (colonne indexée)
+    matched_id = find_matricule_by_hash(cursor, student_id)
+
+    if matched_id is None:
+        metrics.SCANS.inc("unknown_hash")
+        raise HTTPException(status_code=404, detail="Matricule crypté non reconnu")
+
+    result = apply_scan(cursor, matched_id, scanned_at, live=True)
+    if result is None:
+        metrics.SCANS.inc("unknown_employee")
+        raise HTTPException(status_code=404, detail="Employé introuvable")
+    return matched_id, result
+
+
+# 📖 Lecture simple exécutée hors de la boucle par db.run
+def fetch_all(conn, sql, params=()):
+    return conn.execute(sql, params).fetchall()
+
+# 📄 API : logs d’un employé (entry_ts en dernier : fusion des bases par site)
+SQL_LOGS_BY_STUDENT = """
+    SELECT pj.Matricule, g.Nom, g.Prenom, g.Emploi,
+           pj.entry_time, pj.exit_time, pj.overtime, pj.overtime_amount, pj.entry_ts
+    FROM presence_journaliere pj
+    JOIN gestion_employe g ON pj.Matricule = g.Matricule
+    WHERE pj.Matricule = ?
+    ORDER BY pj.entry_ts DESC
+"""
+
+# Variante bornée : une plage historique relit aussi les mois archivés (ATTACH)
+SQL_LOGS_BY_STUDENT_RANGE = """
+    SELECT pj.Matricule, g.Nom, g.Prenom, g.Emploi,
+           pj.entry_time, pj.exit_time, pj.overtime, pj.overtime_amount, pj.entry_ts
+    FROM {table} pj
+    {join} gestion_employe g ON pj.Matricule = g.Matricule
+    WHERE pj.Matricule = ? AND pj.entry_ts >= ? AND pj.entry_ts < ?
+    ORDER BY pj.entry_ts DESC
+"""
+
+LOG_FIELDS = ("Matricule", "Nom", "Prenom", "Emploi", "entry_time", "exit_time", "overtime", "overtime_amount")
+
+SQL_EMPLOYEE_IDENTITY = "SELECT Nom, Prenom, Emploi FROM gestion_employe WHERE Matricule = ?"
+
+def fetch_logs_range(conn, student_id, start: date, end: date, directory=None, join="JOIN"):
+    rows = []
+    # Segments du plus récent au plus ancien : l'ordre décroissant est conservé
+    for low, high, month in reversed(archive.segments(start, end, directory)):
+        with archive.attached(conn, month, directory) as alias:
+            table = archive.union_source(conn, "presence_journaliere") if alias else "presence_journaliere"
+            rows += conn.execute(SQL_LOGS_BY_STUDENT_RANGE.format(table=table, join=join), (student_id, low, high)).fetchall()
+    return rows
 
-# 📄 API : logs d’un employé
 @app.get("/api/logs/{student_id}")
-def get_logs_by_student(student_id: str):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT pj.Matricule, g.Nom, g.Prenom, g.Emploi,
-               pj.entry_time, pj.exit_time, pj.overtime, pj.overtime_amount
-        FROM presence_journaliere pj
-        JOIN gestion_employe g ON pj.Matricule = g.Matricule
-        WHERE pj.Matricule = ?
-        ORDER BY pj.entry_time DESC
-    """, (student_id,))
-    rows = cursor.fetchall()
-    conn.close()
-    return {"data": [
-        {
-            "Matricule": r[0],
-            "Nom": r[1],
-            "Prenom": r[2],
-            "Emploi": r[3],
-            "entry_time": r[4],
-            "exit_time": r[5],
-            "overtime": r[6],
-            "overtime_amount": r[7]
-        } for r in rows
-    ]}
+async def get_logs_by_student(
+    request: Request,
+    student_id: str,
+    start: Optional[date] = Query(None, alias="from"),
+    end: Optional[date] = Query(None, alias="to"),
+    format: Optional[str] = None
+):
+    fmt, encoding = negotiate_response(request, format)
+    if start is not None or end is not None:
+        start = start or date(2000, 1, 1)
+        end = end or clock.today()
+    key = ("logs", student_id, start, end, fmt, encoding)
+    cached = cached_response("/api/logs/{student_id}", key, student_id)
+    if cached is not None:
+        return cached
+    token = response_cache.token("logs", student_id)
+
+    targets = all_shards()
+    if start is None:
+        # Sans plage : tables chaudes uniquement (mois récents)
+        results = await asyncio.gather(*(s.db.read(fetch_all, SQL_LOGS_BY_STUDENT, (student_id,)) for s in targets))
+    else:
+        if end < start:
+            raise HTTPException(status_code=400, detail="La date de fin précède la date de début")
+        # Une base par site : les mois archivés d'un employé muté restent dans la base de
+        # son ancien site, sans sa fiche (LEFT JOIN, identité reprise de la base actuelle)
+        join = "JOIN" if site_shards is None else "LEFT JOIN"
+        results = await asyncio.gather(
+            *(s.db.read(fetch_logs_range, student_id, start, end, s.archive_dir, join) for s in targets)
+        )
+    rows = shards.merge(results, key=lambda r: shards.sql_key(r[8]), reverse=True)
+    if site_shards is not None and any(r[1] is None for r in rows):
+        found = await asyncio.gather(*(s.db.read(fetch_all, SQL_EMPLOYEE_IDENTITY, (student_id,)) for s in targets))
+        identity = next((r[0] for r in found if r), None)
+        rows = [r if r[1] is not None else (r[0], *identity, *r[4:]) for r in rows] if identity else []
+    body, headers = await db.render(formats.render, fmt, encoding, {"data": None}, LOG_FIELDS, [r[:8] for r in rows])
+    return cache_response(key, token, body, headers, student_id)
 
-# 🧨 API : suppression totale des données
-@app.post("/api/wipe_all")
+# 📤 Export paie : requêtes par source, bornées et triées selon l'index horodaté (premier octet
+# immédiat) ; l'horodatage en dernière colonne sert à fusionner les bases par site, il n'est pas exporté
+EXPORT_SOURCES = {
+    "journaliere": (
+        ["Matricule", "Nom", "Prenom", "Emploi", "Affectation", "date",
+         "entry_time", "exit_time", "overtime", "overtime_amount"],
+        "presence_journaliere",
+        """
+        SELECT pj.Matricule, g.Nom, g.Prenom, g.Emploi, g.Affectation, pj.date,
+               pj.entry_time, pj.exit_time, pj.overtime, pj.overtime_amount, pj.entry_ts
+        FROM {table} pj
+        LEFT JOIN gestion_employe g ON pj.Matricule = g.Matricule
+        WHERE pj.entry_ts >= ? AND pj.entry_ts < ?
+        ORDER BY pj.entry_ts ASC, pj.id ASC
+        """
+    ),
+    # presence_log.Matricule est INTEGER alors que les anciennes bases ont un
+    # gestion_employe.Matricule texte : le CAST garde l'index utilisable
+    "log": (
+        ["Matricule", "Nom", "Prenom", "date_heure"],
+        "presence_log",
+        """
+        SELECT pl.Matricule, g.Nom, g.Prenom, pl.date_heure, pl.ts
+        FROM {table} pl
+        LEFT JOIN gestion_employe g ON g.Matricule = CAST(pl.Matricule AS TEXT)
+        WHERE pl.ts >= ? AND pl.ts < ?
+        ORDER BY pl.ts ASC, pl.id ASC
+        """
+    )
+}
+EXPORT_FETCH_SIZE = 1000
+
+# Requête d'export sur la table chaude, ou sur une source donnée (archive ∪ table chaude)
+def export_sql(source: str, table_expr: Optional[str] = None) -> str:
+    _, table, template = EXPORT_SOURCES[source]
+    return template.format(table=table_expr or table)
+
+def export_batches(shard, source: str, start: date, end: date):
+    # Paquets de lignes d'une base, triés par horodatage.
+    # Connexion dédiée en lecture seule : un téléchargement lent n'occupe pas une place du pool.
+    # Un segment par mois archivé (ATTACH le temps du segment), les mois chauds d'un bloc
+    _, table, _ = EXPORT_SOURCES[source]
+    with shard.db.readers.dedicated() as conn:
+        for low, high, month in archive.segments(start, end, shard.archive_dir):
+            with archive.attached(conn, month, shard.archive_dir) as alias:
+                sql = export_sql(source, archive.union_source(conn, table) if alias else None)
+                if alias:
+                    metrics.name_statement(sql, f"export_{source}_archive")
+                cursor = conn.execute(sql, (low, high))
+                try:
+                    while True:
+                        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+                        if not rows:
+                            break
+                        yield rows
+                finally:
+                    # Curseur fermé avant le DETACH (sinon « database is locked »)
+                    cursor.close()
+
+def identity_filler(columns):
+    # Une base par site : les mois archivés d'un employé muté restent dans la base de son
+    # ancien site, sans sa fiche → identité lue dans les autres bases, une fois par matricule
+    wanted = [c for c in ("Nom", "Prenom", "Emploi", "Affectation") if c in columns]
+    positions = [columns.index(c) for c in wanted]
+    sql = f"SELECT {', '.join(wanted)} FROM gestion_employe WHERE Matricule = ?"
+    known = {}
+
+    def fill(row):
+        if row[positions[0]] is not None:
+            return row
+        if row[0] not in known:
+            known[row[0]] = None
+            for shard in site_shards.all():
+                with shard.db.readers.connection() as conn:
+                    found = conn.execute(sql, (row[0],)).fetchone()
+                if found:
+                    known[row[0]] = found
+                    break
+        if known[row[0]] is None:
+            return row
+        row = list(row)
+        for position, value in zip(positions, known[row[0]]):
+            row[position] = value
+        return row
+
+    return fill
+
+def export_rows(source: str, start: date, end: date, fmt: str, compress: bool):
+    columns, _, _ = EXPORT_SOURCES[source]
+    gzipper = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return gzipper.compress(data) if gzipper else data
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+
+    streams = [export_batches(shard, source, start, end) for shard in all_shards()]
+    if len(streams) == 1:
+        batches = streams[0]
+    else:
+        # Une base par site : fusion des flux triés, puis nouveaux paquets
+        merged = heapq.merge(*(chain.from_iterable(s) for s in streams), key=lambda r: shards.sql_key(r[-1]))
+        batches = iter(lambda: list(islice(merged, EXPORT_FETCH_SIZE)), [])
+    fill = identity_filler(columns) if site_shards is not None else None
+    try:
+        for rows in batches:
+            if fill is not None:
+                rows = [fill(r) for r in rows]
+            if fmt == "csv":
+                writer.writerows(r[:-1] for r in rows)
+            else:
+                for r in rows:
+                    buffer.write(json.dumps(dict(zip(columns, r)), ensure_ascii=False))
+                    buffer.write("\n")
+            chunk = encode(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
+    finally:
+        for stream in streams:
+            stream.close()
+
+    chunk = encode(buffer.getvalue())
+    if gzipper:
+        chunk += gzipper.flush()
+    if chunk:
+        yield chunk
+
+# 📤 API : export streamé de presence_journaliere / presence_log pour la paie
+@app.get("/api/export/presence")
+def export_presence(
+    start: date = Query(..., alias="from"),
+    end: date = Query(..., alias="to"),
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    source: str = Query("journaliere", pattern="^(journaliere|log)$"),
+    gzip: bool = False
+):
+    if end < start:
+        raise HTTPException(status_code=400, detail="La date de fin précède la date de début")
+
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"presence_{source}_{start.isoformat()}_{end.isoformat()}.{format}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+
+    return StreamingResponse(
+        export_rows(source, start, end, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# 🧨 API : suppression totale des données (tâche de fond)
+WIPE_KEYS = {
+    "gestion_employe": "id",
+    "presence_log": "id",
+    "presence_journaliere": "id",
+    "employe_supprime": "rowid",
+    "presence_snapshot": "snapshot_id, Matricule",
+    "presence_state": "Matricule",
+    "scan_recu": "scan_id",
+    **ROLLUP_KEYS,
+}
+
+@app.post("/api/wipe_all", status_code=202)
 async def wipe_all(request: Request):
     data = await request.json()
     if data.get("password") != admin_password:
         raise HTTPException(status_code=401, detail="Mot de passe admin incorrect")
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+
+    async def finish(job):
+        await db.call(drop_archives)
+        invalidate_hash_cache()
+        publish_directory("wipe_all", await latest_version())
+
+    invalidate_hash_cache()
+    job = start_admin_job("wipe_all", plan_wipe_all, finish)
+    return {"status": "ok", "message": "Suppression de toutes les données lancée", "job_id": job.id}
+
+def plan_wipe_all(conn, job):
+    steps = [jobs.Step(table, jobs.count_rows(conn, table), jobs.delete_chunk, table, key)
+             for table, key in WIPE_KEYS.items()]
+    # Dernier paquet : nouvelle version de réinitialisation, les clients repartent de zéro
+    steps.append(jobs.Step("sync_state", 1, reset_sync_chunk))
+    return steps
+
+def reset_sync_chunk(cursor, state):
+    bump_version(cursor, reset=True)
+    return 1, None
+
+# 🗄️ API : archivage des mois clos + rétention (voir archive.py)
+@app.post("/api/archive")
+async def archive_now(request: Request):
+    data = await request.json()
+    if data.get("password") != admin_password:
+        raise HTTPException(status_code=401, detail="Mot de passe admin incorrect")
+    if admin_jobs.active() is not None:
+        raise HTTPException(status_code=409, detail="Une tâche d'administration est en cours")
+    # Enregistré comme tâche admin : reset/wipe refusés (409) tant que l'archivage tourne
+    job = admin_jobs.track("archive", archive_all)
+    # Client parti : l'archivage continue jusqu'au bout
+    await asyncio.shield(job.task)
+    if job.status != "done":
+        raise HTTPException(status_code=500, detail=f"Erreur SQL : {job.error}")
+    return {"status": "ok", **job.result}
+
+async def archive_all():
+    # Chaque base archive ses mois clos dans son dossier ; comptes additionnés par mois
+    report = {"archived": {}, "expired": set()}
+    for shard in all_shards():
+        # Copie sur la connexion admin ; suppressions des tables chaudes par le thread
+        # d'écriture de la base, comme les paquets des tâches admin (jamais en parallèle)
+        def delete(table, ids, writer=shard.writer):
+            job = writer.submit(archive.delete_rows, table, ids)
+            try:
+                return job.result(timeout=archive.ARCHIVE_WRITE_TIMEOUT)
+            except concurrent.futures.TimeoutError:
+                # Paquet encore en file : abandonné, l'archivage s'arrête (rejouable, rien n'est
+                # perdu) et libère l'exécuteur admin ; paquet déjà commencé : attendu jusqu'au bout
+                if job.cancel():
+                    raise RuntimeError("File d'écriture saturée : archivage interrompu, réessayez")
+                return job.result()
+
+        done = await shard.db.admin(
+            lambda conn: archive.run(conn, directory=shard.archive_dir, delete=delete)
+        )
+        # Lignes déplacées vers les archives : les logs sans plage changent
+        response_cache.invalidate("logs")
+        for month, moved in done["archived"].items():
+            totals = report["archived"].setdefault(month, {})
+            for table, count in moved.items():
+                totals[table] = totals.get(table, 0) + count
+        report["expired"].update(done["expired"])
+    report["expired"] = sorted(report["expired"])
+    return report
+
+# ⏲️ Archivage périodique optionnel (ARCHIVE_EVERY_HOURS=0 : désactivé)
+archive_task = None
+
+async def archive_periodically():
+    while True:
+        await asyncio.sleep(archive.ARCHIVE_EVERY_HOURS * 3600)
+        if admin_jobs.active() is not None:
+            # Les tâches admin (reconstruction, recalcul) lisent des plages de logs fixées au lancement
+            continue
+        # Même verrou que POST /api/archive : aucune tâche admin ne démarre pendant l'archivage
+        job = admin_jobs.track("archive", archive_all)
+        await job.task
+        if job.status != "done":
+            log.error("❌ Archivage impossible : %s", job.error)
+        elif job.result["archived"] or job.result["expired"]:
+            log.info("🗄️ Archivage : %s", job.result)
+
+@app.on_event("startup")
+async def schedule_archive():
+    global archive_task
+    if archive.ARCHIVE_EVERY_HOURS > 0:
+        archive_task = asyncio.create_task(archive_periodically())
+
+# 🧾 Champs exposés par /api/students (nom JSON → expression SQL)
+STUDENT_FIELDS = {
+    "Matricule": "g.Matricule",
+    "Nom": "g.Nom",
+    "Prenom": "g.Prenom",
+    "Emploi": "g.Emploi",
+    "Affectation": "g.Affectation",
+    "Numero": "g.Numero",
+    "Mail": "g.Mail",
+    "Presence": "COALESCE(s.Presence, 0)",
+    "entry_time": clock.sql_format("s.entry_ts"),
+    "exit_time": clock.sql_format("s.exit_ts"),
+    "daily_overtime": """CASE WHEN oj.overtime_minutes IS NULL THEN ''
+        ELSE (oj.overtime_minutes / 60) || 'H' || printf('%02d', oj.overtime_minutes % 60) END""",
+    "daily_amount": "COALESCE(oj.overtime_amount, '')",
+    "overtime": overtime.SQL_FORMAT_MINUTES.format(m="COALESCE(s.overtime_minutes, 0)"),
+    "overtime_amount": "COALESCE(s.overtime_amount, 0)"
+}
+DAILY_FIELDS = {"daily_overtime", "daily_amount"}
+STATE_FIELDS = {"Presence", "entry_time", "exit_time", "overtime", "overtime_amount"}
+STUDENTS_PAGE_MAX = 500
+
+# 🧾 SELECT et FROM de l'annuaire ; état de présence et cumul du jour joints seulement
+# s'ils sont demandés (`state` : joint pour un filtre ou un tri sur presence_state)
+def student_select(columns, state=False):
+    select = ", ".join(STUDENT_FIELDS[f] for f in columns)
+    source, params = "gestion_employe g", []
+    if state or STATE_FIELDS.intersection(columns):
+        source += "\n        LEFT JOIN presence_state s ON s.Matricule = g.Matricule"
+    if DAILY_FIELDS.intersection(columns):
+        source += "\n        LEFT JOIN overtime_journalier oj ON oj.date = ? AND oj.Matricule = g.Matricule"
+        params.append(clock.today().isoformat())
+    return select, source, params
+
+# 🔖 Curseur de pagination opaque : dernière clé (Nom, Matricule) renvoyée
+def encode_cursor(nom, matricule) -> str:
+    return base64.urlsafe_b64encode(json.dumps([nom, matricule]).encode()).decode()
+
+def decode_cursor(value: str):
     try:
-        for table in ["gestion_employe", "presence_log", "presence_journaliere"]:
-            cursor.execute(f"DELETE FROM {table}")
-        conn.commit()
-        return {"status": "ok", "message": "Toutes les données ont été effacées"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
-    finally:
-        conn.close()
+        nom, matricule = json.loads(base64.urlsafe_b64decode(value.encode()))
+        return nom, matricule
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+
+# 👥 Requête d'une page de l'annuaire (page_size + 1 lignes pour savoir s'il y a une suite)
+def students_query(columns, affectation=None, emploi=None, present_today=False, after=None, page_size=None):
+    select, source, params = student_select(columns, present_today)
+    where = []
+    if affectation is not None:
+        where.append("g.Affectation = ?")
+        params.append(affectation)
+    if emploi is not None:
+        where.append("g.Emploi = ?")
+        params.append(emploi)
+    if present_today:
+        where.append("s.entry_ts >= ? AND s.entry_ts < ?")
+        params += list(clock.day_bounds(clock.today()))
+    if after is not None:
+        where.append("(g.Nom, g.Matricule) > (?, ?)")
+        params += list(after)
+
+    sql = f"""
+        SELECT g.Nom, g.Matricule, {select}
+        FROM {source}
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY g.Nom ASC, g.Matricule ASC
+    """
+    if page_size is not None:
+        sql += " LIMIT ?"
+        params.append(page_size + 1)
+    return sql, params
+
+# 🏷️ ETag de l'annuaire : version des données + jour (le filtre present_today change à minuit)
+# + format hors JSON classique (la compression ne change pas l'ETag, Vary suffit)
+def directory_etag(version, fmt="json") -> str:
+    suffix = "" if fmt == "json" else f"-{fmt}"
+    return f'"{version}-{clock.today().isoformat()}{suffix}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+def fetch_directory_page(conn, request, sql, params, fmt):
+    # Version et lignes lues dans le même instantané : l'ETag correspond exactement au contenu
+    with snapshot(conn):
+        cursor = conn.cursor()
+        version, _ = current_version(cursor)
+        etag = directory_etag(version, fmt)
+        if etag_matches(request, etag):
+            return version, etag, None
+        return version, etag, cursor.execute(sql, params).fetchall()
 
+async def fetch_sharded_page(request, sql, params, page_size, fmt):
+    # Une base par site : ETag des versions de toutes les bases, pages triées fusionnées
+    targets = site_shards.all()
+    top = site_shards.versions.value
+    versions = await asyncio.gather(*(s.db.read(read_version) for s in targets))
+    etag = directory_etag("-".join(map(str, versions or [top])), fmt)
+    version = shards.safe_version(top, targets, {s.site: v for s, v in zip(targets, versions)})
+    if etag_matches(request, etag):
+        return version, etag, None
+    results = await asyncio.gather(*(s.db.read(fetch_all, sql, params) for s in targets))
+    limit = page_size + 1 if page_size is not None else None
+    rows = shards.merge(results, key=lambda r: (shards.sql_key(r[0]), shards.sql_key(r[1])), limit=limit)
+    return version, etag, rows
+
+def parse_fields(fields: Optional[str]):
+    if not fields:
+        return list(STUDENT_FIELDS)
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - STUDENT_FIELDS.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Champs inconnus : {', '.join(sorted(unknown))}")
+    return [f for f in STUDENT_FIELDS if f in wanted]
+
+# 👥 API : annuaire paginé (keyset sur Nom, Matricule), filtré et projeté
 @app.get("/api/students")
-def get_students():
-    conn = sqlite3.connect(DB_FILE)
+async def get_students(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = Query(None, alias="cursor"),
+    affectation: Optional[str] = None,
+    emploi: Optional[str] = None,
+    present_today: bool = False,
+    fields: Optional[str] = None,
+    format: Optional[str] = None
+):
+    columns = parse_fields(fields)
+    fmt, encoding = negotiate_response(request, format)
+
+    # Clé du jour : present_today et les HS du jour changent à minuit, comme l'ETag. Les
+    # listes sans champ d'état ne dépendent pas des scans (version reçue éventuellement
+    # plus ancienne : le flux de changements en renvoie simplement un peu plus)
+    key = ("directory", tuple(columns), limit, after, affectation, emploi, present_today, clock.today(), fmt, encoding)
+    tag = "state" if present_today or not STATE_FIELDS.isdisjoint(columns) or not DAILY_FIELDS.isdisjoint(columns) else None
+    cached = cached_response("/api/students", key, tag)
+    if cached is not None:
+        if etag_matches(request, cached.headers["ETag"]):
+            return Response(status_code=304, headers={"ETag": cached.headers["ETag"], "Vary": formats.VARY})
+        return cached
+    token = response_cache.token("directory", tag)
+
+    # Sans limit ni curseur : liste complète, comme avant la pagination
+    page_size = None
+    if limit is not None or after is not None:
+        page_size = min(limit or STUDENTS_PAGE_MAX, STUDENTS_PAGE_MAX)
+
+    sql, params = students_query(
+        columns, affectation, emploi, present_today,
+        decode_cursor(after) if after is not None else None, page_size
+    )
+
+    if site_shards is None:
+        version, etag, rows = await db.read(fetch_directory_page, request, sql, params, fmt)
+    else:
+        version, etag, rows = await fetch_sharded_page(request, sql, params, page_size, fmt)
+    if rows is None:
+        return Response(status_code=304, headers={"ETag": etag, "Vary": formats.VARY})
+
+    next_cursor = None
+    if page_size is not None and len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
+
+    envelope = {"status": "ok", "version": version, "data": None, "next_cursor": next_cursor}
+    body, headers = await db.render(formats.render, fmt, encoding, envelope, columns, [r[2:] for r in rows], {"ETag": etag})
+    return cache_response(key, token, body, headers, tag)
+
+SQL_CHANGED_MATRICULES = """
+    SELECT Matricule FROM gestion_employe WHERE row_version > ?
+    UNION SELECT Matricule FROM presence_state WHERE version > ?
+"""
+
+def fetch_changes(conn, columns, since, top=None):
+    with snapshot(conn):
+        return read_changes(conn, columns, since, top)
+
+def read_changes(conn, columns, since, top):
+    select, source, params = student_select(columns, state=True)
     cursor = conn.cursor()
+    version, reset_version = current_version(cursor)
 
-    cursor.execute("""
-        SELECT Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, Presence,
-               entry_time, exit_time, overtime, overtime_amount
-        FROM gestion_employe
-        ORDER BY Nom ASC
-    """)
+    # Version inconnue ou antérieure à un effacement total : le client repart de zéro
+    # (`top` : dernière version tous sites confondus quand les bases sont séparées)
+    reset = since < reset_version or since > (top or version)
+    if reset:
+        cursor.execute(f"SELECT {select} FROM {source} ORDER BY g.Nom ASC, g.Matricule ASC", params)
+        return version, reset, cursor.fetchall(), []
+
+    # Fiche (annuaire) ou état de présence (scans) modifiés depuis `since`
+    cursor.execute(
+        f"SELECT {select} FROM {source} WHERE g.Matricule IN ({SQL_CHANGED_MATRICULES}) "
+        "ORDER BY MAX(g.row_version, COALESCE(s.version, 0)) ASC",
+        params + [since, since]
+    )
     rows = cursor.fetchall()
+    deleted = [r[0] for r in cursor.execute(
+        "SELECT Matricule FROM employe_supprime WHERE version > ? ORDER BY version ASC",
+        (since,)
+    )]
+    return version, reset, rows, deleted
+
+async def fetch_sharded_changes(columns, since):
+    targets = site_shards.all()
+    top = site_shards.versions.value
+    results = await asyncio.gather(*(s.db.read(fetch_changes, columns, since, top) for s in targets))
+    reset = any(r[1] for r in results)
+    if reset and not all(r[1] for r in results):
+        # Un site exige de repartir de zéro : liste complète de tous les sites
+        results = await asyncio.gather(*(s.db.read(fetch_changes, columns, -1, top) for s in targets))
+    version = shards.safe_version(top, targets, {s.site: r[0] for s, r in zip(targets, results)})
+    if reset:
+        rows = shards.merge([r[2] for r in results], key=lambda r: (shards.sql_key(r[1]), shards.sql_key(r[0])))
+    else:
+        rows = list(chain.from_iterable(r[2] for r in results))
+    # Fiche supprimée d'un site mais présente dans un autre (réajoutée ailleurs) : pas supprimée
+    alive = {str(r[0]) for r in rows}
+    deleted = [m for m in chain.from_iterable(r[3] for r in results) if m not in alive]
+    return version, reset, rows, deleted
+
+# 🔍 Recherche dans l'annuaire : index FTS5 (migration 10) sur Matricule, Nom, Prenom,
+# Emploi et Affectation. Chaque mot saisi est un préfixe ("rak jea" → Rakoto Jean) ;
+# résultats classés par bm25, le nom et le matricule pesant plus que le poste ou le site.
+# bm25 coûte ~2 µs par ligne trouvée : seules les SEARCH_RANK_WINDOW premières sont
+# classées (exact en deçà ; "r" trouve tout l'annuaire, les scores y sont de toute façon égaux)
+# Une saisie avec des chiffres cherche aussi le matricule par sous-chaîne ("031" → BM031),
+# ce que les préfixes FTS ne savent pas faire : parcours de l'index des matricules, classé
+# après les résultats plein texte.
+SEARCH_LIMIT_MAX = 100
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "1000"))
+SEARCH_WEIGHTS = "10.0, 5.0, 3.0, 1.0, 1.0"
+search_fts = True  # faux si SQLite est compilé sans FTS5 (voir init_db)
 
-    students = []
-    for r in rows:
-        students.append({
+def search_terms(q: str):
+    # Mots seulement : la syntaxe FTS5 (guillemets, NEAR, *) saisie n'est pas interprétée
+    return re.findall(r"\w+", q.lower())[:8]
+
+def like_pattern(term: str, prefix_only=False) -> str:
+    # Les mots saisis ne contiennent que \w : seul "_" est un joker de LIKE à échapper
+    escaped = term.replace("_", "\\_")
+    return f"{escaped}%" if prefix_only else f"%{escaped}%"
+
+def search_query(columns, terms, limit, emploi=None):
+    select, source, params = student_select(columns)
+    by_matricule = any(ch.isdigit() for t in terms for ch in t)
+    if search_fts:
+        # Filtre d'emploi dans la fenêtre classée ; CROSS JOIN : FTS reste la boucle externe
+        # (sinon SQLite rejoue la recherche pour chaque employé du poste)
+        join, where, filters = "", "", []
+        if emploi is not None:
+            join, where, filters = "CROSS JOIN gestion_employe e ON e.id = f.rowid", "AND e.Emploi = ?", [emploi]
+        ranked = f"""
+            SELECT f.rowid, bm25(employe_fts, {SEARCH_WEIGHTS}) AS score
+            FROM employe_fts f {join}
+            WHERE employe_fts MATCH ? {where}
+            LIMIT ?
+        """
+        matches = [" ".join(f'"{t}"*' for t in terms), *filters, SEARCH_RANK_WINDOW]
+        if by_matricule:
+            like = " AND ".join("Matricule LIKE ? ESCAPE '\\'" for _ in terms)
+            ranked = f"""
+                SELECT rowid, MIN(score) AS score FROM (
+                    SELECT * FROM ({ranked})
+                    UNION ALL
+                    SELECT * FROM (
+                        SELECT id, 0 FROM gestion_employe WHERE {like} {"AND Emploi = ?" if filters else ""} LIMIT ?
+                    )
+                ) GROUP BY rowid
+            """
+            matches += [*(like_pattern(t) for t in terms), *filters, SEARCH_RANK_WINDOW]
+        sql = f"""
+            SELECT f.score, g.Nom, g.Matricule, {select}
+            FROM {source}
+            JOIN ({ranked}) f ON g.id = f.rowid
+            ORDER BY f.score ASC, g.Nom ASC, g.Matricule ASC
+            LIMIT ?
+        """
+        return sql, params + matches + [limit]
+
+    # Sans FTS5 : préfixe sur le nom ou le prénom, sous-chaîne du matricule (parcours complet)
+    where = [
+        "(g.Nom LIKE ? ESCAPE '\\' OR g.Prenom LIKE ? ESCAPE '\\' OR g.Matricule LIKE ? ESCAPE '\\')"
+        for _ in terms
+    ]
+    params += [p for t in terms for p in (like_pattern(t, True), like_pattern(t, True), like_pattern(t))]
+    if emploi is not None:
+        where.append("g.Emploi = ?")
+        params.append(emploi)
+    sql = f"""
+        SELECT 0 AS score, g.Nom, g.Matricule, {select}
+        FROM {source}
+        WHERE {" AND ".join(where)}
+        ORDER BY g.Nom ASC, g.Matricule ASC
+        LIMIT ?
+    """
+    return sql, params + [limit]
+
+@app.get("/api/students/search")
+async def search_students(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1),
+    emploi: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    columns = parse_fields(fields)
+    terms = search_terms(q)
+    if not terms:
+        return {"status": "ok", "data": []}
+    limit = min(limit, SEARCH_LIMIT_MAX)
+    sql, params = search_query(columns, terms, limit, emploi)
+
+    results = await asyncio.gather(*(s.db.read(fetch_all, sql, params) for s in all_shards()))
+    # Une base par site : meilleurs scores de chaque site fusionnés (bm25 propre à chaque base)
+    rows = shards.merge(
+        results, key=lambda r: (r[0], shards.sql_key(r[1]), shards.sql_key(r[2])), limit=limit
+    )
+    return {"status": "ok", "data": [dict(zip(columns, r[3:])) for r in rows]}
+
+# 🔄 API : employés modifiés ou supprimés depuis une version donnée
+@app.get("/api/students/changes")
+async def get_student_changes(since: int = Query(..., ge=0)):
+    columns = list(STUDENT_FIELDS)
+    if site_shards is None:
+        version, reset, rows, deleted = await db.read(fetch_changes, columns, since)
+    else:
+        version, reset, rows, deleted = await fetch_sharded_changes(columns, since)
+    return {
+        "status": "ok",
+        "version": version,
+        "reset": reset,
+        "data": [dict(zip(columns, r)) for r in rows],
+        "deleted": deleted
+    }
+
+# 📊 API : heures sup. d'une période (YYYY-MM ou YYYY-MM-DD) lues dans les cumuls
+@app.get("/api/reports/overtime")
+async def get_overtime_report(
+    period: str = Query(..., pattern=r"^\d{4}-\d{2}(-\d{2})?$"),
+    matricule: Optional[str] = None
+):
+    if len(period) == 7:
+        table, key = "overtime_mensuel", "mois"
+    else:
+        table, key = "overtime_journalier", "date"
+
+    sql = f"""
+        SELECT r.Matricule, g.Nom, g.Prenom, g.Affectation, r.overtime_minutes, r.overtime_amount
+        FROM {table} r
+        LEFT JOIN gestion_employe g ON g.Matricule = r.Matricule
+        WHERE r.{key} = ?
+    """
+    params = [period]
+    if matricule is not None:
+        sql += " AND r.Matricule = ?"
+        params.append(matricule)
+    sql += " ORDER BY r.Matricule ASC"
+
+    results = await asyncio.gather(*(s.db.read(fetch_all, sql, params) for s in all_shards()))
+    rows = shards.merge(results, key=lambda r: shards.sql_key(r[0]))
+
+    data = [
+        {
             "Matricule": r[0],
             "Nom": r[1],
             "Prenom": r[2],
-            "Emploi": r[3],
-            "Affectation": r[4],
-            "Numero": r[5],
-            "Mail": r[6],
-            "Presence": r[7],
-            "entry_time": r[8],
-            "exit_time": r[9],
-            "daily_overtime": "",  # Optionnel : à calculer depuis presence_journaliere
-            "daily_amount": "",    # Optionnel : à calculer depuis presence_journaliere
-            "overtime": r[10],
-            "overtime_amount": r[11]
-        })
-
-    conn.close()
-    return {"status": "ok", "data": students}
+            "Affectation": r[3],
+            "overtime_minutes": r[4],
+            "overtime": format_minutes(r[4]),
+            "overtime_amount": r[5]
+        } for r in rows
+    ]
+    total_minutes = sum(r[4] for r in rows)
+    return {
+        "status": "ok",
+        "period": period,
+        "data": data,
+        "total": {
+            "overtime_minutes": total_minutes,
+            "overtime": format_minutes(total_minutes),
+            "overtime_amount": sum(r[5] for r in rows)
+        }
+    }
+
+# 📺 API : flux SSE des entrées/sorties/HS et des changements d'annuaire
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+
+@app.get("/api/events")
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+    since: Optional[int] = Query(None, alias="last_event_id")
+):
+    # Last-Event-ID est renvoyé par EventSource à la reconnexion ; le paramètre sert à la première
+    subscriber, backlog = event_hub.subscribe(last_event_id if last_event_id is not None else since)
+
+    async def stream():
+        try:
+            yield "retry: 3000\n\n"
+            for message in backlog:
+                if message == RESYNC:
+                    yield format_sse(None, "resync", "{}")
+                else:
+                    yield message
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if message == OVERFLOW:
+                    yield format_sse(None, "overflow", "{}")
+                    break
+                yield message
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 📈 API : métriques au format texte Prometheus
+metrics.Gauge(
+    "baobab_writer_queue_depth", "Jobs en attente du thread d'écriture",
+    callback=lambda: scan_writer.depth + (site_shards.depth if site_shards is not None else 0)
+)
+metrics.Gauge("baobab_sse_clients", "Clients abonnés à /api/events", callback=lambda: event_hub.client_count)
+metrics.Gauge("baobab_response_cache_bytes", "Octets de réponses en cache", callback=lambda: response_cache.size)
+metrics.Gauge("baobab_response_cache_entries", "Réponses en cache", callback=lambda: len(response_cache))
+metrics.name_statement(SQL_FIND_BY_HASH, "find_by_hash")
+metrics.name_statement(presence.SQL_STATE, "employee_state")
+metrics.name_statement(presence.SQL_SAVE_STATE, "save_state")
+metrics.name_statement(SQL_LOGS_BY_STUDENT, "logs_by_student")
+metrics.name_statement(SQL_SCAN_SEEN, "scan_seen")
+for source in EXPORT_SOURCES:
+    metrics.name_statement(export_sql(source), f"export_{source}")
+
+@app.get("/api/metrics")
+async def get_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# 🔬 API : dernières requêtes lentes ou profilées (requêtes SQL, plans, piles)
+@app.get("/api/debug/slow")
+async def get_slow_requests(
+    x_admin_password: Optional[str] = Header(None),
+    limit: int = Query(20, ge=1, le=profiling.PROFILE_BUFFER)
+):
+    if x_admin_password != admin_password:
+        raise HTTPException(status_code=401, detail="Mot de passe admin incorrect")
+    return {
+        "status": "ok",
+        "profile_all": profiling.PROFILE,
+        "slow_ms": profiling.PROFILE_SLOW_MS,
+        "explain_ms": profiling.PROFILE_EXPLAIN_MS,
+        "data": list(profiling.slow_traces)[::-1][:limit]
+    }
 
 #listes des routes
 @app.get("/api/routes")
@@ -347,97 +1567,389 @@ def list_routes():
 def root():
     return {"status": "ok"}
 
+# 📥 Import en masse : validation par lot puis upsert par paquets (une transaction par paquet)
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+EMPLOYE_COLUMNS = ["Matricule", "Nom", "Prenom", "Emploi", "Affectation", "Numero", "Mail"]
 
+def parse_bulk_body(body: bytes, content_type: str):
+    if "csv" in content_type:
+        text = body.decode("utf-8-sig")
+        # Séparateur lu sur l'en-tête : Excel en français exporte avec ";"
+        header = text.split("\n", 1)[0]
+        delimiter = max(",;\t", key=header.count)
+        return list(csv.DictReader(io.StringIO(text), delimiter=delimiter))
+    rows = json.loads(body)
+    if not isinstance(rows, list):
+        raise ValueError("un tableau JSON est attendu")
+    return rows
 
-@app.post("/api/students")
-def add_student(student: Etudiant):
-    conn = sqlite3.connect(DB_FILE)
+def validate_bulk_rows(rows):
+    valid = {}
+    errors = []
+    for line, row in enumerate(rows, start=1):
+        try:
+            if not isinstance(row, dict):
+                raise TypeError("objet attendu")
+            student = Etudiant(**row)
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))} : {err['msg']}" for err in e.errors())
+            errors.append({"row": line, "Matricule": row.get("Matricule"), "detail": detail})
+            continue
+        except TypeError as e:
+            errors.append({"row": line, "Matricule": None, "detail": str(e)})
+            continue
+        # Une seule forme du matricule pour les doublons, l'écriture et le hash ("0105" = "105")
+        student.Matricule = normalize_matricule(student.Matricule)
+        if student.Matricule in valid:
+            previous = valid[student.Matricule][0]
+            errors.append({
+                "row": previous,
+                "Matricule": student.Matricule,
+                "detail": f"Matricule en double dans l'import, ligne {line} retenue"
+            })
+        valid[student.Matricule] = (line, student)
+    lines = {matricule: line for matricule, (line, _) in valid.items()}
+    return [student for _, student in valid.values()], lines, errors
+
+# Matricules déjà présents, comparés comme SQLite les compare (affinité de la colonne :
+# "0123" désigne la fiche 123 d'une colonne INTEGER) et rendus tels que saisis
+def existing_keys(cursor, matricules):
+    return {r[0] for r in cursor.execute(
+        f"WITH k(m) AS (VALUES {','.join(['(?)'] * len(matricules))}) "
+        "SELECT k.m FROM k JOIN gestion_employe g ON g.Matricule = k.m",
+        matricules
+    )}
+
+def upsert_chunk(cursor, chunk, version):
+    matricules = [s.Matricule for s in chunk]
+    existing = existing_keys(cursor, matricules)
+    cursor.executemany("""
+        UPDATE gestion_employe
+        SET Nom = ?, Prenom = ?, Emploi = ?, Affectation = ?, Numero = ?, Mail = ?, row_version = ?
+        WHERE Matricule = ?
+    """, [
+        (s.Nom, s.Prenom, s.Emploi, s.Affectation, s.Numero, s.Mail, version, s.Matricule)
+        for s in chunk if s.Matricule in existing
+    ])
+    cursor.executemany("""
+        INSERT INTO gestion_employe
+        (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash, row_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (s.Matricule, s.Nom, s.Prenom, s.Emploi, s.Affectation, s.Numero, s.Mail,
+         hash_matricule(s.Matricule), version)
+        for s in chunk if s.Matricule not in existing
+    ])
+    cursor.executemany(
+        "DELETE FROM employe_supprime WHERE Matricule = ?",
+        [(m,) for m in matricules]
+    )
+    return len(chunk) - len(existing), len(existing)
+
+async def upsert_students(students, target=None):
+    # → (insérés, mis à jour, version, erreurs par ligne). Chaque paquet est un job du thread
+    # d'écriture, comme les paquets des tâches admin (voir jobs.py) : les scans passent entre
+    # deux paquets. `target` : base du site (AsyncDatabase) ; par défaut la base unique.
+    inserted = updated = 0
+    version = None
+    errors = []
+    for start in range(0, len(students), BULK_CHUNK_SIZE):
+        chunk = students[start:start + BULK_CHUNK_SIZE]
+        added, changed, version, refused = await (target or db).write(upsert_students_chunk, chunk)
+        inserted += added
+        updated += changed
+        errors += refused
+    return inserted, updated, version, errors
+
+def upsert_students_chunk(cursor, chunk):
+    # Une ligne refusée par la base (contrainte d'unicité…) n'annule ni son paquet ni les
+    # paquets déjà validés : le paquet est alors rejoué ligne par ligne, chacune dans son SAVEPOINT
+    version = bump_version(cursor)
+    cursor.execute("SAVEPOINT paquet")
+    try:
+        added, changed = upsert_chunk(cursor, chunk, version)
+    except sqlite3.IntegrityError:
+        cursor.execute("ROLLBACK TO paquet")
+    else:
+        cursor.execute("RELEASE paquet")
+        return added, changed, version, []
+    cursor.execute("RELEASE paquet")
+    added = changed = 0
+    errors = []
+    for student in chunk:
+        cursor.execute("SAVEPOINT ligne")
+        try:
+            row_added, row_changed = upsert_chunk(cursor, [student], version)
+        except sqlite3.IntegrityError as e:
+            cursor.execute("ROLLBACK TO ligne")
+            errors.append({"Matricule": student.Matricule, "detail": f"Refusé par la base : {e}"})
+        else:
+            added += row_added
+            changed += row_changed
+        cursor.execute("RELEASE ligne")
+    return added, changed, version, errors
+
+def existing_matricules(conn, matricules):
+    found = set()
     cursor = conn.cursor()
+    for start in range(0, len(matricules), BULK_CHUNK_SIZE):
+        found.update(existing_keys(cursor, matricules[start:start + BULK_CHUNK_SIZE]))
+    return found
+
+async def upsert_students_by_site(students):
+    # Une base par site : les employés changeant d'affectation sont d'abord déplacés,
+    # puis chaque site importe ses lignes en parallèle
+    targets = site_shards.all()
+    matricules = [s.Matricule for s in students]
+    found = await asyncio.gather(*(t.db.run(existing_matricules, matricules) for t in targets))
+    current = {m: shard for shard, names in zip(targets, found) for m in names}
+    by_site = {}
+    for student in students:
+        site = shards.site_of(student.Affectation)
+        source = current.get(student.Matricule)
+        if source is not None and source.site != site:
+            await move_student(source, student.Matricule, student)
+        by_site.setdefault(site, []).append(student)
+
+    bases = [await site_db(student_list[0].Affectation) for student_list in by_site.values()]
+    results = await asyncio.gather(*(upsert_students(chunk, base) for base, chunk in zip(bases, by_site.values())))
+    versions = [r[2] for r in results if r[2] is not None]
+    errors = [error for r in results for error in r[3]]
+    return sum(r[0] for r in results), sum(r[1] for r in results), max(versions, default=None), errors
+
+# 📥 API : import CSV ou JSON de milliers d'employés en une requête
+@app.post("/api/students/bulk")
+async def bulk_students(request: Request):
+    body = await request.body()
     try:
-        cursor.execute("""
-            INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            student.Matricule,
-            student.Nom,
-            student.Prenom,
-            student.Emploi,
-            student.Affectation,
-            student.Numero,
-            student.Mail
-        ))
-        conn.commit()
-        return {"status": "ok", "message": "Employé ajouté avec succès"}
+        rows = await db.call(parse_bulk_body, body, request.headers.get("content-type", ""))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Fichier illisible : {e}")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Import limité à {BULK_MAX_ROWS} lignes")
+
+    students, lines, errors = await db.call(validate_bulk_rows, rows)
+    try:
+        if site_shards is None:
+            inserted, updated, version, refused = await upsert_students(students)
+        else:
+            inserted, updated, version, refused = await upsert_students_by_site(students)
+    except sqlite3.Error as e:
+        # Les paquets déjà validés restent en base : caches périmés quand même
+        invalidate_hash_cache()
+        invalidate_responses()
+        raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
+
+    invalidate_hash_cache()
+    if version is not None:
+        publish_directory("bulk", version)
+    errors += [{"row": lines[error["Matricule"]], **error} for error in refused]
+    return {
+        "status": "ok",
+        "received": len(rows),
+        "inserted": inserted,
+        "updated": updated,
+        "errors": sorted(errors, key=lambda e: e["row"])
+    }
+
+@app.post("/api/students")
+async def add_student(student: Etudiant):
+    student.Matricule = normalize_matricule(student.Matricule)
+    target = None
+    if site_shards is not None:
+        # Unicité du matricule vérifiée sur tous les sites avant l'insertion dans le sien
+        if await shard_for_matricule(student.Matricule) is not None:
+            raise HTTPException(status_code=400, detail="Matricule déjà existant")
+        target = await site_db(student.Affectation)
+    try:
+        version = await run_write(insert_student, student, target=target)
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Matricule déjà existant")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
-    finally:
-        conn.close()
+    invalidate_hash_cache()
+    publish_directory("add", version, student.Matricule)
+    return {"status": "ok", "message": "Employé ajouté avec succès"}
+
+# Les écritures unitaires de l'annuaire passent par le thread d'écriture, comme les scans
+def insert_student(cursor, student):
+    version = bump_version(cursor)
+    cursor.execute("""
+        INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash, row_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        student.Matricule,
+        student.Nom,
+        student.Prenom,
+        student.Emploi,
+        student.Affectation,
+        student.Numero,
+        student.Mail,
+        hash_matricule(student.Matricule),
+        version
+    ))
+    cursor.execute("DELETE FROM employe_supprime WHERE Matricule = ?", (student.Matricule,))
+    return version
 
 
 
 @app.put("/api/students/{matricule}")
-def update_student(matricule: int, student: Etudiant):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+async def update_student(matricule: int, student: Etudiant):
     try:
-        cursor.execute("""
-            UPDATE gestion_employe
-            SET Nom = ?, Prenom = ?, Emploi = ?, Affectation = ?, Numero = ?, Mail = ?
-            WHERE Matricule = ?
-        """, (
-            student.Nom,
-            student.Prenom,
-            student.Emploi,
-            student.Affectation,
-            student.Numero,
-            student.Mail,
-            matricule
-        ))
-        conn.commit()
-        return {"status": "ok", "message": "Employé mis à jour"}
+        source = None if site_shards is None else await shard_for_matricule(matricule)
+        if site_shards is not None and source is None:
+            version = None
+        elif source is not None and source.site != shards.site_of(student.Affectation):
+            version = await move_student(source, matricule, student)
+        else:
+            version = await run_write(save_student, matricule, student, target=source and source.db)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
-    finally:
-        conn.close()
+    invalidate_hash_cache()
+    if version is not None:
+        publish_directory("update", version, matricule)
+    return {"status": "ok", "message": "Employé mis à jour"}
+
+def save_student(cursor, matricule, student, version=None):
+    version = version or bump_version(cursor)
+    cursor.execute("""
+        UPDATE gestion_employe
+        SET Nom = ?, Prenom = ?, Emploi = ?, Affectation = ?, Numero = ?, Mail = ?, row_version = ?
+        WHERE Matricule = ?
+    """, (
+        student.Nom,
+        student.Prenom,
+        student.Emploi,
+        student.Affectation,
+        student.Numero,
+        student.Mail,
+        version,
+        matricule
+    ))
+    return version
+
+# 🚚 Changement d'affectation avec une base par site : l'employé et son historique chaud
+# quittent la base de l'ancien site (dans son thread d'écriture) puis entrent dans celle
+# du nouveau ; si l'insertion échoue, ils sont remis dans la base d'origine
+async def move_student(source, matricule, student):
+    data = await run_write(shards.take_employee, matricule, target=source.db)
+    if data is None:
+        return None
+    try:
+        version = await run_write(put_student, data, matricule, student, target=await site_db(student.Affectation))
+    except BaseException:
+        await source.db.write(restore_student, data)
+        raise
+    invalidate_hash_cache()
+    return version
 
+def put_student(cursor, data, matricule, student):
+    version = bump_version(cursor)
+    shards.put_employee(cursor, data, version)
+    return save_student(cursor, matricule, student, version)
 
+def restore_student(cursor, data):
+    shards.put_employee(cursor, data, bump_version(cursor))
 
 
 @app.delete("/api/students/{matricule}")
-def delete_student(matricule: int):
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+async def delete_student(matricule: int):
+    target = None
+    if site_shards is not None:
+        shard = await shard_for_matricule(matricule)
+        if shard is None:
+            return {"status": "ok", "message": f"Employé {matricule} supprimé"}
+        target = shard.db
     try:
-        cursor.execute("DELETE FROM gestion_employe WHERE Matricule = ?", (matricule,))
-        conn.commit()
-        return {"status": "ok", "message": f"Employé {matricule} supprimé"}
+        version = await run_write(remove_student, matricule, target=target)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
-    finally:
-        conn.close()
+    invalidate_hash_cache()
+    if version is not None:
+        publish_directory("delete", version, matricule)
+    return {"status": "ok", "message": f"Employé {matricule} supprimé"}
 
+def remove_student(cursor, matricule):
+    cursor.execute("DELETE FROM gestion_employe WHERE Matricule = ?", (matricule,))
+    if not cursor.rowcount:
+        return None
+    cursor.execute("DELETE FROM presence_state WHERE Matricule = ?", (matricule,))
+    version = bump_version(cursor)
+    cursor.execute(
+        "INSERT OR REPLACE INTO employe_supprime (Matricule, version) VALUES (?, ?)",
+        (str(matricule), version)
+    )
+    return version
 
-@app.post("/api/reset_entry_exit")
-async def reset_entry_exit():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("""
-            UPDATE gestion_employe
-            SET entry_time = NULL,
-                exit_time = NULL
-        """)
-        conn.commit()
-        return {"status": "ok", "message": "Entrées et sorties réinitialisées"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur SQL : {e}")
-    finally:
-        conn.close()
 
+@app.post("/api/reset_entry_exit", status_code=202)
+async def reset_entry_exit():
+    async def finish(job):
+        publish_directory("reset_entry_exit", await latest_version())
 
+    job = start_admin_job("reset_entry_exit", plan_reset_entry_exit, finish)
+    return {"status": "ok", "message": "Réinitialisation des entrées et sorties lancée", "job_id": job.id}
 
-        
+def plan_reset_entry_exit(conn, job):
+    upto = jobs.max_key(conn, "gestion_employe", "id")
+    return [jobs.Step(
+        "gestion_employe", jobs.count_rows(conn, "gestion_employe", "id", upto), reset_entry_exit_chunk, upto
+    )]
 
+def reset_entry_exit_chunk(cursor, after, upto):
+    count, last = jobs.next_ids(cursor, "gestion_employe", after, upto)
+    if not count:
+        return 0, None
+    # Une version par paquet : un client synchronisé entre deux paquets reçoit bien les suivants
+    version = bump_version(cursor)
+    cursor.execute("""
+        UPDATE presence_state
+        SET entry_ts = NULL,
+            exit_ts = NULL,
+            day_overtime_minutes = 0,
+            version = ?
+        WHERE Matricule IN (SELECT Matricule FROM gestion_employe WHERE id > ? AND id <= ?)
+    """, (version, after, last))
+    return count, jobs.next_state(count, last)
 
+# 🔍 Requêtes chaudes vérifiées par `python migrations.py --check` (EXPLAIN QUERY PLAN)
+HOT_QUERIES = {
+    "mark_presence : hash → matricule": (SQL_FIND_BY_HASH, ("0" * 64,)),
+    "mark_presence : état de l'employé": (presence.SQL_STATE, ("BM000",)),
+    "mark_presence : cumul du jour": (
+        "SELECT overtime_minutes FROM overtime_journalier WHERE date = ? AND Matricule = ?",
+        ("2024-01-01", "BM000")
+    ),
+    "lot hors ligne : scan déjà reçu": (SQL_SCAN_SEEN, ("00000000-0000-0000-0000-000000000000",)),
+    "logs d'un employé": (SQL_LOGS_BY_STUDENT, ("BM000",)),
+    "logs d'un employé : plage": (
+        SQL_LOGS_BY_STUDENT_RANGE.format(table="presence_journaliere", join="JOIN"),
+        ("BM000", *clock.day_bounds(date(2024, 1, 1), date(2024, 1, 31)))
+    ),
+    "annuaire : première page": students_query(list(STUDENT_FIELDS), page_size=50),
+    "annuaire : page suivante": students_query(["Matricule", "Nom"], after=("NOM", "BM000"), page_size=50),
+    "annuaire : filtre affectation": students_query(["Matricule"], affectation="SITE", page_size=50),
+    "annuaire : filtre emploi": students_query(["Matricule"], emploi="GCOR", page_size=50),
+    "annuaire : présents aujourd'hui": students_query(["Matricule"], present_today=True),
+    "annuaire : recherche": search_query(list(STUDENT_FIELDS), ["rak", "jea"], 20),
+    "annuaire : recherche par matricule et emploi": search_query(list(STUDENT_FIELDS), ["031"], 20, "GCOR"),
+    "annuaire : changements": (
+        f"""
+            SELECT g.Matricule FROM gestion_employe g LEFT JOIN presence_state s ON s.Matricule = g.Matricule
+            WHERE g.Matricule IN ({SQL_CHANGED_MATRICULES})
+            ORDER BY MAX(g.row_version, COALESCE(s.version, 0)) ASC
+        """, (0, 0)
+    ),
+    "rapport HS mensuel": (
+        "SELECT Matricule FROM overtime_mensuel WHERE mois = ? ORDER BY Matricule ASC", ("2024-01",)
+    ),
+    "export journalière": (export_sql("journaliere"), clock.day_bounds(date(2024, 1, 1), date(2024, 1, 31))),
+    "export logs": (export_sql("log"), clock.day_bounds(date(2024, 1, 1), date(2024, 1, 31))),
+}
@@ -0,0 +1,288 @@
+import re
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+
+from starlette.routing import Match
+
+from profiling import current_trace
+
+# 📈 Métriques en mémoire exposées au format texte Prometheus (GET /api/metrics).
+# Chaque observation coûte un verrou et quelques additions : on peut les laisser actives.
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, None, value) for labels, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, extra, value in self.samples():
+            lines.append(f"{name}{_labels(self.labelnames, labels, extra)} {_number(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), callback=None):
+        super().__init__(name, help_text, labelnames)
+        self.callback = callback  # valeur lue au moment du scrape (profondeur de file, clients SSE…)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.callback is not None:
+            return [(self.name, (), None, self.callback())]
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        samples = []
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                samples.append((f"{self.name}_bucket", labels, f'le="{_number(bound)}"', cumulative))
+            samples.append((f"{self.name}_bucket", labels, 'le="+Inf"', count))
+            samples.append((f"{self.name}_sum", labels, None, total))
+            samples.append((f"{self.name}_count", labels, None, count))
+        return samples
+
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# 🌐 Requêtes HTTP
+HTTP_REQUESTS = Counter("baobab_http_requests_total", "Requêtes HTTP traitées", ("method", "route", "status"))
+HTTP_DURATION = Histogram("baobab_http_request_duration_seconds", "Durée des requêtes HTTP", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("baobab_http_requests_in_flight", "Requêtes HTTP en cours", ("method", "route"))
+
+# 🗄️ SQLite
+DB_QUERY_DURATION = Histogram(
+    "baobab_db_query_duration_seconds", "Durée d'exécution des requêtes SQL", ("statement",)
+)
+DB_FETCH_DURATION = Histogram(
+    "baobab_db_fetch_duration_seconds", "Durée de lecture des résultats SQL", ("statement",)
+)
+DB_ERRORS = Counter("baobab_db_errors_total", "Erreurs SQLite par requête", ("statement", "error"))
+DB_POOL_ACQUIRE = Histogram("baobab_db_pool_acquire_seconds", "Attente d'une connexion du pool")
+DB_LOCK_WAIT = Histogram(
+    "baobab_db_lock_wait_seconds", "Attente du verrou d'écriture SQLite (BEGIN IMMEDIATE)", ("source",)
+)
+
+# ✍️ Thread d'écriture
+WRITER_QUEUE_WAIT = Histogram("baobab_writer_queue_wait_seconds", "Temps passé en file avant écriture")
+WRITER_GROUP_SIZE = Histogram("baobab_writer_group_size", "Jobs par commit groupé", buckets=SIZE_BUCKETS)
+WRITER_COMMIT = Histogram("baobab_writer_commit_seconds", "Durée des COMMIT groupés")
+
+# 📡 Scans
+SCANS = Counter("baobab_scans_total", "Scans par résultat", ("outcome",))
+HASH_LOOKUPS = Counter("baobab_hash_lookups_total", "Résolutions hash → matricule", ("source",))
+
+# 📦 Cache des réponses (response_cache.py)
+RESPONSE_CACHE = Counter("baobab_response_cache_total", "Réponses GET servies depuis le cache ou recalculées", ("route", "result"))
+
+
+# 🏷️ Nom court d'une requête SQL pour les étiquettes : nom déclaré, sinon "verbe table"
+_statement_names = {}
+_STATEMENT_NAMES_MAX = 1024
+_TABLE_AFTER = {
+    "SELECT": re.compile(r"\bFROM\s+(\w+)", re.I),
+    "DELETE": re.compile(r"\bFROM\s+(\w+)", re.I),
+    "INSERT": re.compile(r"\bINTO\s+(\w+)", re.I),
+    "UPDATE": re.compile(r"^\s*UPDATE\s+(\w+)", re.I),
+}
+
+
+def name_statement(sql, name):
+    _statement_names[sql] = name
+
+
+def statement_name(sql) -> str:
+    name = _statement_names.get(sql)
+    if name is not None:
+        return name
+    verb = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+    if verb == "WITH":
+        verb = "SELECT"
+    pattern = _TABLE_AFTER.get(verb)
+    match = pattern.search(sql) if pattern else None
+    name = f"{verb.lower()} {match.group(1)}" if match else verb.lower()
+    # Requêtes générées (IN (?, ?, …), filtres) : le nombre de variantes reste borné
+    if len(_statement_names) < _STATEMENT_NAMES_MAX:
+        _statement_names[sql] = name
+    return name
+
+
+def _error_kind(error) -> str:
+    return "locked" if "locked" in str(error) or "busy" in str(error) else type(error).__name__
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    _statement = None
+
+    def execute(self, sql, parameters=()):
+        self._statement = statement_name(sql)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        except sqlite3.Error as e:
+            DB_ERRORS.inc(self._statement, _error_kind(e))
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_DURATION.observe(elapsed, self._statement)
+            trace = current_trace.get()
+            if trace is not None:
+                trace.record_statement(self, self._statement, sql, parameters, elapsed)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._statement = statement_name(sql)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error as e:
+            DB_ERRORS.inc(self._statement, _error_kind(e))
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_DURATION.observe(elapsed, self._statement)
+            trace = current_trace.get()
+            if trace is not None:
+                trace.record_statement(self, self._statement, sql, None, elapsed)
+
+    def _timed_fetch(self, fetch, *args):
+        start = time.perf_counter()
+        try:
+            return fetch(*args)
+        finally:
+            if self._statement is not None:
+                DB_FETCH_DURATION.observe(time.perf_counter() - start, self._statement)
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    # Passé en factory à sqlite3.connect : toutes les requêtes des routes sont chronométrées
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# 🔌 Middleware ASGI : compteurs, durées et requêtes en cours par route (gabarit, pas URL brute)
+def route_template(app, scope) -> str:
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = route_template(scope["app"], scope) if "app" in scope else "unmatched"
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method, route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_DURATION.observe(time.perf_counter() - start, method, route)
+            HTTP_REQUESTS.inc(method, route, str(status[0]))
+            HTTP_IN_FLIGHT.dec(method, route)
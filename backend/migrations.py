@@ -0,0 +1,543 @@
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import clock
+
+# 🧱 Migrations numérotées, appliquées une seule fois chacune et dans l'ordre.
+# La version courante du schéma est stockée dans PRAGMA user_version.
+# Une migration publiée ne se modifie plus : on en ajoute une nouvelle.
+MIGRATIONS = []
+
+# Journal du serveur (uvicorn) ; en ligne de commande, avertissements sur la sortie d'erreur
+log = logging.getLogger("uvicorn.error")
+
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    applied = []
+    for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version <= schema_version(conn):
+            continue
+        # Verrou d'écriture pris d'emblée : deux workers ne migrent pas en même temps
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= schema_version(conn):
+                conn.rollback()
+                continue
+            fn(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        applied.append((version, name))
+    return applied
+
+
+# 🔧 Utilitaires des migrations (les bases antérieures au moteur ont déjà une partie du schéma)
+def _columns(cursor, table):
+    return {c[1] for c in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _add_column(cursor, table, column, declaration):
+    if column not in _columns(cursor, table):
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return True
+    return False
+
+
+def _has_index_on(cursor, table, column):
+    for index in cursor.execute(f"PRAGMA index_list({table})").fetchall():
+        first = cursor.execute(f"PRAGMA index_info({index[1]})").fetchone()
+        if first and first[2] == column:
+            return True
+    return False
+
+
+def _parse_overtime(text) -> int:
+    try:
+        h, m = map(int, str(text).replace("H", ":").split(":"))
+        return h * 60 + m
+    except (TypeError, ValueError):
+        return 0
+
+
+@migration(1, "tables employés, logs et présences journalières")
+def _m001_base_tables(cursor):
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS gestion_employe (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Matricule INTEGER UNIQUE,
+        Nom TEXT,
+        Prenom TEXT,
+        Emploi TEXT,
+        Affectation TEXT,
+        Numero TEXT,
+        Mail TEXT
+      )
+    """)
+    _add_column(cursor, "gestion_employe", "Presence", "INTEGER DEFAULT 0")
+    _add_column(cursor, "gestion_employe", "entry_time", "TEXT")
+    _add_column(cursor, "gestion_employe", "exit_time", "TEXT")
+    _add_column(cursor, "gestion_employe", "overtime", "TEXT DEFAULT '0H00'")
+    _add_column(cursor, "gestion_employe", "overtime_amount", "INTEGER DEFAULT 0")
+
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS presence_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Matricule INTEGER,
+        date_heure TEXT
+      )
+    """)
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS presence_journaliere (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        Matricule INTEGER,
+        date TEXT,
+        entry_time TEXT,
+        exit_time TEXT,
+        overtime TEXT,
+        overtime_amount INTEGER
+      )
+    """)
+
+
+@migration(2, "hash SHA-256 du matricule indexé")
+def _m002_matricule_hash(cursor):
+    _add_column(cursor, "gestion_employe", "matricule_hash", "TEXT")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gestion_employe_matricule_hash ON gestion_employe(matricule_hash)"
+    )
+    missing = cursor.execute(
+        "SELECT id, Matricule FROM gestion_employe WHERE matricule_hash IS NULL"
+    ).fetchall()
+    cursor.executemany(
+        "UPDATE gestion_employe SET matricule_hash = ? WHERE id = ?",
+        [(hashlib.sha256(str(matricule).encode()).hexdigest(), row_id) for row_id, matricule in missing]
+    )
+
+
+@migration(3, "index de l'annuaire paginé et de ses filtres")
+def _m003_directory_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gestion_employe_nom ON gestion_employe(Nom, Matricule)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gestion_employe_affectation ON gestion_employe(Affectation, Nom, Matricule)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_gestion_employe_emploi ON gestion_employe(Emploi, Nom, Matricule)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gestion_employe_entry_time ON gestion_employe(entry_time)")
+
+
+@migration(4, "version des données et employés supprimés")
+def _m004_sync_state(cursor):
+    _add_column(cursor, "gestion_employe", "row_version", "INTEGER DEFAULT 0")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gestion_employe_row_version ON gestion_employe(row_version)")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS sync_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL DEFAULT 0,
+        reset_version INTEGER NOT NULL DEFAULT 0
+      )
+    """)
+    # On part de 1 : since=0 désigne toujours un client sans état
+    cursor.execute("INSERT OR IGNORE INTO sync_state (id, version, reset_version) VALUES (1, 1, 1)")
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS employe_supprime (
+        Matricule TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+      )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_employe_supprime_version ON employe_supprime(version)")
+
+
+@migration(5, "cumuls d'heures sup. jour / mois")
+def _m005_overtime_rollups(cursor):
+    if _add_column(cursor, "gestion_employe", "overtime_minutes", "INTEGER DEFAULT 0"):
+        cursor.executemany(
+            "UPDATE gestion_employe SET overtime_minutes = ? WHERE id = ?",
+            [(_parse_overtime(ot), row_id) for row_id, ot in cursor.execute(
+                "SELECT id, overtime FROM gestion_employe WHERE overtime IS NOT NULL"
+            ).fetchall()]
+        )
+
+    tables = {t[0] for t in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS overtime_journalier (
+        date TEXT NOT NULL,
+        Matricule TEXT NOT NULL,
+        overtime_minutes INTEGER NOT NULL DEFAULT 0,
+        overtime_amount INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, Matricule)
+      ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS overtime_mensuel (
+        mois TEXT NOT NULL,
+        Matricule TEXT NOT NULL,
+        overtime_minutes INTEGER NOT NULL DEFAULT 0,
+        overtime_amount INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (mois, Matricule)
+      ) WITHOUT ROWID
+    """)
+    if "overtime_journalier" in tables:
+        return
+
+    totals = {}
+    for matricule, day, ot, amount in cursor.execute(
+        "SELECT Matricule, date, overtime, overtime_amount FROM presence_journaliere"
+    ).fetchall():
+        entry = totals.setdefault((day, str(matricule)), [0, 0])
+        entry[0] += _parse_overtime(ot)
+        entry[1] += amount or 0
+    cursor.executemany(
+        "INSERT INTO overtime_journalier (date, Matricule, overtime_minutes, overtime_amount) VALUES (?, ?, ?, ?)",
+        [(day, matricule, minutes, amount) for (day, matricule), (minutes, amount) in totals.items()]
+    )
+    cursor.execute("""
+        INSERT INTO overtime_mensuel (mois, Matricule, overtime_minutes, overtime_amount)
+        SELECT substr(date, 1, 7), Matricule, SUM(overtime_minutes), SUM(overtime_amount)
+        FROM overtime_journalier
+        GROUP BY substr(date, 1, 7), Matricule
+    """)
+
+
+@migration(6, "index des plages de dates de l'export paie")
+def _m006_export_indexes(cursor):
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_log_date_heure ON presence_log(date_heure)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_journaliere_date ON presence_journaliere(date)")
+
+
+@migration(7, "index des recherches par matricule")
+def _m007_matricule_indexes(cursor):
+    # Les bases créées avant la contrainte UNIQUE n'ont aucun index sur Matricule :
+    # chaque UPDATE ... WHERE Matricule = ? du scan parcourait toute la table
+    if not _has_index_on(cursor, "gestion_employe", "Matricule"):
+        try:
+            cursor.execute(
+                "CREATE UNIQUE INDEX idx_gestion_employe_matricule ON gestion_employe(Matricule)"
+            )
+        except sqlite3.IntegrityError:
+            cursor.execute("CREATE INDEX idx_gestion_employe_matricule ON gestion_employe(Matricule)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_presence_log_matricule ON presence_log(Matricule, date_heure)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_presence_journaliere_matricule "
+        "ON presence_journaliere(Matricule, entry_time)"
+    )
+
+
+@migration(8, "instantanés des cumuls avant réinitialisation")
+def _m008_presence_snapshot(cursor):
+    cursor.execute("""
+      CREATE TABLE IF NOT EXISTS presence_snapshot (
+        snapshot_id TEXT NOT NULL,
+        taken_at TEXT NOT NULL,
+        Matricule TEXT NOT NULL,
+        Nom TEXT,
+        Prenom TEXT,
+        Affectation TEXT,
+        Presence INTEGER,
+        overtime_minutes INTEGER,
+        overtime_amount INTEGER,
+        PRIMARY KEY (snapshot_id, Matricule)
+      ) WITHOUT ROWID
+    """)
+
+
+@migration(9, "horodatages en secondes UTC entières et index de plages")
+def _m009_epoch_columns(cursor):
+    # Les textes existants (heure locale du serveur) sont convertis une fois ; les
+    # comparaisons de dates ne portent plus que sur ces entiers (voir clock.py)
+    epochs = {
+        "presence_log": {"ts": "date_heure"},
+        "presence_journaliere": {"entry_ts": "entry_time", "exit_ts": "exit_time"},
+        "gestion_employe": {"entry_ts": "entry_time", "exit_ts": "exit_time"},
+    }
+    for table, columns in epochs.items():
+        for column, text in columns.items():
+            if _add_column(cursor, table, column, "INTEGER"):
+                cursor.execute(
+                    f"UPDATE {table} SET {column} = {clock.sql_epoch(text)} WHERE {text} IS NOT NULL AND {text} != ''"
+                )
+
+    # Index texte remplacés par leurs équivalents entiers (clés ~4x plus courtes)
+    for index in ("idx_presence_log_date_heure", "idx_presence_log_matricule",
+                  "idx_presence_journaliere_date", "idx_presence_journaliere_matricule",
+                  "idx_gestion_employe_entry_time"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_log_ts ON presence_log(ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_log_matricule_ts ON presence_log(Matricule, ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_journaliere_entry_ts ON presence_journaliere(entry_ts)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_presence_journaliere_matricule_ts ON presence_journaliere(Matricule, entry_ts)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_gestion_employe_entry_ts ON gestion_employe(entry_ts)")
+
+
+@migration(10, "index plein texte de l'annuaire (FTS5)")
+def _m010_directory_search(cursor):
+    # Table FTS5 à contenu externe : seul l'index est stocké, les textes restent dans
+    # gestion_employe. Le trigger de mise à jour ne porte que sur les colonnes indexées :
+    # les UPDATE des scans (Presence, entry_time...) ne le déclenchent pas.
+    try:
+        cursor.execute("""
+          CREATE VIRTUAL TABLE IF NOT EXISTS employe_fts USING fts5(
+            Matricule, Nom, Prenom, Emploi, Affectation,
+            content='gestion_employe', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+          )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite compilé sans FTS5 : la recherche se rabat sur LIKE (voir main.py)
+        log.warning("⚠️ Recherche plein texte indisponible : %s", e)
+        return
+    cursor.execute("""
+      CREATE TRIGGER IF NOT EXISTS employe_fts_insert AFTER INSERT ON gestion_employe BEGIN
+        INSERT INTO employe_fts (rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES (new.id, new.Matricule, new.Nom, new.Prenom, new.Emploi, new.Affectation);
+      END
+    """)
+    cursor.execute("""
+      CREATE TRIGGER IF NOT EXISTS employe_fts_delete AFTER DELETE ON gestion_employe BEGIN
+        INSERT INTO employe_fts (employe_fts, rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES ('delete', old.id, old.Matricule, old.Nom, old.Prenom, old.Emploi, old.Affectation);
+      END
+    """)
+    cursor.execute("""
+      CREATE TRIGGER IF NOT EXISTS employe_fts_update
+      AFTER UPDATE OF Matricule, Nom, Prenom, Emploi, Affectation ON gestion_employe BEGIN
+        INSERT INTO employe_fts (employe_fts, rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES ('delete', old.id, old.Matricule, old.Nom, old.Prenom, old.Emploi, old.Affectation);
+        INSERT INTO employe_fts (rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES (new.id, new.Matricule, new.Nom, new.Prenom, new.Emploi, new.Affectation);
+      END
+    """)
+    cursor.execute("INSERT INTO employe_fts (employe_fts) VALUES ('rebuild')")
+
+
+@migration(11, "état de présence des employés hors de leur fiche")
+def _m011_presence_state(cursor):
+    # Une ligne étroite par employé, écrite à chaque scan (voir presence.py) ; la fiche
+    # gestion_employe ne change plus qu'avec l'annuaire. Matricule du même type que dans
+    # gestion_employe (VARCHAR sur les anciennes bases) : mêmes comparaisons des deux côtés.
+    declared = next(
+        (c[2] for c in cursor.execute("PRAGMA table_info(gestion_employe)") if c[1] == "Matricule"), "INTEGER"
+    )
+    cursor.execute(f"""
+      CREATE TABLE IF NOT EXISTS presence_state (
+        Matricule {declared or "INTEGER"} NOT NULL PRIMARY KEY,
+        Presence INTEGER NOT NULL DEFAULT 0,
+        entry_ts INTEGER,
+        exit_ts INTEGER,
+        day_overtime_minutes INTEGER NOT NULL DEFAULT 0,
+        overtime_minutes INTEGER NOT NULL DEFAULT 0,
+        overtime_amount INTEGER NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0
+      ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_state_entry_ts ON presence_state(entry_ts)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_presence_state_version ON presence_state(version)")
+    # Totaux d'un employé (reconstruction, voir presence.py) sans parcourir tous les mois
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_overtime_mensuel_matricule ON overtime_mensuel(Matricule)")
+
+    columns = _columns(cursor, "gestion_employe")
+    if "entry_ts" not in columns:
+        return
+    # Matricules en double (bases sans contrainte UNIQUE) : la première fiche l'emporte
+    cursor.execute(f"""
+        INSERT OR IGNORE INTO presence_state
+        (Matricule, Presence, entry_ts, exit_ts, day_overtime_minutes, overtime_minutes, overtime_amount, version)
+        SELECT g.Matricule, COALESCE(g.Presence, 0), g.entry_ts, g.exit_ts,
+               COALESCE((
+                   SELECT oj.overtime_minutes FROM overtime_journalier oj
+                   WHERE oj.Matricule = g.Matricule
+                     AND oj.date = date(g.entry_ts + {clock.SITE_TZ_OFFSET_MINUTES * 60}, 'unixepoch')
+               ), 0),
+               COALESCE(g.overtime_minutes, 0), COALESCE(g.overtime_amount, 0), COALESCE(g.row_version, 0)
+        FROM gestion_employe g
+        WHERE g.Matricule IS NOT NULL
+          AND (COALESCE(g.Presence, 0) != 0 OR g.entry_ts IS NOT NULL
+               OR COALESCE(g.overtime_minutes, 0) != 0 OR COALESCE(g.overtime_amount, 0) != 0)
+        ORDER BY g.id
+    """)
+    cursor.execute("DROP INDEX IF EXISTS idx_gestion_employe_entry_ts")
+    for column in ("Presence", "entry_time", "exit_time", "entry_ts", "exit_ts",
+                   "overtime", "overtime_minutes", "overtime_amount"):
+        if column in columns:
+            cursor.execute(f"ALTER TABLE gestion_employe DROP COLUMN {column}")
+
+
+@migration(12, "identifiant des scans rejoués hors ligne")
+def _m012_scan_id(cursor):
+    # Un lot renvoyé par une tablette (réponse perdue, nouvel essai) ne réapplique pas des
+    # scans déjà enregistrés lors d'une requête précédente. Index partiel : les scans en
+    # direct n'ont pas d'identifiant.
+    _add_column(cursor, "presence_log", "scan_id", "TEXT")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_presence_log_scan_id ON presence_log(scan_id) WHERE scan_id IS NOT NULL"
+    )
+
+
+@migration(13, "textes d'affichage réécrits à l'heure du site")
+def _m013_display_text(cursor):
+    # Les textes antérieurs à la migration 9 sont restés à l'heure du serveur : ils sont
+    # recalculés depuis les horodatages, comme ceux écrits depuis (seules les lignes qui
+    # diffèrent sont réécrites ; aucune si le serveur était déjà à l'heure du site)
+    texts = {
+        "presence_log": {"date_heure": ("ts", clock.sql_format("ts"))},
+        "presence_journaliere": {
+            "date": ("entry_ts", clock.sql_day("entry_ts")),
+            "entry_time": ("entry_ts", clock.sql_format("entry_ts")),
+            "exit_time": ("exit_ts", clock.sql_format("exit_ts")),
+        },
+    }
+    for table, columns in texts.items():
+        for column, (source, expression) in columns.items():
+            cursor.execute(
+                f"UPDATE {table} SET {column} = {expression} WHERE {source} IS NOT NULL AND {column} IS NOT {expression}"
+            )
+
+
+
+@migration(14, "index plein texte de l'annuaire recréé")
+def _m014_directory_search_rebuild(cursor):
+    # La migration 10 reste telle que publiée : table FTS5 et triggers recréés ici depuis
+    # zéro, y compris sur les bases où elle a été sautée faute de FTS5, puis l'index est
+    # reconstruit depuis gestion_employe
+    for trigger in ("employe_fts_insert", "employe_fts_delete", "employe_fts_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    try:
+        cursor.execute("DROP TABLE IF EXISTS employe_fts")
+        cursor.execute("""
+          CREATE VIRTUAL TABLE employe_fts USING fts5(
+            Matricule, Nom, Prenom, Emploi, Affectation,
+            content='gestion_employe', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+          )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite compilé sans FTS5 : la recherche se rabat sur LIKE (voir main.py)
+        log.warning("⚠️ Recherche plein texte indisponible : %s", e)
+        return
+    cursor.execute("""
+      CREATE TRIGGER employe_fts_insert AFTER INSERT ON gestion_employe BEGIN
+        INSERT INTO employe_fts (rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES (new.id, new.Matricule, new.Nom, new.Prenom, new.Emploi, new.Affectation);
+      END
+    """)
+    cursor.execute("""
+      CREATE TRIGGER employe_fts_delete AFTER DELETE ON gestion_employe BEGIN
+        INSERT INTO employe_fts (employe_fts, rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES ('delete', old.id, old.Matricule, old.Nom, old.Prenom, old.Emploi, old.Affectation);
+      END
+    """)
+    cursor.execute("""
+      CREATE TRIGGER employe_fts_update
+      AFTER UPDATE OF Matricule, Nom, Prenom, Emploi, Affectation ON gestion_employe BEGIN
+        INSERT INTO employe_fts (employe_fts, rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES ('delete', old.id, old.Matricule, old.Nom, old.Prenom, old.Emploi, old.Affectation);
+        INSERT INTO employe_fts (rowid, Matricule, Nom, Prenom, Emploi, Affectation)
+        VALUES (new.id, new.Matricule, new.Nom, new.Prenom, new.Emploi, new.Affectation);
+      END
+    """)
+    cursor.execute("INSERT INTO employe_fts (employe_fts) VALUES ('rebuild')")
+
+
+
+@migration(15, "identifiants des scans hors ligne conservés hors des logs archivés")
+def _m015_received_scans(cursor):
+    # presence_log part dans les archives mois par mois : un lot renvoyé après l'archivage
+    # de son mois serait rejoué. Les identifiants reçus restent ici, jamais archivés ;
+    # Matricule pour suivre l'employé d'un site à l'autre (voir shards.py).
+    declared = next(
+        (c[2] for c in cursor.execute("PRAGMA table_info(gestion_employe)") if c[1] == "Matricule"), "INTEGER"
+    )
+    cursor.execute(f"""
+      CREATE TABLE IF NOT EXISTS scan_recu (
+        scan_id TEXT NOT NULL PRIMARY KEY,
+        Matricule {declared or "INTEGER"} NOT NULL,
+        ts INTEGER NOT NULL
+      ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_recu_matricule ON scan_recu(Matricule)")
+    cursor.execute("""
+        INSERT OR IGNORE INTO scan_recu (scan_id, Matricule, ts)
+        SELECT scan_id, Matricule, ts FROM presence_log WHERE scan_id IS NOT NULL
+    """)
+
+
+# 🔍 Vérification : chaque requête chaude doit passer par un index
+def explain(conn, sql, params):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def full_scans(plan):
+    # "SCAN t" sans index = parcours complet ; "SCAN t USING [COVERING] INDEX" reste borné par l'index.
+    # Le parcours d'une sous-requête matérialisée ou en co-routine (MATERIALIZE f … SCAN f,
+    # CO-ROUTINE (subquery-1) … SCAN (subquery-1)) est borné par le plan de la sous-requête,
+    # vérifié lui aussi.
+    materialized = {step.split()[1] for step in plan if step.startswith(("MATERIALIZE", "CO-ROUTINE"))}
+    return [
+        step for step in plan
+        if step.startswith("SCAN") and "INDEX" not in step and step.split()[1] not in materialized
+    ]
+
+
+def check_query_plans(conn, queries):
+    failures = []
+    for name, (sql, params) in queries.items():
+        plan = explain(conn, sql, params)
+        scans = full_scans(plan)
+        status = "ÉCHEC" if scans else "ok"
+        print(f"[{status}] {name}")
+        for step in plan:
+            print(f"        {step}")
+        if scans:
+            failures.append(name)
+    return failures
+
+
+if __name__ == "__main__":
+    # python migrations.py          → migre DB_FILE
+    # python migrations.py --check  → migre une copie de DB_FILE et vérifie les plans des requêtes chaudes
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    import main
+
+    if "--check" not in sys.argv:
+        with main.db_pool.connection() as conn:
+            for version, name in migrate(conn):
+                print(f"✅ migration {version} : {name}")
+            print(f"Schéma en version {schema_version(conn)}")
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, "check.db")
+        if os.path.exists(main.DB_FILE):
+            shutil.copyfile(main.DB_FILE, copy)
+        conn = sqlite3.connect(copy)
+        migrate(conn)
+        failures = check_query_plans(conn, main.HOT_QUERIES)
+        conn.close()
+
+    if failures:
+        print(f"\n❌ Requêtes sans index : {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ Toutes les requêtes chaudes utilisent un index")
@@ -0,0 +1,266 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import clock
+from archive import month_bounds, months_between, segments
+
+# ⏰ Règle des heures sup. : minutes après le seuil (heure du site) au moment de la sortie,
+# payées au taux horaire. Utilisée par chaque scan et par le recalcul en masse depuis
+# presence_log (changement de règle, correction d'un bug) : POST /api/overtime/recompute
+# ou `python overtime.py recompute --from AAAA-MM-JJ --to AAAA-MM-JJ`.
+# La règle vient de l'environnement : pour en changer, modifier OVERTIME_* et redémarrer
+# le serveur, puis recalculer la plage concernée avec cette même règle.
+OVERTIME_THRESHOLD = os.getenv("OVERTIME_THRESHOLD", "16:00")
+OVERTIME_TZ_OFFSET_MINUTES = int(os.getenv("OVERTIME_TZ_OFFSET_MINUTES", str(clock.SITE_TZ_OFFSET_MINUTES)))
+OVERTIME_RATE = int(os.getenv("OVERTIME_RATE", "10000"))                          # Ar / heure
+OVERTIME_CHUNK_DAYS = int(os.getenv("OVERTIME_CHUNK_DAYS", "1"))                  # jours par transaction
+
+
+class Policy:
+    def __init__(self, threshold=OVERTIME_THRESHOLD, tz_offset_minutes=OVERTIME_TZ_OFFSET_MINUTES,
+                 rate=OVERTIME_RATE):
+        hours, minutes = map(int, str(threshold).split(":"))
+        if not (0 <= hours < 24 and 0 <= minutes < 60):
+            raise ValueError(f"Seuil invalide : {threshold}")
+        if int(rate) < 0:
+            raise ValueError(f"Taux invalide : {rate}")
+        self.threshold = f"{hours:02d}:{minutes:02d}"
+        self.threshold_minutes = hours * 60 + minutes
+        self.tz_offset_minutes = int(tz_offset_minutes)
+        self.tz = timezone(timedelta(minutes=self.tz_offset_minutes))
+        self.rate = int(rate)
+
+    def to_dict(self):
+        return {"threshold": self.threshold, "tz_offset_minutes": self.tz_offset_minutes, "rate": self.rate}
+
+    # 📡 Un scan de sortie
+    def overtime_minutes(self, scanned_at: datetime) -> int:
+        local = scanned_at.astimezone(self.tz)
+        return max(0, local.hour * 60 + local.minute - self.threshold_minutes)
+
+    def amount(self, minutes: int) -> int:
+        # Arithmétique entière, identique au recalcul SQL
+        return minutes * self.rate // 60
+
+    def day_bounds(self, start: date, end: date):
+        # Journées [start, end] de la règle en secondes UTC : bornes indexables sur ts / entry_ts
+        return clock.day_bounds(start, end, self.tz)
+
+
+# 🧮 Recalcul ensembliste : une journée = premier scan (entrée) et dernier scan (sortie)
+# par employé, dès deux scans ; HS = dernière sortie − seuil, heure du site
+SQL_FORMAT_MINUTES = "({m} / 60) || 'H' || printf('%02d', {m} % 60)"
+
+SQL_FORMAT_TIME = "strftime('%Y-%m-%d %H:%M:%S', {ts} + :display, 'unixepoch')"
+
+SQL_DAILY = f"""
+    INSERT INTO temp.overtime_recompute
+    (Matricule, day, entry_ts, exit_ts, entry_time, exit_time, overtime_minutes, overtime, overtime_amount)
+    SELECT Matricule, date(day * 86400, 'unixepoch'), entry_ts, exit_ts,
+           {SQL_FORMAT_TIME.format(ts="entry_ts")}, {SQL_FORMAT_TIME.format(ts="exit_ts")}, minutes,
+           {SQL_FORMAT_MINUTES.format(m="minutes")}, minutes * :rate / 60
+    FROM (
+        -- Arithmétique entière sur les secondes UTC : aucun texte lu ni analysé par scan
+        SELECT Matricule, (ts + :offset) / 86400 AS day, MIN(ts) AS entry_ts, MAX(ts) AS exit_ts,
+               MAX(0, (MAX(ts) + :offset) % 86400 / 60 - :threshold) AS minutes
+        FROM presence_log
+        WHERE ts >= :low AND ts < :high
+        GROUP BY Matricule, day
+        HAVING COUNT(*) >= 2
+    )
+"""
+
+
+def archived_in_range(start: date, end: date, directory=None):
+    # Les mois archivés n'ont plus leurs logs dans la base principale : pas de recalcul partiel
+    return [month for _, _, month in segments(start, end, directory) if month]
+
+
+def recompute_days(cursor, policy: Policy, start: date, end: date) -> int:
+    # Aligne presence_journaliere / overtime_journalier sur [start, end] (sans commit).
+    # Seules les lignes qui changent sont écrites : un recalcul sans changement de règle
+    # ne touche presque aucun index, un changement de taux se fait par UPDATE sur place.
+    low, high = policy.day_bounds(start, end)
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS overtime_recompute (
+            Matricule INTEGER, day TEXT, entry_ts INTEGER, exit_ts INTEGER, entry_time TEXT, exit_time TEXT,
+            overtime_minutes INTEGER, overtime TEXT, overtime_amount INTEGER
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS temp.idx_overtime_recompute ON overtime_recompute(Matricule, entry_ts)")
+    cursor.execute("DELETE FROM temp.overtime_recompute")
+    cursor.execute(SQL_DAILY, {
+        "rate": policy.rate,
+        "offset": policy.tz_offset_minutes * 60,
+        "display": clock.SITE_TZ_OFFSET_MINUTES * 60,
+        "threshold": policy.threshold_minutes,
+        "low": low,
+        "high": high,
+    })
+
+    # Journées disparues, déplacées ou en double (anciennes sorties multiples) : supprimées
+    cursor.execute("""
+        DELETE FROM presence_journaliere
+        WHERE entry_ts >= ? AND entry_ts < ?
+          AND (
+            NOT EXISTS (
+                SELECT 1 FROM temp.overtime_recompute r
+                WHERE r.Matricule = presence_journaliere.Matricule
+                  AND r.entry_ts = presence_journaliere.entry_ts
+                  AND r.day = presence_journaliere.date
+                  AND r.overtime_minutes > 0
+            )
+            OR id NOT IN (
+                SELECT MIN(id) FROM presence_journaliere
+                WHERE entry_ts >= ? AND entry_ts < ?
+                GROUP BY Matricule, entry_ts
+            )
+          )
+    """, (low, high, low, high))
+    cursor.execute("""
+        UPDATE presence_journaliere
+        SET exit_ts = r.exit_ts, exit_time = r.exit_time, overtime = r.overtime, overtime_amount = r.overtime_amount
+        FROM temp.overtime_recompute r
+        WHERE r.Matricule = presence_journaliere.Matricule
+          AND r.entry_ts = presence_journaliere.entry_ts
+          AND presence_journaliere.entry_ts >= ? AND presence_journaliere.entry_ts < ?
+          AND (presence_journaliere.exit_ts IS NOT r.exit_ts
+               OR presence_journaliere.overtime IS NOT r.overtime
+               OR presence_journaliere.overtime_amount IS NOT r.overtime_amount)
+    """, (low, high))
+    cursor.execute("""
+        INSERT INTO presence_journaliere
+        (Matricule, date, entry_time, exit_time, entry_ts, exit_ts, overtime, overtime_amount)
+        SELECT Matricule, day, entry_time, exit_time, entry_ts, exit_ts, overtime, overtime_amount
+        FROM temp.overtime_recompute r
+        WHERE overtime_minutes > 0
+          AND NOT EXISTS (
+            SELECT 1 FROM presence_journaliere pj
+            WHERE pj.Matricule = r.Matricule AND pj.entry_ts = r.entry_ts
+          )
+        ORDER BY exit_ts
+    """)
+
+    # Cumuls du jour : clés texte AAAA-MM-JJ, inchangées
+    first, last = start.isoformat(), (end + timedelta(days=1)).isoformat()
+    cursor.execute("""
+        DELETE FROM overtime_journalier
+        WHERE date >= ? AND date < ?
+          AND NOT EXISTS (
+            SELECT 1 FROM temp.overtime_recompute r
+            WHERE r.Matricule = overtime_journalier.Matricule
+              AND r.day = overtime_journalier.date
+              AND r.overtime_minutes > 0
+          )
+    """, (first, last))
+    cursor.execute("""
+        INSERT INTO overtime_journalier (date, Matricule, overtime_minutes, overtime_amount)
+        SELECT day, Matricule, overtime_minutes, overtime_amount
+        FROM temp.overtime_recompute
+        WHERE overtime_minutes > 0
+        ORDER BY day, Matricule
+        ON CONFLICT (date, Matricule) DO UPDATE SET
+            overtime_minutes = excluded.overtime_minutes,
+            overtime_amount = excluded.overtime_amount
+        WHERE overtime_minutes IS NOT excluded.overtime_minutes
+           OR overtime_amount IS NOT excluded.overtime_amount
+    """)
+    days = cursor.execute(
+        "SELECT COUNT(*) FROM temp.overtime_recompute WHERE overtime_minutes > 0"
+    ).fetchone()[0]
+    cursor.execute("DELETE FROM temp.overtime_recompute")
+    return days
+
+
+def rebuild_month(cursor, month: str) -> int:
+    # Cumul mensuel recalculé depuis overtime_journalier (sans commit)
+    low, high = month_bounds(month)
+    cursor.execute("DELETE FROM overtime_mensuel WHERE mois = ?", (month,))
+    return cursor.execute("""
+        INSERT INTO overtime_mensuel (mois, Matricule, overtime_minutes, overtime_amount)
+        SELECT ?, Matricule, SUM(overtime_minutes), SUM(overtime_amount)
+        FROM overtime_journalier
+        WHERE date >= ? AND date < ?
+        GROUP BY Matricule
+    """, (month, low, high)).rowcount
+
+
+def rebuild_totals(cursor, version: int) -> int:
+    # Totaux de chaque employé (presence_state) = somme de ses cumuls mensuels ; seules les
+    # lignes modifiées prennent la nouvelle version (sans commit)
+    changed = cursor.execute("""
+        INSERT INTO presence_state (Matricule, overtime_minutes, overtime_amount, version)
+        SELECT g.Matricule, t.minutes, t.amount, ?
+        FROM (
+            SELECT Matricule, SUM(overtime_minutes) AS minutes, SUM(overtime_amount) AS amount
+            FROM overtime_mensuel
+            GROUP BY Matricule
+        ) AS t
+        JOIN gestion_employe g ON g.Matricule = t.Matricule
+        WHERE true
+        ON CONFLICT (Matricule) DO UPDATE SET
+            overtime_minutes = excluded.overtime_minutes,
+            overtime_amount = excluded.overtime_amount,
+            version = excluded.version
+        WHERE overtime_minutes IS NOT excluded.overtime_minutes OR overtime_amount IS NOT excluded.overtime_amount
+    """, (version,)).rowcount
+    changed += cursor.execute("""
+        UPDATE presence_state
+        SET overtime_minutes = 0, overtime_amount = 0, version = ?
+        WHERE (overtime_minutes != 0 OR overtime_amount != 0)
+          AND Matricule NOT IN (SELECT Matricule FROM overtime_mensuel)
+    """, (version,)).rowcount
+    return changed
+
+
+def chunks(start: date, end: date, days=OVERTIME_CHUNK_DAYS):
+    # [début, fin] inclus, par tranches de `days` jours
+    day = start
+    while day <= end:
+        last = min(end, day + timedelta(days=max(1, days) - 1))
+        yield day, last
+        day = last + timedelta(days=1)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    recompute = commands.add_parser("recompute", help="recalcule les HS d'une plage depuis presence_log")
+    recompute.add_argument("--from", dest="start", type=date.fromisoformat, required=True)
+    recompute.add_argument("--to", dest="end", type=date.fromisoformat, required=True)
+    args = parser.parse_args()
+
+    if args.end < args.start:
+        parser.error("la date de fin précède la date de début")
+
+    import main
+
+    # Règle en vigueur (celle des scans) ; une base par site : chaque base est recalculée
+    policy = main.OVERTIME_POLICY
+    if main.site_shards is not None:
+        main.site_shards.open_all()
+    archived = main.archived_in_range(args.start, args.end)
+    if archived:
+        parser.error(f"mois archivés dans la plage : {', '.join(archived)}")
+
+    started = time.perf_counter()
+    total_days = changed = 0
+    for shard in main.all_shards():
+        with shard.pool.connection() as conn:
+            for low, high in chunks(args.start, args.end):
+                total_days += recompute_days(conn.cursor(), policy, low, high)
+                conn.commit()
+            for month in months_between(args.start, args.end):
+                rebuild_month(conn.cursor(), month)
+                conn.commit()
+            cursor = conn.cursor()
+            changed += rebuild_totals(cursor, main.bump_version(cursor))
+            conn.commit()
+    print(f"✅ {total_days} journées avec HS, {changed} employés mis à jour "
+          f"en {time.perf_counter() - started:.1f} s ({policy.to_dict()})")
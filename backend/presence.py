@@ -0,0 +1,208 @@
+import argparse
+import os
+import sys
+import time
+
+import clock
+import jobs
+from archive import archived_months, attached
+
+# 📍 État courant de chaque employé : projection de presence_log, seule source de vérité.
+# Une ligne étroite par employé (presence_state, migration 11) : un scan = un INSERT dans
+# presence_log + un UPSERT de cette ligne, sans toucher la fiche gestion_employe (ni ses
+# index ni l'index plein texte). Reconstructible depuis les logs et les cumuls d'HS :
+# POST /api/presence/rebuild ou `python presence.py rebuild`.
+STATE_COLUMNS = ("Presence", "entry_ts", "exit_ts", "day_overtime_minutes", "overtime_minutes", "overtime_amount")
+
+# Lu via la fiche : None pour un employé supprimé entre la recherche du hash et le scan
+SQL_STATE = """
+    SELECT COALESCE(s.Presence, 0), s.entry_ts, s.exit_ts, COALESCE(s.day_overtime_minutes, 0),
+           COALESCE(s.overtime_minutes, 0), COALESCE(s.overtime_amount, 0)
+    FROM gestion_employe g
+    LEFT JOIN presence_state s ON s.Matricule = g.Matricule
+    WHERE g.Matricule = ?
+    LIMIT 1
+"""
+
+SQL_SAVE_STATE = f"""
+    INSERT INTO presence_state (Matricule, {', '.join(STATE_COLUMNS)}, version)
+    VALUES (?, {', '.join('?' * len(STATE_COLUMNS))}, ?)
+    ON CONFLICT (Matricule) DO UPDATE SET
+        {', '.join(f'{c} = excluded.{c}' for c in STATE_COLUMNS)},
+        version = excluded.version
+"""
+
+EMPTY_STATE = (0, None, None, 0, 0, 0)
+
+
+def load(cursor, matricule):
+    row = cursor.execute(SQL_STATE, (matricule,)).fetchone()
+    return tuple(row) if row else None
+
+
+def save(cursor, matricule, state, version):
+    cursor.execute(SQL_SAVE_STATE, (matricule, *state, version))
+
+
+def add_overtime(cursor, matricule, day: str, minutes, amount):
+    # Écart ajouté aux cumuls du jour et du mois
+    cursor.execute("""
+        INSERT INTO overtime_journalier (date, Matricule, overtime_minutes, overtime_amount)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (date, Matricule) DO UPDATE SET
+            overtime_minutes = overtime_minutes + excluded.overtime_minutes,
+            overtime_amount = overtime_amount + excluded.overtime_amount
+    """, (day, matricule, minutes, amount))
+    cursor.execute("""
+        INSERT INTO overtime_mensuel (mois, Matricule, overtime_minutes, overtime_amount)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (mois, Matricule) DO UPDATE SET
+            overtime_minutes = overtime_minutes + excluded.overtime_minutes,
+            overtime_amount = overtime_amount + excluded.overtime_amount
+    """, (day[:7], matricule, minutes, amount))
+
+
+def record_overtime(cursor, matricule, day: str, entry_ts, exit_ts, minutes, amount, previous_minutes, previous_amount):
+    # HS du jour portées de previous_minutes à minutes : cumuls incrémentés de l'écart, une
+    # seule ligne presence_journaliere par journée (comme le recalcul de overtime.py)
+    add_overtime(cursor, matricule, day, minutes - previous_minutes, amount - previous_amount)
+
+    if previous_minutes > 0:
+        cursor.execute("""
+            UPDATE presence_journaliere
+            SET exit_time = ?, overtime = ?, overtime_amount = ?, exit_ts = ?
+            WHERE Matricule = ? AND entry_ts = ?
+        """, (clock.format(exit_ts), f"{minutes // 60}H{minutes % 60:02d}", amount, exit_ts, matricule, entry_ts))
+        if cursor.rowcount:
+            return
+    insert_day(cursor, matricule, day, entry_ts, exit_ts, minutes, amount)
+
+
+def insert_day(cursor, matricule, day: str, entry_ts, exit_ts, minutes, amount):
+    cursor.execute("""
+        INSERT INTO presence_journaliere
+        (Matricule, date, entry_time, exit_time, overtime, overtime_amount, entry_ts, exit_ts)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        matricule, day, clock.format(entry_ts), clock.format(exit_ts),
+        f"{minutes // 60}H{minutes % 60:02d}", amount, entry_ts, exit_ts
+    ))
+
+
+# ⏪ Journée recalculée depuis ses logs (scan rejoué plus ancien que l'état) : premier scan =
+# entrée, dernier = sortie dès deux scans, comme la reconstruction et overtime.py
+SQL_DAY_SCANS = "SELECT COUNT(*), MIN(ts), MAX(ts) FROM presence_log WHERE Matricule = ? AND ts >= ? AND ts < ?"
+SQL_DAY_OVERTIME = "SELECT overtime_minutes, overtime_amount FROM overtime_journalier WHERE date = ? AND Matricule = ?"
+
+
+def day_scans(cursor, matricule, low, high):
+    return cursor.execute(SQL_DAY_SCANS, (matricule, low, high)).fetchone()
+
+
+def replace_day(cursor, matricule, day: str, low, high, entry_ts, exit_ts, minutes, amount):
+    # Cumuls corrigés de l'écart avec ce qu'ils comptaient pour la journée, ligne
+    # presence_journaliere réécrite (l'entrée a pu changer) ; renvoie l'écart
+    previous = cursor.execute(SQL_DAY_OVERTIME, (day, str(matricule))).fetchone() or (0, 0)
+    delta = (minutes - previous[0], amount - previous[1])
+    if delta != (0, 0):
+        add_overtime(cursor, matricule, day, *delta)
+    cursor.execute(
+        "DELETE FROM presence_journaliere WHERE Matricule = ? AND entry_ts >= ? AND entry_ts < ?",
+        (matricule, low, high)
+    )
+    if minutes > 0:
+        insert_day(cursor, matricule, day, entry_ts, exit_ts, minutes, amount)
+    return delta
+
+
+# 🔁 Reconstruction depuis les logs : dernière journée scannée (premier scan = entrée,
+# dernier = sortie dès deux scans), HS de cette journée et totaux lus dans les cumuls,
+# Presence = nombre de scans (mois archivés compris, comptés à part par archived_counts)
+SQL_REBUILD = """
+    SELECT g.Matricule, d.scans, d.entry_ts, CASE WHEN d.day_scans >= 2 THEN d.exit_ts END,
+           COALESCE(oj.overtime_minutes, 0), COALESCE(t.minutes, 0), COALESCE(t.amount, 0),
+           s.Matricule IS NOT NULL
+    FROM gestion_employe g
+    LEFT JOIN (
+        -- Un seul max() : les colonnes nues viennent de la dernière journée
+        SELECT Matricule, SUM(n) AS scans, MAX(day) AS day, entry_ts, exit_ts, n AS day_scans
+        FROM (
+            SELECT pl.Matricule, (pl.ts + :offset) / 86400 AS day,
+                   MIN(pl.ts) AS entry_ts, MAX(pl.ts) AS exit_ts, COUNT(*) AS n
+            FROM gestion_employe e
+            JOIN presence_log pl ON pl.Matricule = e.Matricule
+            WHERE e.id > :after AND e.id <= :last AND pl.ts IS NOT NULL
+            GROUP BY pl.Matricule, day
+        )
+        GROUP BY Matricule
+    ) d ON d.Matricule = g.Matricule
+    -- Cumuls à clé texte : CAST pour chercher par clé plutôt que convertir chaque ligne
+    LEFT JOIN overtime_journalier oj
+        ON oj.date = date(d.day * 86400, 'unixepoch') AND oj.Matricule = CAST(g.Matricule AS TEXT)
+    LEFT JOIN (
+        SELECT Matricule, SUM(overtime_minutes) AS minutes, SUM(overtime_amount) AS amount
+        FROM overtime_mensuel
+        WHERE Matricule IN (SELECT CAST(Matricule AS TEXT) FROM gestion_employe WHERE id > :after AND id <= :last)
+        GROUP BY Matricule
+    ) t ON t.Matricule = CAST(g.Matricule AS TEXT)
+    LEFT JOIN presence_state s ON s.Matricule = g.Matricule
+    WHERE g.id > :after AND g.id <= :last
+"""
+
+
+def archived_counts(conn, directory=None):
+    # Scans des mois archivés par matricule (ATTACH : hors transaction, connexion de lecture)
+    counts = {}
+    for month in archived_months(directory):
+        with attached(conn, month, directory) as alias:
+            for matricule, scans in conn.execute(
+                f"SELECT Matricule, COUNT(*) FROM {alias}.presence_log GROUP BY Matricule"
+            ):
+                counts[str(matricule)] = counts.get(str(matricule), 0) + scans
+    return counts
+
+
+def rebuild(cursor, after, last, archived, version) -> int:
+    # Employés d'id ]after, last] ; seules les lignes qui changent prennent la version (sans commit)
+    rows = cursor.execute(SQL_REBUILD, {
+        "offset": clock.SITE_TZ_OFFSET_MINUTES * 60, "after": after, "last": last
+    }).fetchall()
+    changed = 0
+    for matricule, scans, entry_ts, exit_ts, day_minutes, minutes, amount, known in rows:
+        state = ((scans or 0) + archived.get(str(matricule), 0), entry_ts, exit_ts, day_minutes, minutes, amount)
+        if not known and state == EMPTY_STATE:
+            continue
+        if load(cursor, matricule) != state:
+            save(cursor, matricule, state, version)
+            changed += 1
+    return changed
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="reconstruit presence_state depuis presence_log")
+    args = parser.parse_args()
+
+    import main
+
+    # Une base par site : toutes les bases du répertoire sont reconstruites
+    if main.site_shards is not None:
+        main.site_shards.open_all()
+    started = time.perf_counter()
+    total = 0
+    for shard in main.all_shards():
+        with shard.pool.connection() as conn:
+            archived = archived_counts(conn, shard.archive_dir)
+            upto = conn.execute("SELECT MAX(id) FROM gestion_employe").fetchone()[0] or 0
+            after = 0
+            while after < upto:
+                cursor = conn.cursor()
+                last = min(upto, after + jobs.JOB_CHUNK)
+                total += rebuild(cursor, after, last, archived, main.bump_version(cursor))
+                conn.commit()
+                after = last
+    print(f"✅ {total} états d'employés mis à jour en {time.perf_counter() - started:.1f} s")
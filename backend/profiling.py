@@ -0,0 +1,204 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from itertools import count
+
+import clock
+
+# 🔬 Profilage à la demande : chaque requête SQL d'une requête HTTP avec sa durée,
+# EXPLAIN QUERY PLAN des requêtes lentes et, en option, échantillons de pile Python.
+# Activé pour tout le trafic (PROFILE=1) ou pour une seule requête (en-têtes
+# X-Debug-Profile: 1 + X-Admin-Password). Les traces lentes vont dans un tampon
+# circulaire lu par GET /api/debug/slow.
+PROFILE = os.getenv("PROFILE", "0") == "1"
+PROFILE_SAMPLE = os.getenv("PROFILE_SAMPLE", "0") == "1"
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "100"))
+PROFILE_EXPLAIN_MS = float(os.getenv("PROFILE_EXPLAIN_MS", "20"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_BUFFER = int(os.getenv("PROFILE_BUFFER", "100"))
+PROFILE_MAX_STATEMENTS = int(os.getenv("PROFILE_MAX_STATEMENTS", "500"))
+
+# Trace de la requête en cours ; suit le travail dans les exécuteurs et le thread d'écriture
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+_NOT_EXPLAINED = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE", "PRAGMA", "CREATE", "ALTER", "DROP")
+
+slow_traces = deque(maxlen=PROFILE_BUFFER)
+_trace_ids = count(1)
+
+
+def _short(value, limit=200) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+class Trace:
+    def __init__(self, method, path, route, sample=False, forced=False):
+        self.id = next(_trace_ids)
+        self.method = method
+        self.path = path
+        self.route = route
+        self.sample = sample
+        self.forced = forced
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.statements = []
+        self.dropped = 0
+        self.threads = set()
+        self.samples = Counter()
+        self._explaining = threading.local()
+
+    def record_statement(self, cursor, statement, sql, parameters, seconds):
+        if getattr(self._explaining, "active", False):
+            return
+        if len(self.statements) >= PROFILE_MAX_STATEMENTS:
+            self.dropped += 1
+            return
+        entry = {
+            "statement": statement,
+            "sql": " ".join(sql.split()),
+            "params": _short(parameters) if parameters is not None else None,
+            "duration_ms": round(seconds * 1000, 3),
+            "thread": threading.current_thread().name,
+        }
+        if seconds * 1000 >= PROFILE_EXPLAIN_MS and parameters is not None:
+            entry["plan"] = self._explain(cursor.connection, sql, parameters)
+        self.statements.append(entry)
+
+    def _explain(self, conn, sql, parameters):
+        if sql.lstrip().split(None, 1)[0].upper() in _NOT_EXPLAINED:
+            return None
+        self._explaining.active = True
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()]
+        except Exception as e:
+            return [f"EXPLAIN impossible : {e}"]
+        finally:
+            self._explaining.active = False
+
+    def to_dict(self, status, duration):
+        sql_ms = sum(s["duration_ms"] for s in self.statements)
+        return {
+            "id": self.id,
+            "at": clock.format(int(self.started_at)),
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 3),
+            "sql_ms": round(sql_ms, 3),
+            "statement_count": len(self.statements) + self.dropped,
+            "statements": self.statements,
+            "dropped_statements": self.dropped,
+            "stacks": [{"stack": stack, "samples": n} for stack, n in self.samples.most_common(20)],
+        }
+
+
+def run_traced(fn, *args):
+    # Exécuté dans un thread de travail : le déclare à l'échantillonneur pour la trace courante
+    trace = current_trace.get()
+    if trace is None or not trace.sample:
+        return fn(*args)
+    ident = threading.get_ident()
+    trace.threads.add(ident)
+    try:
+        return fn(*args)
+    finally:
+        trace.threads.discard(ident)
+
+
+# 🧵 Échantillonneur de piles : un seul thread, actif tant qu'une trace le demande
+class _Sampler:
+    def __init__(self):
+        self.traces = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, trace):
+        with self._lock:
+            self.traces.add(trace)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, trace):
+        with self._lock:
+            self.traces.discard(trace)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                traces = list(self.traces)
+                if not traces:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            for trace in traces:
+                for ident in list(trace.threads):
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        trace.samples[_folded(frame)] += 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL_MS / 1000)
+
+
+def _folded(frame) -> str:
+    # Format « pile repliée » (racine;…;feuille), lisible par les outils de flamegraph
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+sampler = _Sampler()
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, admin_password, route_template):
+        self.app = app
+        self.admin_password = admin_password
+        self.route_template = route_template
+
+    def _requested(self, scope):
+        headers = dict(scope.get("headers") or [])
+        if headers.get(b"x-debug-profile") not in (b"1", b"sample"):
+            return None
+        if headers.get(b"x-admin-password", b"").decode("utf-8", "replace") != self.admin_password:
+            return None
+        return headers[b"x-debug-profile"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        requested = self._requested(scope)
+        if not PROFILE and requested is None:
+            return await self.app(scope, receive, send)
+
+        path = scope["path"] + (f"?{scope['query_string'].decode()}" if scope.get("query_string") else "")
+        route = self.route_template(scope["app"], scope) if "app" in scope else "unmatched"
+        trace = Trace(scope["method"], path, route,
+                      sample=PROFILE_SAMPLE or requested == b"sample", forced=requested is not None)
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        token = current_trace.set(trace)
+        if trace.sample:
+            trace.threads.add(threading.get_ident())  # thread de la boucle asyncio
+            sampler.add(trace)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - trace.start
+            current_trace.reset(token)
+            sampler.remove(trace)
+            if trace.forced or duration * 1000 >= PROFILE_SLOW_MS:
+                slow_traces.append(trace.to_dict(status[0], duration))
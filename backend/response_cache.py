@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import RESPONSE_CACHE
+
+# ⚙️ Cache des réponses sérialisées (RESPONSE_CACHE_MB=0 : désactivé). Le TTL borne la
+# fraîcheur face aux écritures faites hors du serveur (python presence.py, shards.py…)
+RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", "64"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+
+class ResponseCache:
+    # Octets JSON prêts à envoyer, par route et paramètres, en LRU borné en taille.
+    # Chaque entrée porte une étiquette (scope, tag) : "logs" + matricule, "directory" +
+    # "state" pour les listes qui dépendent des scans. Invalider = incrémenter la génération
+    # de l'étiquette (O(1), pas de parcours) ; une entrée d'une génération périmée est
+    # ignorée puis évincée. Une réponse calculée pendant une invalidation n'est pas gardée.
+
+    def __init__(self, max_bytes=int(RESPONSE_CACHE_MB * 1024 * 1024), ttl=RESPONSE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._global = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def token(self, scope, tag=None):
+        # À prendre AVANT de lire la base, puis à repasser à put()
+        return (self._global, self._generations.get((scope, None), 0), self._generations.get((scope, tag), 0))
+
+    def get(self, route, key, tag=None):
+        if not self.enabled:
+            return None
+        scope = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                token, expires, body, headers = entry
+                if token == self.token(scope, tag) and time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    RESPONSE_CACHE.inc(route, "hit")
+                    return body, headers
+                self._drop(key)
+        RESPONSE_CACHE.inc(route, "miss")
+        return None
+
+    def put(self, key, token, body: bytes, headers=None, tag=None):
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if token != self.token(key[0], tag):
+                return
+            self._drop(key)
+            self._entries[key] = (token, time.monotonic() + self.ttl, body, headers or {})
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, scope, tag=None):
+        with self._lock:
+            self._generations[(scope, tag)] = self._generations.get((scope, tag), 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._global += 1
+            self._entries.clear()
+            self.size = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[2])
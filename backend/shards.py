@@ -0,0 +1,293 @@
+import argparse
+import heapq
+import os
+import re
+import sqlite3
+import sys
+import threading
+import unicodedata
+from itertools import islice
+
+import archive
+from database import AsyncDatabase, ConnectionPool
+from migrations import migrate
+from writer import WriteQueue
+
+# 🧩 Répartition optionnelle par site : une base SQLite par site (SHARD_DIR/<site>.db), avec
+# son pool, son thread d'écriture et donc son propre verrou. Les scans et l'annuaire vont
+# à la base du site de l'employé (son Affectation) ; listes, rapports et exports
+# interrogent toutes les bases en parallèle puis fusionnent. Sans SHARD_DIR : une seule
+# base (DB_FILE), comme avant. Un seul processus, comme pour le thread d'écriture.
+# But : isoler les sites (verrous, fichiers, archives), pas accélérer les scans — les
+# threads d'écriture partagent le GIL et le débit total baisse (benchmarks/bench_shards.py).
+SHARD_DIR = os.getenv("SHARD_DIR", "")
+# Regroupements facultatifs "AFFECTATION=site,AUTRE=site" ; sinon un site par affectation
+SHARD_SITES = os.getenv("SHARD_SITES", "")
+DEFAULT_SITE = "sans_affectation"
+
+
+# 🏷️ Affectation → identifiant de site (nom de fichier)
+def site_id(name) -> str:
+    text = unicodedata.normalize("NFKD", str(name or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_") or DEFAULT_SITE
+
+
+def parse_sites(spec: str):
+    sites = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        affectation, _, site = item.partition("=")
+        sites[affectation.strip().upper()] = site_id(site or affectation)
+    return sites
+
+
+SITES = parse_sites(SHARD_SITES)
+
+
+def site_of(affectation) -> str:
+    key = str(affectation or "").strip().upper()
+    return SITES.get(key) or site_id(key)
+
+
+# 🔢 Versions communes à toutes les bases : un client synchronisé sur une version ne
+# manque l'écriture d'aucun site (bump_version puise ici quand les sites sont séparés)
+class VersionClock:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def seed(self, version):
+        with self._lock:
+            self.value = max(self.value, version or 0)
+
+    def next(self) -> int:
+        with self._lock:
+            self.value += 1
+            return self.value
+
+
+def safe_version(top, shards, versions):
+    # Plus grande version dont toutes les écritures sont visibles : `top` (relevé avant
+    # la lecture) pour un site sans groupe d'écriture en cours, sinon la version lue sur
+    # ce site, car ses écritures en cours portent forcément des numéros plus grands
+    return min([versions[s.site] if s.writer.busy else top for s in shards] or [top])
+
+
+# 🗄️ Une base de site : pool, thread d'écriture, accès async et dossier d'archives
+class Shard:
+    def __init__(self, site, pool, writer, db, archive_dir=None):
+        self.site = site
+        self.pool = pool
+        self.writer = writer
+        self.db = db
+        self.archive_dir = archive_dir
+
+    @classmethod
+    def open(cls, site, directory):
+        pool = ConnectionPool(os.path.join(directory, f"{site}.db"))
+        with pool.connection() as conn:
+            migrate(conn)
+        writer = WriteQueue(pool)
+        writer.start()
+        return cls(site, pool, writer, AsyncDatabase(pool, writer), os.path.join(directory, "archives", site))
+
+    def version(self):
+        with self.pool.connection() as conn:
+            return conn.execute("SELECT version FROM sync_state WHERE id = 1").fetchone()[0]
+
+    def close(self):
+        self.writer.stop()
+        self.db.close()
+        self.pool.close_all()
+
+
+class ShardSet:
+    def __init__(self, directory):
+        self.directory = directory
+        self.versions = VersionClock()
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def open_all(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".db"):
+                self.get(name[:-3])
+
+    def get(self, site) -> Shard:
+        # Base du site, créée et migrée à la première utilisation (appel bloquant)
+        with self._lock:
+            shard = self._shards.get(site)
+            if shard is None:
+                shard = Shard.open(site, self.directory)
+                self.versions.seed(shard.version())
+                self._shards[site] = shard
+            return shard
+
+    def find(self, site):
+        with self._lock:
+            return self._shards.get(site)
+
+    def all(self):
+        with self._lock:
+            return [self._shards[site] for site in sorted(self._shards)]
+
+    @property
+    def depth(self):
+        return sum(shard.writer.depth for shard in self.all())
+
+    def close_all(self):
+        with self._lock:
+            shards, self._shards = list(self._shards.values()), {}
+        for shard in shards:
+            shard.close()
+
+
+# 🔀 Fusion des résultats de plusieurs sites
+def sql_key(value):
+    # Ordre de SQLite : NULL < nombres < texte < blob (Python ne compare pas int et str)
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+def merge(results, key, reverse=False, limit=None):
+    # Listes déjà triées par chaque base → une seule liste triée (fusion, pas de tri)
+    rows = heapq.merge(*results, key=key, reverse=reverse)
+    return list(islice(rows, limit) if limit is not None else rows)
+
+
+# 🚚 Changement d'affectation : l'employé et son historique chaud passent dans la base de
+# son nouveau site (les mois archivés restent dans celle de l'ancien, relue par les listes)
+MOVED_TABLES = ("presence_log", "presence_journaliere", "presence_state", "scan_recu")
+ROLLUP_KEYS = {"overtime_journalier": "date", "overtime_mensuel": "mois"}
+
+
+def take_employee(cursor, matricule):
+    # Lecture et suppression dans la même transaction du thread d'écriture source :
+    # aucun scan ne peut s'intercaler et être perdu
+    data = {}
+    for table in ("gestion_employe",) + MOVED_TABLES + tuple(ROLLUP_KEYS):
+        cursor.execute(f"SELECT * FROM {table} WHERE Matricule = ?", (matricule,))
+        columns = [c[0] for c in cursor.description]
+        data[table] = (columns, cursor.fetchall())
+        if table == "gestion_employe" and not data[table][1]:
+            return None
+    for table in MOVED_TABLES + tuple(ROLLUP_KEYS) + ("gestion_employe",):
+        cursor.execute(f"DELETE FROM {table} WHERE Matricule = ?", (matricule,))
+    return data
+
+
+def put_employee(cursor, data, version):
+    # Insertion dans la base cible ; les id sont réattribués par la cible
+    for table, (columns, rows) in data.items():
+        keep = [i for i, c in enumerate(columns) if c != "id"]
+        names = ", ".join(columns[i] for i in keep)
+        sql = f"INSERT INTO {table} ({names}) VALUES ({', '.join('?' * len(keep))})"
+        if table in ROLLUP_KEYS:
+            sql += f"""
+                ON CONFLICT ({ROLLUP_KEYS[table]}, Matricule) DO UPDATE SET
+                    overtime_minutes = overtime_minutes + excluded.overtime_minutes,
+                    overtime_amount = overtime_amount + excluded.overtime_amount
+            """
+        cursor.executemany(sql, [tuple(row[i] for i in keep) for row in rows])
+    matricule = data["gestion_employe"][1][0][data["gestion_employe"][0].index("Matricule")]
+    cursor.execute("UPDATE gestion_employe SET row_version = ? WHERE Matricule = ?", (version, matricule))
+    cursor.execute("DELETE FROM employe_supprime WHERE Matricule = ?", (str(matricule),))
+
+
+# ✂️ Découpage d'une base unique existante en bases par site
+SPLIT_TABLES = ("gestion_employe", "presence_log", "presence_journaliere", "presence_snapshot",
+                "presence_state", "scan_recu") + tuple(ROLLUP_KEYS)
+
+
+def split(source, directory, archive_dir=None):
+    # Chaque ligne suit le site de son employé ; logs d'employés supprimés et employés
+    # supprimés (employe_supprime) vont au site DEFAULT_SITE. Rejouable : bases recréées.
+    os.makedirs(directory, exist_ok=True)
+    with sqlite3.connect(source) as conn:
+        migrate(conn)
+        sites_by_matricule = {
+            str(m): site_of(affectation)
+            for m, affectation in conn.execute("SELECT Matricule, Affectation FROM gestion_employe")
+        }
+        version, reset_version = conn.execute("SELECT version, reset_version FROM sync_state WHERE id = 1").fetchone()
+    sites = sorted(set(sites_by_matricule.values()) | {DEFAULT_SITE})
+
+    def site_for(matricule):
+        return sites_by_matricule.get(str(matricule), DEFAULT_SITE)
+
+    counts = {}
+    for site in sites:
+        path = os.path.join(directory, f"{site}.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        conn = sqlite3.connect(path)
+        conn.create_function("site_for", 1, site_for, deterministic=True)
+        migrate(conn)
+        conn.execute("ATTACH DATABASE ? AS src", (source,))
+        counts[site] = {}
+        for table in SPLIT_TABLES:
+            # Colonnes communes : les anciennes bases ont des colonnes abandonnées depuis
+            shared = set(archive._columns(conn, "main", table))
+            columns = ", ".join(c for c in archive._columns(conn, "src", table) if c in shared)
+            counts[site][table] = conn.execute(f"""
+                INSERT INTO main.{table} ({columns})
+                SELECT {columns} FROM src.{table} WHERE site_for(Matricule) = ?
+            """, (site,)).rowcount
+        if site == DEFAULT_SITE:
+            conn.execute("INSERT INTO main.employe_supprime SELECT * FROM src.employe_supprime")
+        conn.execute("UPDATE sync_state SET version = ?, reset_version = ? WHERE id = 1", (version, reset_version))
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+
+        # Mois archivés : une archive par site et par mois
+        for month in archive.archived_months(archive_dir):
+            conn.execute("ATTACH DATABASE ? AS src", (archive.archive_path(month, archive_dir),))
+            tables = [
+                table for table in archive.TABLES
+                if archive._columns(conn, "src", table) and conn.execute(
+                    f"SELECT 1 FROM src.{table} WHERE site_for(Matricule) = ? LIMIT 1", (site,)
+                ).fetchone()
+            ]
+            if not tables:
+                # Aucun fichier vide pour un site sans ligne ce mois-là
+                conn.execute("DETACH DATABASE src")
+                continue
+            target = os.path.join(directory, "archives", site)
+            os.makedirs(target, exist_ok=True)
+            conn.execute(f"ATTACH DATABASE ? AS {archive.ALIAS}", (archive.archive_path(month, target),))
+            archive._prepare_archive(conn)
+            for table in tables:
+                columns, select = archive.select_columns(conn, "src", table)
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO {archive.ALIAS}.{table} ({', '.join(columns)})
+                    SELECT {select} FROM src.{table} WHERE site_for(Matricule) = ?
+                """, (site,))
+            conn.commit()
+            conn.execute(f"DETACH DATABASE {archive.ALIAS}")
+            conn.execute("DETACH DATABASE src")
+        conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    # python shards.py split → répartit DB_FILE (et ses archives) dans SHARD_DIR
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("split", help="répartit la base unique dans une base par site")
+    args = parser.parse_args()
+    if not SHARD_DIR:
+        parser.error("SHARD_DIR n'est pas défini")
+
+    import main
+
+    for site, counts in split(main.DB_FILE, SHARD_DIR).items():
+        print(f"✅ {site} : {counts}")
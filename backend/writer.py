@@ -0,0 +1,145 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from metrics import DB_LOCK_WAIT, WRITER_COMMIT, WRITER_GROUP_SIZE, WRITER_QUEUE_WAIT
+from profiling import run_traced
+
+# ⚙️ Regroupement des écritures : jusqu'à SCAN_GROUP_MAX jobs par commit. Par défaut
+# on ne fait qu'emporter ce qui s'est accumulé pendant le commit précédent ;
+# SCAN_GROUP_DELAY_MS > 0 attend en plus les suivants (voir benchmarks/bench_writer.py)
+SCAN_GROUP_MAX = int(os.getenv("SCAN_GROUP_MAX", "64"))
+SCAN_GROUP_DELAY_MS = float(os.getenv("SCAN_GROUP_DELAY_MS", "0"))
+
+_STOP = object()
+
+
+class WriteQueue:
+    # Un seul thread écrit dans la base : plus de course au verrou SQLite entre
+    # threads du threadpool. Chaque job tourne dans un SAVEPOINT (un job en
+    # erreur n'annule pas les autres) et le groupe entier partage un seul COMMIT.
+
+    def __init__(self, pool, max_batch=SCAN_GROUP_MAX, max_delay_ms=SCAN_GROUP_DELAY_MS):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Vrai de BEGIN à COMMIT : des versions sont peut-être attribuées mais pas encore visibles
+        self.busy = False
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="scan-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, fn, *args) -> Future:
+        # fn(cursor, *args) est exécuté dans le thread d'écriture, sans commit,
+        # avec le contexte (contextvars) de l'appelant
+        future = Future()
+        thread = self._thread
+        # Thread absent ou mort (exception inattendue) : relancé, les jobs en file sont repris
+        if thread is None or not thread.is_alive():
+            self.start()
+        context = contextvars.copy_context()
+        self._queue.put((context, fn, args, future, time.perf_counter()))
+        return future
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def _next_group(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        group = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_batch:
+            try:
+                # Ce qui est déjà en file part sans attendre ; sinon on patiente jusqu'au délai
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            group.append(item)
+        return group
+
+    def _run(self):
+        with self.pool.dedicated() as conn:
+            conn.isolation_level = None  # transactions pilotées à la main
+            cursor = conn.cursor()
+            while True:
+                group = self._next_group()
+                if group is None:
+                    return
+                self._apply(conn, cursor, group)
+
+    def _apply(self, conn, cursor, group):
+        outcomes = []
+        started = time.perf_counter()
+        WRITER_GROUP_SIZE.observe(len(group))
+        for *_, queued_at in group:
+            WRITER_QUEUE_WAIT.observe(started - queued_at)
+        self.busy = True
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            DB_LOCK_WAIT.observe(time.perf_counter() - started, "writer")
+            for context, fn, args, future, _ in group:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cursor.execute("SAVEPOINT job")
+                try:
+                    result = context.run(run_traced, fn, cursor, *args)
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO job")
+                    cursor.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+                else:
+                    cursor.execute("RELEASE job")
+                    outcomes.append((future, result, None))
+            committing = time.perf_counter()
+            cursor.execute("COMMIT")
+            WRITER_COMMIT.observe(time.perf_counter() - committing)
+        except Exception as e:
+            try:
+                if conn.in_transaction:
+                    cursor.execute("ROLLBACK")
+            except Exception:
+                pass
+            # BEGIN ou COMMIT raté : aucun job du groupe n'est écrit. Tous les appelants sont
+            # prévenus, y compris ceux dont le job n'a pas commencé (sinon attente sans fin)
+            for _, _, _, future, _ in group:
+                if not future.done():
+                    if future.running() or future.set_running_or_notify_cancel():
+                        future.set_exception(e)
+            return
+        finally:
+            self.busy = False
+
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
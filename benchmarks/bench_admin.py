@@ -0,0 +1,112 @@
+# ⏱️ Benchmark : latence de /api/status et des scans pendant une opération admin
+#
+# Usage : python benchmarks/bench_admin.py [--employes 50000] [--clients 16] [--duree 3]
+#
+# Mesure p50/p99 de main.status et main.mark_presence seuls, puis pendant que
+# reset_entry_exit (tâche de fond par paquets, voir jobs.py) tourne en boucle. La
+# boucle asyncio ne doit jamais être bloquée par le travail SQLite, ni les scans
+# attendre la fin d'une remise à zéro de toute la table.
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+
+def seed(size):
+    with main.db_pool.connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (f"BM{i:06d}", f"NOM{i}", "Prenom", "GCOR", "SITE", "0340000000", "x@baobab.com",
+                 main.hash_matricule(f"BM{i:06d}"))
+                for i in range(size)
+            ),
+        )
+        conn.commit()
+
+
+def percentile(samples, p):
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def measure(hashes, clients, duration, with_admin):
+    stop = time.perf_counter() + duration
+    status_ms, scan_ms = [], []
+    errors = [0]
+    admin_runs = [0]
+
+    async def status_probe():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            await main.status()
+            status_ms.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.005)
+
+    async def scanner():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                await main.mark_presence(random.choice(hashes))
+            except HTTPException:
+                errors[0] += 1
+                continue
+            scan_ms.append((time.perf_counter() - start) * 1000)
+
+    async def admin():
+        while time.perf_counter() < stop:
+            started = await main.reset_entry_exit()
+            await main.admin_jobs.get(started["job_id"]).task
+            admin_runs[0] += 1
+
+    tasks = [status_probe()] + [scanner() for _ in range(clients)]
+    if with_admin:
+        tasks.append(admin())
+    await asyncio.gather(*tasks)
+    return status_ms, scan_ms, errors[0], admin_runs[0]
+
+
+def run(size, clients, duration):
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        main.db_pool = main.ConnectionPool(main.DB_FILE)
+        main.scan_writer = main.WriteQueue(main.db_pool)
+        main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+        main.invalidate_hash_cache()
+        main.init_db()
+        seed(size)
+        hashes = [main.hash_matricule(f"BM{i:06d}") for i in range(size)]
+
+        print(f"{'':<22} {'status p50':>11} {'status p99':>11} {'scan p50':>9} {'scan p99':>9} {'erreurs':>8}")
+        for label, with_admin in (("scans seuls", False), ("scans + reset admin", True)):
+            status_ms, scan_ms, errors, admin_runs = asyncio.run(measure(hashes, clients, duration, with_admin))
+            print(
+                f"{label:<22} {percentile(status_ms, 0.5):>8.2f} ms {percentile(status_ms, 0.99):>8.2f} ms"
+                f" {percentile(scan_ms, 0.5):>6.2f} ms {percentile(scan_ms, 0.99):>6.2f} ms {errors:>8}"
+                + (f"   ({admin_runs} resets)" if with_admin else "")
+            )
+        main.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duree", type=float, default=3)
+    args = parser.parse_args()
+    run(args.employes, args.clients, args.duree)
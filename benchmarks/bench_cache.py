@@ -0,0 +1,83 @@
+# ⏱️ Benchmark : rechargement de l'annuaire et des logs avec et sans cache de réponses
+#
+# Usage : python benchmarks/bench_cache.py [--sizes 10000,50000] [--repetitions 20]
+#
+# Rejoue le même chargement de tableau de bord (annuaire complet, annuaire sans champs
+# d'état, logs d'un employé) : cache désactivé, puis premier appel (calcul + mise en cache)
+# et appels suivants (copie des octets déjà sérialisés).
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import dataset  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+
+def request():
+    return Request({"type": "http", "method": "GET", "path": "/api/students", "headers": [], "query_string": b""})
+
+
+def directory(fields=None):
+    return main.get_students(request(), None, None, None, None, False, fields)
+
+
+def timed(loop, coro_fn, repetitions):
+    durations = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        response = loop.run_until_complete(coro_fn())
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), len(response.body)
+
+
+def run(size, repetitions):
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        dataset.generate(main.DB_FILE, size, days=20)
+        main.db_pool = main.ConnectionPool(main.DB_FILE)
+        main.scan_writer = main.WriteQueue(main.db_pool)
+        main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+        main.init_db()
+        with main.db_pool.connection() as conn:
+            matricule = conn.execute("SELECT Matricule FROM presence_journaliere LIMIT 1").fetchone()[0]
+        loop = asyncio.new_event_loop()
+        cases = {
+            "annuaire complet": lambda: directory(),
+            "annuaire Matricule,Nom": lambda: directory("Matricule,Nom"),
+            "logs d'un employé": lambda: main.get_logs_by_student(request(), str(matricule), None, None),
+        }
+
+        print(f"\n{size} employés")
+        print(f"{'réponse':>24} {'Ko':>7} {'sans cache':>11} {'1er appel':>10} {'en cache':>10}")
+        max_bytes = main.response_cache.max_bytes
+        for label, fn in cases.items():
+            main.response_cache.max_bytes = 0
+            cold_ms, body = timed(loop, fn, repetitions)
+            main.response_cache.max_bytes = max_bytes
+            main.response_cache.clear()
+            first_ms, _ = timed(loop, fn, 1)
+            hit_ms, _ = timed(loop, fn, repetitions)
+            print(f"{label:>24} {body / 1024:>7.0f} {cold_ms:>8.2f} ms {first_ms:>7.2f} ms {hit_ms:>7.3f} ms")
+
+        loop.close()
+        main.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,50000")
+    parser.add_argument("--repetitions", type=int, default=20)
+    args = parser.parse_args()
+    for size in map(int, args.sizes.split(",")):
+        run(size, args.repetitions)
@@ -0,0 +1,75 @@
+# ⏱️ Benchmark : taille et coût de sérialisation de l'annuaire selon le format et la compression
+#
+# Usage : python benchmarks/bench_formats.py [--sizes 10000,50000] [--repetitions 5]
+#
+# Les lignes de l'annuaire complet sont lues une fois, puis chaque représentation est
+# produite comme dans GET /api/students (formats.render) : octets envoyés et temps CPU.
+# Référence : l'ancien rendu (un dict par ligne puis JSONResponse de Starlette).
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import dataset  # noqa: E402
+import formats  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+
+def timed(fn, repetitions):
+    durations = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        body = fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), len(body)
+
+
+def run(size, repetitions):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        dataset.generate(path, size, days=5)
+        pool = main.ConnectionPool(path)
+        with pool.connection() as conn:
+            main.migrate(conn)
+            columns = list(main.STUDENT_FIELDS)
+            sql, params = main.students_query(columns)
+            rows = [r[2:] for r in conn.execute(sql, params).fetchall()]
+        pool.close_all()
+
+    envelope = {"status": "ok", "version": 1, "data": None, "next_cursor": None}
+    cases = {"ancien rendu (dict + JSONResponse)": lambda: JSONResponse(
+        {**envelope, "data": [dict(zip(columns, r)) for r in rows]}
+    ).body}
+    for fmt in formats.MEDIA_TYPES:
+        if not formats.available(fmt):
+            continue
+        for encoding in (None, "gzip", "br"):
+            if encoding == "br" and formats.brotli is None:
+                continue
+            cases[f"{fmt} {encoding or ''}".strip()] = (
+                lambda fmt=fmt, encoding=encoding: formats.render(fmt, encoding, envelope, columns, rows)[0]
+            )
+
+    print(f"\n{size} employés, {len(columns)} champs (orjson={formats.orjson is not None})")
+    print(f"{'représentation':>36} {'Ko':>8} {'ms':>9}")
+    for label, fn in cases.items():
+        ms, length = timed(fn, repetitions)
+        print(f"{label:>36} {length / 1024:>8.0f} {ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,50000")
+    parser.add_argument("--repetitions", type=int, default=5)
+    args = parser.parse_args()
+    for size in map(int, args.sizes.split(",")):
+        run(size, args.repetitions)
@@ -0,0 +1,91 @@
+# ⏱️ Benchmark : recalcul des heures sup. d'une année depuis presence_log
+#
+# Usage : python benchmarks/bench_overtime.py [--employes 10000] [--jours 365] [--cache DOSSIER]
+#
+# Génère (ou réutilise) un historique via dataset.py, puis lance le recalcul comme
+# POST /api/overtime/recompute : tâche de fond, paquets de OVERTIME_CHUNK_DAYS jours
+# passés au thread d'écriture. La règle utilisée est celle du générateur (seuil 16h à
+# l'heure du site, 10000 Ar/h) : les totaux recalculés doivent retomber sur les siens.
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LAUNCH_DIR = os.getcwd()
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import clock  # noqa: E402
+import dataset  # noqa: E402
+import overtime  # noqa: E402
+
+
+def totals(path):
+    with sqlite3.connect(path) as conn:
+        return {
+            "presence_journaliere": conn.execute(
+                "SELECT COUNT(*), SUM(overtime_amount) FROM presence_journaliere").fetchone(),
+            "overtime_mensuel": conn.execute(
+                "SELECT COUNT(*), SUM(overtime_minutes) FROM overtime_mensuel").fetchone(),
+            "presence_state": conn.execute(
+                "SELECT SUM(overtime_minutes), SUM(overtime_amount) FROM presence_state").fetchone(),
+        }
+
+
+async def recompute(policy, start, end):
+    main.init_db()
+    job = main.admin_jobs.start(
+        main.db, "overtime_recompute", lambda conn, job: main.plan_overtime_recompute(policy, start, end)
+    )
+    await job.task
+    main.close_db()
+    return job
+
+
+def run(employees, days, cache):
+    with tempfile.TemporaryDirectory() as tmp:
+        source = dataset.ensure(cache or tmp, employees, days)
+        work = os.path.join(tmp, "run.db")
+        with sqlite3.connect(source) as src, sqlite3.connect(work) as dst:
+            src.backup(dst)
+        rows = sqlite3.connect(work).execute("SELECT COUNT(*) FROM presence_log").fetchone()[0]
+
+        main.DB_FILE = work
+        main.db_pool = main.ConnectionPool(work)
+        main.scan_writer = main.WriteQueue(main.db_pool)
+        main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+
+        policy = overtime.Policy("16:00", clock.SITE_TZ_OFFSET_MINUTES, dataset.OVERTIME_RATE)
+        end = clock.today()
+        start = end - timedelta(days=days - 1)
+
+        before = totals(work)
+        started = time.perf_counter()
+        job = asyncio.run(recompute(policy, start, end))
+        elapsed = time.perf_counter() - started
+        after = totals(work)
+
+        print(f"{employees} employés, {days} jours, {rows} scans : {job.status} en {elapsed:.2f} s "
+              f"({rows / elapsed:,.0f} scans/s)")
+        if job.error:
+            print(f"  ❌ {job.error}")
+        for table in before:
+            mark = "=" if before[table] == after[table] else "≠"
+            print(f"  {table:<22} généré {before[table]}  {mark}  recalculé {after[table]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=10000)
+    parser.add_argument("--jours", type=int, default=365)
+    parser.add_argument("--cache", help="dossier où garder les bases générées entre deux exécutions")
+    args = parser.parse_args()
+    run(args.employes, args.jours, os.path.join(LAUNCH_DIR, args.cache) if args.cache else None)
@@ -0,0 +1,110 @@
+# ⏱️ Benchmark : connexion par requête (avant) contre pool WAL (après)
+#
+# Usage : python benchmarks/bench_pool.py [--employes 2000] [--clients 8] [--duree 3]
+#
+# Appelle directement les routes async de main.py depuis plusieurs clients
+# concurrents dans une boucle asyncio et affiche le débit (req/s) de chaque route.
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+from fastapi import HTTPException, Request  # noqa: E402
+
+
+def seed(size):
+    with main.db_pool.connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (f"BM{i:06d}", f"NOM{i}", "Prenom", "GCOR", "SITE", "0340000000", "x@baobab.com",
+                 main.hash_matricule(f"BM{i:06d}"))
+                for i in range(size)
+            ),
+        )
+        conn.commit()
+
+
+def throughput(fn, clients, duration):
+    stop = time.perf_counter() + duration
+    counts = [0] * clients
+    errors = [0] * clients
+
+    async def client(n):
+        while time.perf_counter() < stop:
+            try:
+                await fn()
+                counts[n] += 1
+            except HTTPException:
+                errors[n] += 1
+
+    async def main_loop():
+        await asyncio.gather(*(client(n) for n in range(clients)))
+
+    asyncio.run(main_loop())
+    return sum(counts) / duration, sum(errors)
+
+
+def run(label, pool_factory, size, clients, duration):
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        main.db_pool = pool_factory(main.DB_FILE)
+        main.scan_writer = main.WriteQueue(main.db_pool)
+        main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+        main.invalidate_hash_cache()
+        main.init_db()
+        seed(size)
+
+        matricules = [f"BM{i:06d}" for i in range(size)]
+        hashes = [main.hash_matricule(m) for m in matricules]
+
+        routes = {
+            "GET /api/students": lambda: main.get_students(
+                Request({"type": "http", "headers": []}), limit=None, after=None
+            ),
+            "GET /api/logs/{id}": lambda: main.get_logs_by_student(Request({"type": "http", "headers": []}), random.choice(matricules), None, None),
+            "POST /api/mark_presence": lambda: main.mark_presence(random.choice(hashes)),
+        }
+        print(f"\n{label}")
+        for name, fn in routes.items():
+            rate, errors = throughput(fn, clients, duration)
+            print(f"  {name:<26} {rate:>9.1f} req/s  erreurs={errors}")
+
+        # Lectures et scans en même temps : c'est là que le journal WAL compte
+        turn = [0]
+
+        def mixed():
+            turn[0] += 1
+            if turn[0] % 2:
+                return main.get_logs_by_student(Request({"type": "http", "headers": []}), random.choice(matricules), None, None)
+            return main.mark_presence(random.choice(hashes))
+
+        rate, errors = throughput(mixed, clients, duration)
+        print(f"  {'mixte logs + scans':<26} {rate:>9.1f} req/s  erreurs={errors}")
+        main.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duree", type=float, default=3)
+    args = parser.parse_args()
+
+    run("Avant : une connexion par requête, journal rollback",
+        lambda path: main.ConnectionPool(path, size=0, pragmas={}),
+        args.employes, args.clients, args.duree)
+    run("Après : pool de connexions, WAL et pragmas",
+        main.ConnectionPool,
+        args.employes, args.clients, args.duree)
@@ -0,0 +1,110 @@
+# ⏱️ Benchmark : latence des pointages pendant des lectures lourdes des tableaux de bord
+#
+# Usage : python benchmarks/bench_reads.py [--employes 20000] [--scanners 16] [--lecteurs 0,4,16] [--duree 3]
+#
+# Des tablettes scannent en continu (main.mark_presence) pendant que des tableaux de bord
+# rechargent l'annuaire complet et le rapport d'HS du mois. Compare le chemin partagé
+# (lectures GET sur db.run, comme avant) au chemin de lecture dédié (db.read, connexions
+# en lecture seule) : latence des scans et débit des lectures.
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import clock  # noqa: E402
+import dataset  # noqa: E402
+from database import AsyncDatabase  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+DEDICATED_READ = AsyncDatabase.read
+
+
+async def shared_read(self, fn, *args):
+    return await self.run(fn, *args)
+
+
+def directory():
+    request = Request({"type": "http", "method": "GET", "path": "/api/students", "headers": [], "query_string": b""})
+    return main.get_students(request, None, None, None, None, False, None)
+
+
+def report():
+    return main.get_overtime_report(clock.today().strftime("%Y-%m"), None)
+
+
+def burst(hashes, scanners, readers, duration):
+    stop = time.perf_counter() + duration
+    latencies = []
+    reads = [0]
+    errors = [0]
+
+    async def scanner():
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                await main.mark_presence(random.choice(hashes))
+            except HTTPException:
+                errors[0] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async def dashboard(n):
+        while time.perf_counter() < stop:
+            await (directory() if n % 2 == 0 else report())
+            reads[0] += 1
+
+    async def main_loop():
+        await asyncio.gather(*(scanner() for _ in range(scanners)), *(dashboard(n) for n in range(readers)))
+
+    asyncio.run(main_loop())
+    latencies.sort()
+    return latencies, reads[0] / duration, errors[0]
+
+
+def run(size, scanners, readers_list, duration):
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        dataset.generate(main.DB_FILE, size, days=5)
+        with main.ConnectionPool(main.DB_FILE).dedicated() as conn:
+            hashes = [r[0] for r in conn.execute("SELECT matricule_hash FROM gestion_employe WHERE matricule_hash IS NOT NULL")]
+
+        print(f"{size} employés, {scanners} tablettes, {os.cpu_count()} cœurs")
+        print(f"{'chemin':>10} {'lecteurs':>9} {'scans/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'lectures/s':>11} {'erreurs':>8}")
+        for readers in readers_list:
+            for label, read in (("partagé", shared_read), ("dédié", DEDICATED_READ)):
+                AsyncDatabase.read = read
+                main.db_pool = main.ConnectionPool(main.DB_FILE)
+                main.scan_writer = main.WriteQueue(main.db_pool)
+                main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+                main.invalidate_hash_cache()
+                main.init_db()
+
+                latencies, read_rate, errors = burst(hashes, scanners, readers, duration)
+                p50 = statistics.median(latencies) if latencies else 0
+                p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+                print(f"{label:>10} {readers:>9} {len(latencies) / duration:>9.0f} {p50:>8.2f} {p99:>8.2f} "
+                      f"{read_rate:>11.1f} {errors:>8}")
+                main.close_db()
+        AsyncDatabase.read = DEDICATED_READ
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=20000)
+    parser.add_argument("--scanners", type=int, default=16)
+    parser.add_argument("--lecteurs", default="0,4,16")
+    parser.add_argument("--duree", type=float, default=3)
+    args = parser.parse_args()
+    run(args.employes, args.scanners, [int(n) for n in args.lecteurs.split(",")], args.duree)
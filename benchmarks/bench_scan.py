@@ -0,0 +1,79 @@
+# ⏱️ Benchmark : coût SQL d'un scan (apply_scan) sur un annuaire réaliste
+#
+# Usage : python benchmarks/bench_scan.py [--employes 50000] [--jours 20] [--scans 20000]
+#
+# Génère un historique via dataset.py puis rejoue une journée de scans (entrée puis
+# sortie après 16h pour chaque employé tiré) directement sur une connexion, sans le
+# thread d'écriture : débit, instructions SQL par scan et pages écrites dans le WAL.
+# Ne mesure que le travail SQLite d'un scan, pas l'attente des groupes de commit.
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import clock  # noqa: E402
+import dataset  # noqa: E402
+
+COMMIT_EVERY = 64  # taille de groupe par défaut du thread d'écriture
+
+
+def run(employees, days, scans):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        dataset.generate(path, employees, days)
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA wal_autocheckpoint = 0")
+        main.migrate(conn)
+        matricules = [r[0] for r in conn.execute("SELECT Matricule FROM gestion_employe")]
+
+        # Demain à l'heure du site : chaque employé tiré entre puis sort avec des HS
+        day = clock.today() + timedelta(days=1)
+        rng = random.Random(7)
+        picked = rng.sample(matricules, min(len(matricules), scans // 2))
+        plan = [(m, 8 * 60 + rng.randrange(60)) for m in picked] + [(m, 17 * 60 + rng.randrange(60)) for m in picked]
+        plan.sort(key=lambda p: p[1])
+
+        statements = Counter()
+        conn.set_trace_callback(lambda sql: statements.update([sql.split(None, 1)[0].upper()]))
+        wal_before = os.path.getsize(path + "-wal")
+        cursor = conn.cursor()
+        start = time.perf_counter()
+        for i, (m, minutes) in enumerate(plan, 1):
+            scanned_at = datetime.fromtimestamp(clock.midnight(day) + minutes * 60, clock.SITE_TZ)
+            main.apply_scan(cursor, m, scanned_at)
+            if i % COMMIT_EVERY == 0:
+                conn.commit()
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        conn.set_trace_callback(None)
+        # Une trame de WAL = une page + 24 octets d'en-tête
+        wal_pages = (os.path.getsize(path + "-wal") - wal_before) / (conn.execute("PRAGMA page_size").fetchone()[0] + 24)
+        conn.close()
+
+    statements.pop("COMMIT", None)
+    per_scan = {verb: round(count / len(plan), 2) for verb, count in sorted(statements.items())}
+    print(f"{employees} employés, {len(plan)} scans : {len(plan) / elapsed:.0f} scans/s, "
+          f"{elapsed / len(plan) * 1e6:.0f} µs/scan, {wal_pages / len(plan):.2f} pages WAL/scan")
+    print(f"  instructions par scan : {per_scan}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=50000)
+    parser.add_argument("--jours", type=int, default=20)
+    parser.add_argument("--scans", type=int, default=20000)
+    args = parser.parse_args()
+    run(args.employes, args.jours, args.scans)
@@ -0,0 +1,96 @@
+# ⏱️ Benchmark : résolution hash → matricule dans mark_presence
+#
+# Usage : python benchmarks/bench_scan_lookup.py [--sizes 100,1000,10000,100000]
+#
+# Compare l'ancienne boucle SHA-256 sur toute la table avec la colonne indexée
+# matricule_hash, puis mesure un scan complet (mark_presence) pour chaque taille.
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+
+
+def populate(cursor, size):
+    cursor.executemany(
+        """
+        INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            (f"BM{i:06d}", f"NOM{i}", "Prenom", "GCOR", "SITE", "0340000000", "x@baobab.com",
+             main.hash_matricule(f"BM{i:06d}"))
+            for i in range(size)
+        ),
+    )
+
+
+def legacy_lookup(cursor, student_hash):
+    cursor.execute("SELECT Matricule FROM gestion_employe")
+    for (matricule,) in cursor.fetchall():
+        if main.hash_matricule(matricule) == student_hash:
+            return matricule
+    return None
+
+
+def timed(fn, samples):
+    durations = []
+    for arg in samples:
+        start = time.perf_counter()
+        fn(arg)
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+
+def run(size, scans):
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        main.db_pool = main.ConnectionPool(main.DB_FILE)
+        main.scan_writer = main.WriteQueue(main.db_pool)
+        main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+        main.init_db()
+        main.invalidate_hash_cache()
+
+        conn = sqlite3.connect(main.DB_FILE)
+        cursor = conn.cursor()
+        populate(cursor, size)
+        conn.commit()
+
+        hashes = [main.hash_matricule(f"BM{random.randrange(size):06d}") for _ in range(scans)]
+        legacy_samples = hashes[: max(1, min(scans, 200_000 // size))]
+
+        result = {
+            "employes": size,
+            "legacy_ms": timed(lambda h: legacy_lookup(cursor, h), legacy_samples),
+            "index_ms": timed(lambda h: main.find_matricule_by_hash(cursor, h), hashes),
+        }
+        conn.close()
+
+        main.invalidate_hash_cache()
+        loop = asyncio.new_event_loop()
+        result["scan_ms"] = timed(lambda h: loop.run_until_complete(main.mark_presence(h)), hashes)
+        loop.close()
+        main.close_db()
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,10000,100000")
+    parser.add_argument("--scans", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'employés':>10} {'boucle SHA-256':>16} {'index + cache':>15} {'mark_presence':>15}")
+    for size in map(int, args.sizes.split(",")):
+        r = run(size, args.scans)
+        print(f"{r['employes']:>10} {r['legacy_ms']:>13.3f} ms {r['index_ms']:>12.4f} ms {r['scan_ms']:>12.3f} ms")
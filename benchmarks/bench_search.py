@@ -0,0 +1,87 @@
+# ⏱️ Benchmark : recherche dans l'annuaire (saisie au fil de la frappe)
+#
+# Usage : python benchmarks/bench_search.py [--sizes 10000,100000] [--repetitions 50]
+#
+# Compare, pour chaque saisie, l'ancien fonctionnement (liste complète /api/students
+# filtrée côté client) avec /api/students/search, en FTS5 puis avec le repli LIKE.
+# Les noms du jeu de données (dataset.py) se répètent beaucoup : "ra" touche presque
+# tout l'annuaire, c'est le pire cas du classement.
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import dataset  # noqa: E402
+import main  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+QUERIES = ["r", "ra", "rako", "rakoto he", "bm0012", "toamasina chauf", "zzz"]
+
+
+def timed(loop, coro_fn, repetitions):
+    durations = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        result = loop.run_until_complete(coro_fn())
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), result
+
+
+def full_list():
+    request = Request({"type": "http", "method": "GET", "path": "/api/students", "headers": [], "query_string": b""})
+    return main.get_students(request, None, None, None, None, False, None)
+
+
+def client_filter(students, q):
+    # Filtre de ListEtudiants.jsx avant la recherche serveur
+    return [s for s in students if q in str(s["Matricule"]).lower() or q in s["Nom"].lower() or q in s["Prenom"].lower()]
+
+
+def run(size, repetitions):
+    with tempfile.TemporaryDirectory() as tmp:
+        main.DB_FILE = os.path.join(tmp, "bench.db")
+        dataset.generate(main.DB_FILE, size, days=1)
+        main.db_pool = main.ConnectionPool(main.DB_FILE)
+        main.scan_writer = main.WriteQueue(main.db_pool)
+        main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+        main.init_db()
+        loop = asyncio.new_event_loop()
+
+        list_ms, page = timed(loop, full_list, max(1, repetitions // 10))
+        list_kb = len(page.body) / 1024
+        page = json.loads(page.body)
+        print(f"\n{size} employés — liste complète : {list_ms:.1f} ms, {list_kb:.0f} Ko à chaque chargement")
+        print(f"{'saisie':>18} {'filtre client':>14} {'FTS5':>10} {'LIKE':>10} {'résultats':>10} {'Ko':>6}")
+        for q in QUERIES:
+            start = time.perf_counter()
+            client_filter(page["data"], q)
+            client_ms = (time.perf_counter() - start) * 1000
+
+            main.search_fts = True
+            fts_ms, found = timed(loop, lambda: main.search_students(q, 20, None), repetitions)
+            main.search_fts = False
+            like_ms, _ = timed(loop, lambda: main.search_students(q, 20, None), repetitions)
+            main.search_fts = True
+            kb = len(json.dumps(found)) / 1024
+            print(f"{q:>18} {client_ms:>11.2f} ms {fts_ms:>7.2f} ms {like_ms:>7.2f} ms {len(found['data']):>10} {kb:>6.1f}")
+
+        loop.close()
+        main.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--repetitions", type=int, default=50)
+    args = parser.parse_args()
+    for size in map(int, args.sizes.split(",")):
+        run(size, args.repetitions)
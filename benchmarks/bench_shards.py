@@ -0,0 +1,93 @@
+# ⏱️ Benchmark : débit des scans en rafale, base unique contre une base par site
+#
+# Usage : python benchmarks/bench_shards.py [--employes 6000] [--sites 1,3,6] [--clients 64] [--duree 10]
+#
+# Appelle main.mark_presence depuis beaucoup de clients concurrents, les employés étant
+# répartis sur N affectations : avec 1, tout va à la base unique (DB_FILE) ; au-delà, chaque
+# site a sa base et son thread d'écriture (SHARD_DIR, voir shards.py). Affiche débit,
+# latences et erreurs, puis vérifie qu'une liste fusionnée voit bien tous les employés.
+# Les premiers scans de chaque employé interrogent toutes les bases (cache de site vide).
+#
+# À lire avant les chiffres : le découpage par site apporte l'isolement (verrou, fichier,
+# sauvegarde et archives propres à chaque site ; un site lent ou en échec ne bloque pas
+# les autres), pas du débit. Les threads d'écriture partagent le GIL d'un même processus
+# et les recherches de site s'ajoutent : 3 sites scannent moins vite qu'une base unique.
+# Ce benchmark mesure ce coût, il ne promet aucun gain.
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import shards  # noqa: E402
+from bench_writer import burst  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+AFFECTATIONS = ["ANTANANARIVO", "TOAMASINA", "MAHAJANGA", "FIANARANTSOA", "TOLIARA", "ANTSIRABE"]
+
+
+def seed(size, sites):
+    rows = [
+        (f"BM{i:06d}", f"NOM{i}", "Prenom", "GCOR", AFFECTATIONS[i % sites], "0340000000", "x@baobab.com",
+         main.hash_matricule(f"BM{i:06d}"))
+        for i in range(size)
+    ]
+    for shard in main.all_shards():
+        with shard.pool.connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [r for r in rows if shard.site in (None, shards.site_of(r[4]))],
+            )
+            conn.commit()
+
+
+def directory_size():
+    request = Request({"type": "http", "method": "GET", "path": "/api/students", "headers": [], "query_string": b""})
+    page = asyncio.run(main.get_students(request, None, None, None, None, False, "Matricule"))
+    return len(json.loads(page.body)["data"])
+
+
+def run(size, site_counts, clients, duration):
+    print(f"{'sites':>6} {'bases':>6} {'scans/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'erreurs':>8} {'annuaire':>9}")
+    for sites in site_counts:
+        with tempfile.TemporaryDirectory() as tmp:
+            main.DB_FILE = os.path.join(tmp, "bench.db")
+            main.db_pool = main.ConnectionPool(main.DB_FILE)
+            main.scan_writer = main.WriteQueue(main.db_pool)
+            main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+            main.site_shards = shards.ShardSet(os.path.join(tmp, "sites")) if sites > 1 else None
+            main.invalidate_hash_cache()
+            main.init_db()
+            if main.site_shards is not None:
+                for affectation in AFFECTATIONS[:sites]:
+                    main.site_shards.get(shards.site_of(affectation))
+            seed(size, sites)
+
+            hashes = [main.hash_matricule(f"BM{i:06d}") for i in range(size)]
+            rate, latencies, errors = burst(hashes, clients, duration)
+            p50 = statistics.median(latencies) if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+            print(f"{sites:>6} {len(main.all_shards()):>6} {rate:>10.1f} {p50:>8.2f} {p99:>8.2f} {errors:>8} "
+                  f"{directory_size():>9}")
+            main.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=6000)
+    parser.add_argument("--sites", default="1,3,6")
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duree", type=float, default=10)
+    args = parser.parse_args()
+    run(args.employes, [int(n) for n in args.sites.split(",")], args.clients, args.duree)
@@ -0,0 +1,98 @@
+# ⏱️ Benchmark : débit des scans en rafale selon la taille des groupes de commit
+#
+# Usage : python benchmarks/bench_writer.py [--employes 2000] [--clients 32] [--duree 3]
+#
+# Appelle main.mark_presence depuis beaucoup de clients concurrents (comme une rafale de
+# tablettes à l'heure d'arrivée) avec différentes valeurs de SCAN_GROUP_MAX /
+# SCAN_GROUP_DELAY_MS, et affiche débit, latences et erreurs.
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+CONFIGS = [
+    (1, 0),     # un commit par scan (équivalent au comportement précédent)
+    (16, 0),
+    (64, 0),
+    (64, 2),
+    (256, 5),
+]
+
+
+def seed(size):
+    with main.db_pool.connection() as conn:
+        conn.executemany(
+            """
+            INSERT INTO gestion_employe (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                (f"BM{i:06d}", f"NOM{i}", "Prenom", "GCOR", "SITE", "0340000000", "x@baobab.com",
+                 main.hash_matricule(f"BM{i:06d}"))
+                for i in range(size)
+            ),
+        )
+        conn.commit()
+
+
+def burst(hashes, clients, duration):
+    stop = time.perf_counter() + duration
+    latencies = [[] for _ in range(clients)]
+    errors = [0] * clients
+
+    async def client(n):
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                await main.mark_presence(random.choice(hashes))
+            except HTTPException:
+                errors[n] += 1
+                continue
+            latencies[n].append((time.perf_counter() - start) * 1000)
+
+    async def main_loop():
+        await asyncio.gather(*(client(n) for n in range(clients)))
+
+    asyncio.run(main_loop())
+    merged = sorted(ms for chunk in latencies for ms in chunk)
+    return len(merged) / duration, merged, sum(errors)
+
+
+def run(size, clients, duration):
+    print(f"{'groupe':>7} {'délai':>6} {'scans/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'erreurs':>8}")
+    for max_batch, delay_ms in CONFIGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            main.DB_FILE = os.path.join(tmp, "bench.db")
+            main.db_pool = main.ConnectionPool(main.DB_FILE)
+            main.scan_writer = main.WriteQueue(main.db_pool, max_batch=max_batch, max_delay_ms=delay_ms)
+            main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+            main.invalidate_hash_cache()
+            main.init_db()
+            seed(size)
+
+            hashes = [main.hash_matricule(f"BM{i:06d}") for i in range(size)]
+            rate, latencies, errors = burst(hashes, clients, duration)
+            p50 = statistics.median(latencies) if latencies else 0
+            p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+            print(f"{max_batch:>7} {delay_ms:>6} {rate:>10.1f} {p50:>8.2f} {p99:>8.2f} {errors:>8}")
+            main.close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--employes", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duree", type=float, default=3)
+    args = parser.parse_args()
+    run(args.employes, args.clients, args.duree)
@@ -0,0 +1,153 @@
+# 🧪 Jeu de données synthétique : employés + plusieurs mois d'historique de présence
+#
+# Usage : python benchmarks/dataset.py --employes 10000 --jours 60 chemin/vers/bench.db
+#
+# Crée une base au schéma courant (migrations.py) puis la remplit comme si
+# l'application avait tourné pendant `jours` jours : deux scans par jour ouvré
+# et par employé présent, une ligne presence_journaliere et les cumuls
+# d'heures sup. pour chaque sortie après 16h. Reproductible à graine égale.
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+import clock  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+NOMS = ["RAKOTO", "RABE", "RASOA", "RANDRIA", "RAZAFY", "ANDRIANA", "RAHARISON", "RAVELO",
+        "RAJAONA", "RATSIMBA", "RAMANANTSOA", "RAKOTONDRABE", "RANDRIAMAMPIANINA", "RAFANOMEZANA"]
+PRENOMS = ["Hery", "Fara", "Tiana", "Mamy", "Lova", "Voahangy", "Haja", "Nirina", "Fenosoa", "Tahina"]
+EMPLOIS = ["GCOR", "CHAUFFEUR", "MAGASINIER", "COMPTABLE", "TECHNICIEN", "AGENT", "SUPERVISEUR"]
+SITES = ["ANTANANARIVO", "TOAMASINA", "MAHAJANGA", "FIANARANTSOA", "TOLIARA", "ANTSIRABE"]
+
+PRESENCE_RATE = 0.92
+ENTRY_FROM, ENTRY_SPREAD = 7 * 60, 90     # arrivées entre 7h00 et 8h30
+EXIT_FROM, EXIT_SPREAD = 15 * 60, 180     # départs entre 15h00 et 18h00
+OVERTIME_FROM = 16 * 60
+OVERTIME_RATE = 10000
+
+
+def matricule(i):
+    return f"BM{i:06d}"
+
+
+def stamp(day, minutes):
+    # (texte d'affichage, secondes UTC) d'une heure du site
+    return f"{day.isoformat()} {minutes // 60:02d}:{minutes % 60:02d}:00", clock.midnight(day) + minutes * 60
+
+
+def working_days(days, end):
+    first = end - timedelta(days=days - 1)
+    return [first + timedelta(days=n) for n in range(days) if (first + timedelta(days=n)).weekday() < 5]
+
+
+def generate(path, employees, days=60, seed=42, end=None):
+    rng = random.Random(seed)
+    end = end or clock.today()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    migrate(conn)
+
+    ids = [matricule(i) for i in range(employees)]
+    # Presence, (entrée, ts), (sortie, ts), minutes HS, montant HS, minutes HS du dernier jour
+    state = {m: [0, None, None, 0, 0, 0] for m in ids}
+
+    for day in working_days(days, end):
+        logs, journees, overtime = [], [], []
+        for m in ids:
+            if rng.random() > PRESENCE_RATE:
+                continue
+            entry = stamp(day, ENTRY_FROM + rng.randrange(ENTRY_SPREAD))
+            exit_minutes = EXIT_FROM + rng.randrange(EXIT_SPREAD)
+            exit_ = stamp(day, exit_minutes)
+            logs.append((m, *entry))
+            logs.append((m, *exit_))
+
+            s = state[m]
+            s[0] += 2
+            s[1], s[2] = entry, exit_
+            ot = exit_minutes - OVERTIME_FROM
+            s[5] = max(0, ot)
+            if ot > 0:
+                amount = int((ot / 60) * OVERTIME_RATE)
+                s[3] += ot
+                s[4] += amount
+                journees.append((m, day.isoformat(), *entry, *exit_, f"{ot // 60}H{ot % 60:02d}", amount))
+                overtime.append((day.isoformat(), m, ot, amount))
+
+        # Ordre chronologique de la journée, comme l'appli les aurait écrits
+        logs.sort(key=lambda r: r[2])
+        conn.executemany("INSERT INTO presence_log (Matricule, date_heure, ts) VALUES (?, ?, ?)", logs)
+        conn.executemany("""
+            INSERT INTO presence_journaliere
+            (Matricule, date, entry_time, entry_ts, exit_time, exit_ts, overtime, overtime_amount)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, sorted(journees, key=lambda r: r[5]))
+        conn.executemany("""
+            INSERT INTO overtime_journalier (date, Matricule, overtime_minutes, overtime_amount)
+            VALUES (?, ?, ?, ?)
+        """, overtime)
+
+    conn.execute("""
+        INSERT INTO overtime_mensuel (mois, Matricule, overtime_minutes, overtime_amount)
+        SELECT substr(date, 1, 7), Matricule, SUM(overtime_minutes), SUM(overtime_amount)
+        FROM overtime_journalier
+        GROUP BY substr(date, 1, 7), Matricule
+    """)
+    conn.executemany("""
+        INSERT INTO gestion_employe
+        (Matricule, Nom, Prenom, Emploi, Affectation, Numero, Mail, matricule_hash, row_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+    """, (
+        (m, rng.choice(NOMS), rng.choice(PRENOMS), rng.choice(EMPLOIS), rng.choice(SITES),
+         f"034{rng.randrange(10**7):07d}", f"{m.lower()}@baobab.com",
+         hashlib.sha256(m.encode()).hexdigest())
+        for m in state
+    ))
+    conn.executemany("""
+        INSERT INTO presence_state
+        (Matricule, Presence, entry_ts, exit_ts, day_overtime_minutes, overtime_minutes, overtime_amount, version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+    """, (
+        (m, s[0], s[1][1], s[2][1], s[5], s[3], s[4])
+        for m, s in state.items() if s[0]
+    ))
+    conn.commit()
+    conn.close()
+
+
+def ensure(directory, employees, days, seed=42):
+    # Réutilise une base déjà générée avec les mêmes paramètres (le même jour)
+    path = os.path.join(directory, f"bench_{employees}_{days}_{seed}_{clock.today().isoformat()}.db")
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+        generate(partial, employees, days, seed)
+        os.replace(partial, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("chemin")
+    parser.add_argument("--employes", type=int, default=1000)
+    parser.add_argument("--jours", type=int, default=60)
+    parser.add_argument("--graine", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    generate(args.chemin, args.employes, args.jours, args.graine)
+    with sqlite3.connect(args.chemin) as conn:
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                  for t in ("gestion_employe", "presence_log", "presence_journaliere")}
+    print(f"✅ {args.chemin} généré en {time.perf_counter() - started:.1f} s : {counts}")
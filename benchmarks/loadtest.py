@@ -0,0 +1,317 @@
+# 🏋️ Test de charge : l'application FastAPI réelle sur des jeux de données synthétiques
+#
+# Usage : python benchmarks/loadtest.py [--tailles 1000,10000,100000] [--jours 60]
+#                                       [--mixes rush,dashboard,logs,mixte] [--clients 32]
+#                                       [--duree 10] [--cache DOSSIER] [--sortie rapport.json]
+#                                       [--comparer ancien_rapport.json]
+#
+# Pour chaque taille, génère (ou réutilise avec --cache) une base via dataset.py,
+# démarre l'app en process (protocole ASGI, lifespan compris : migrations, thread
+# d'écriture) et lance des clients concurrents en boucle fermée selon chaque mix.
+# Le rapport JSON contient débit, p50/p95/p99 et taux d'erreur, global et par route ;
+# --comparer affiche l'écart avec un rapport précédent.
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+LAUNCH_DIR = os.getcwd()  # les chemins passés en argument restent relatifs au dossier d'appel
+BACKEND_DIR = os.path.join(BENCH_DIR, "..", "backend")
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+os.chdir(BACKEND_DIR)  # main.py monte "static" et "templates" en relatif
+
+import main  # noqa: E402
+import dataset  # noqa: E402
+
+
+# 🔌 Client ASGI minimal : les requêtes traversent middlewares, validation et sérialisation
+class AsgiClient:
+    def __init__(self, app):
+        self.app = app
+        self._lifespan = None
+        self._lifespan_queue = None
+
+    async def startup(self):
+        self._lifespan_queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+
+        async def receive():
+            return await self._lifespan_queue.get()
+
+        async def send(message):
+            if message["type"].startswith("lifespan.startup") and not started.done():
+                if message["type"] == "lifespan.startup.failed":
+                    started.set_exception(RuntimeError(message.get("message", "échec du démarrage")))
+                else:
+                    started.set_result(None)
+
+        self._lifespan = asyncio.create_task(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, receive, send))
+        await self._lifespan_queue.put({"type": "lifespan.startup"})
+        await started
+
+    async def shutdown(self):
+        await self._lifespan_queue.put({"type": "lifespan.shutdown"})
+        await self._lifespan
+
+    async def request(self, method, url, headers=None, body=b""):
+        path, _, query = url.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query.encode(),
+            "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+            "client": ("127.0.0.1", 50000),
+            "server": ("bench", 80),
+        }
+        done = asyncio.Event()
+        pending = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {"status": None, "headers": {}, "body": []}
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    done.set()
+
+        await self.app(scope, receive, send)
+        done.set()
+        return response["status"], response["headers"], b"".join(response["body"])
+
+
+# 🎭 Requêtes types, une instance par client virtuel (ETag mémorisé comme un navigateur)
+class VirtualClient:
+    def __init__(self, http, employees, rng):
+        self.http = http
+        self.employees = employees
+        self.rng = rng
+        self.etag = None
+
+    def some_matricule(self):
+        return dataset.matricule(self.rng.randrange(self.employees))
+
+    async def scan(self):
+        h = main.hash_matricule(self.some_matricule())
+        status, _, _ = await self.http.request("POST", f"/api/mark_presence/{h}")
+        return status
+
+    async def dashboard(self):
+        # Le tableau de bord recharge l'annuaire complet ; le cache HTTP renvoie If-None-Match
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        status, response_headers, _ = await self.http.request("GET", "/api/students", headers)
+        self.etag = response_headers.get("etag", self.etag)
+        return status
+
+    async def dashboard_page(self):
+        status, _, _ = await self.http.request("GET", "/api/students?limit=100&present_today=true")
+        return status
+
+    async def logs(self):
+        status, _, _ = await self.http.request("GET", f"/api/logs/{self.some_matricule()}")
+        return status
+
+
+# Poids de chaque requête type dans un mix
+MIXES = {
+    "rush": {"scan": 90, "dashboard": 5, "dashboard_page": 5},
+    "dashboard": {"dashboard": 60, "dashboard_page": 30, "logs": 10},
+    "logs": {"logs": 100},
+    "mixte": {"scan": 40, "dashboard": 20, "dashboard_page": 20, "logs": 20},
+}
+ROUTES = {
+    "scan": "POST /api/mark_presence/{hash}",
+    "dashboard": "GET /api/students",
+    "dashboard_page": "GET /api/students?limit=100&present_today=true",
+    "logs": "GET /api/logs/{matricule}",
+}
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 3)
+
+
+def summarize(latencies, statuses, duration):
+    ordered = sorted(latencies)
+    errors = sum(1 for s in statuses if s is None or s >= 400)
+    return {
+        "requests": len(statuses),
+        "throughput_rps": round(len(statuses) / duration, 1),
+        "errors": errors,
+        "error_rate": round(errors / len(statuses), 4) if statuses else 0,
+        "latency_ms": {
+            "p50": percentile(ordered, 0.50),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": round(ordered[-1], 3) if ordered else None,
+        },
+    }
+
+
+async def run_mix(http, employees, mix, clients, duration, seed):
+    kinds = list(MIXES[mix])
+    weights = [MIXES[mix][k] for k in kinds]
+    samples = {k: ([], []) for k in kinds}  # latences, statuts
+    stop = time.perf_counter() + duration
+
+    async def loop(n):
+        rng = random.Random(seed * 1000 + n)
+        client = VirtualClient(http, employees, rng)
+        while time.perf_counter() < stop:
+            kind = rng.choices(kinds, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = await getattr(client, kind)()
+            except Exception:
+                status = None
+            samples[kind][0].append((time.perf_counter() - start) * 1000)
+            samples[kind][1].append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop(n) for n in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [ms for lat, _ in samples.values() for ms in lat]
+    all_statuses = [s for _, st in samples.values() for s in st]
+    result = summarize(all_latencies, all_statuses, elapsed)
+    result["routes"] = {ROUTES[k]: summarize(lat, st, elapsed) for k, (lat, st) in samples.items() if st}
+    return result
+
+
+async def run_size(path, employees, mixes, clients, duration, seed):
+    main.DB_FILE = path
+    main.db_pool = main.ConnectionPool(path)
+    main.scan_writer = main.WriteQueue(main.db_pool)
+    main.db = main.AsyncDatabase(main.db_pool, main.scan_writer)
+    main.invalidate_hash_cache()
+
+    http = AsgiClient(main.app)
+    await http.startup()
+    results = []
+    try:
+        for mix in mixes:
+            result = await run_mix(http, employees, mix, clients, duration, seed)
+            results.append({"employes": employees, "mix": mix, "clients": clients, **result})
+            print(
+                f"  {employees:>7} {mix:<10} {result['throughput_rps']:>9.1f} req/s"
+                f"  p50={result['latency_ms']['p50']} p95={result['latency_ms']['p95']}"
+                f" p99={result['latency_ms']['p99']} ms  erreurs={result['error_rate']:.2%}",
+                file=sys.stderr,
+            )
+    finally:
+        await http.shutdown()
+    return results
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "date": datetime.now().astimezone().isoformat(timespec="seconds"),
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parametres": {
+            "tailles": args.tailles, "jours": args.jours, "mixes": args.mixes,
+            "clients": args.clients, "duree": args.duree, "graine": args.graine,
+        },
+    }
+
+
+def compare(previous, current):
+    # Écart de débit et de p99 par (taille, mix) : positif = plus rapide / plus lent
+    before = {(r["employes"], r["mix"]): r for r in previous["results"]}
+    print(f"\n{'employés':>9} {'mix':<10} {'débit':>16} {'p99':>22}", file=sys.stderr)
+    for r in current["results"]:
+        old = before.get((r["employes"], r["mix"]))
+        if old is None:
+            continue
+        rate = (r["throughput_rps"] / old["throughput_rps"] - 1) if old["throughput_rps"] else 0
+        p99_old, p99_new = old["latency_ms"]["p99"], r["latency_ms"]["p99"]
+        print(
+            f"{r['employes']:>9} {r['mix']:<10} {rate:>+15.1%} {p99_old!s:>9} → {p99_new!s:<9} ms",
+            file=sys.stderr,
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tailles", default="1000,10000,100000")
+    parser.add_argument("--jours", type=int, default=60)
+    parser.add_argument("--mixes", default=",".join(MIXES))
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duree", type=float, default=10)
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--cache", help="dossier où garder les bases générées entre deux exécutions")
+    parser.add_argument("--sortie", help="fichier JSON du rapport (sinon sortie standard)")
+    parser.add_argument("--comparer", help="rapport JSON précédent à comparer")
+    args = parser.parse_args()
+
+    mixes = args.mixes.split(",")
+    unknown = set(mixes) - MIXES.keys()
+    if unknown:
+        parser.error(f"mix inconnu : {', '.join(sorted(unknown))}")
+
+    for option in ("cache", "sortie", "comparer"):
+        if getattr(args, option):
+            setattr(args, option, os.path.join(LAUNCH_DIR, getattr(args, option)))
+
+    report = {"environment": environment(args), "results": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = args.cache or tmp
+        os.makedirs(cache, exist_ok=True)
+        for size in map(int, args.tailles.split(",")):
+            print(f"📦 jeu de données : {size} employés, {args.jours} jours", file=sys.stderr)
+            source = dataset.ensure(cache, size, args.jours, args.graine)
+            # Les scans écrivent dans la base : on travaille sur une copie jetable
+            work = os.path.join(tmp, "run.db")
+            with sqlite3.connect(source) as src, sqlite3.connect(work) as dst:
+                src.backup(dst)
+            report["results"] += asyncio.run(run_size(work, size, mixes, args.clients, args.duree, args.graine))
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(work + suffix):
+                    os.remove(work + suffix)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.comparer:
+        with open(args.comparer, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -78,6 +78,17 @@ export default function Index() {
     }
   }
 
+  // Les réinitialisations tournent en tâche de fond (202 + job_id) : on attend la fin
+  const waitForJob = async (jobId) => {
+    while (true) {
+      const res = await fetch(`${API_BASE}/api/jobs/${jobId}`)
+      const job = await res.json()
+      if (!res.ok) throw new Error(job.detail || 'Tâche introuvable')
+      if (job.status === 'done' || job.status === 'failed') return job
+      await new Promise((resolve) => setTimeout(resolve, 500))
+    }
+  }
+
   const resetPresence = async () => {
     const pwd = prompt('🔐 Entrez le mot de passe admin')
     if (!pwd) return
@@ -89,10 +100,15 @@ export default function Index() {
       })
       const json = await res.json()
       if (json.status === 'ok') {
-        alert('✅ ' + json.message)
-        loadStudents()
+        const job = await waitForJob(json.job_id)
+        if (job.status === 'done') {
+          alert('✅ Réinitialisation terminée')
+          loadStudents()
+        } else {
+          alert('❌ ' + (job.error || 'Échec de la réinitialisation'))
+        }
       } else {
-        alert('❌ ' + (json.message || 'Erreur inconnue'))
+        alert('❌ ' + (json.message || json.detail || 'Erreur inconnue'))
       }
     } catch (e) {
       alert('❌ Erreur réseau : ' + e.message)
@@ -105,11 +121,15 @@ export default function Index() {
         method: 'POST'
       })
       const json = await res.json()
-      if (json.status === 'ok') {
-        alert('✅ Entrées/Sorties réinitialisées')
-      } else {
+      if (json.status !== 'ok') {
         throw new Error(json.detail || 'Erreur inconnue')
       }
+      const job = await waitForJob(json.job_id)
+      if (job.status !== 'done') {
+        throw new Error(job.error || 'Échec de la réinitialisation')
+      }
+      alert('✅ Entrées/Sorties réinitialisées')
+      loadStudents()
     } catch (err) {
       alert('❌ Erreur : ' + err.message)
     }
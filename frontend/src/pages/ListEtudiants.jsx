@@ -4,11 +4,14 @@ import './ListEtudiants.css'
 
 const API_BASE = process.env.REACT_APP_API_BASE || 'http://localhost:8000'
 const INACTIVITY_LIMIT = 30 * 60 * 1000 // 30 minutes
+const SEARCH_DELAY = 200 // ms entre la dernière frappe et la requête
+const SEARCH_LIMIT = 100
 
 export default function ListEtudiants() {
   const navigate = useNavigate()
   const [students, setStudents] = useState([])
   const [searchTerm, setSearchTerm] = useState('')
+  const [searchResults, setSearchResults] = useState(null)
   const [classFilter, setClassFilter] = useState('')
   const [lastActivity, setLastActivity] = useState(Date.now())
 
@@ -31,6 +34,32 @@ export default function ListEtudiants() {
     }
   }, [])
 
+  // 🔍 Recherche côté serveur (index plein texte) au fil de la frappe, filtrée par poste
+  // côté serveur aussi : le filtre s'applique avant la limite de résultats
+  useEffect(() => {
+    const q = searchTerm.trim()
+    if (!q) {
+      setSearchResults(null)
+      return
+    }
+    const controller = new AbortController()
+    const timer = setTimeout(async () => {
+      try {
+        const params = new URLSearchParams({ q, limit: SEARCH_LIMIT })
+        if (classFilter) params.set('emploi', classFilter)
+        const res = await fetch(`${API_BASE}/api/students/search?${params}`, { signal: controller.signal })
+        const json = await res.json()
+        setSearchResults(json.data || [])
+      } catch (err) {
+        if (err.name !== 'AbortError') alert('Erreur de recherche : ' + err)
+      }
+    }, SEARCH_DELAY)
+    return () => {
+      clearTimeout(timer)
+      controller.abort()
+    }
+  }, [searchTerm, classFilter])
+
   const checkInactivity = () => {
     if (Date.now() - lastActivity > INACTIVITY_LIMIT) {
       alert('Session expirée. Veuillez vous reconnecter.')
@@ -53,14 +82,9 @@ export default function ListEtudiants() {
     }
   }
 
-  const filteredStudents = students.filter((stu) => {
-    const matchesSearch =
-      stu.Matricule.toString().includes(searchTerm) ||
-      stu.Nom.toLowerCase().includes(searchTerm) ||
-      stu.Prenom.toLowerCase().includes(searchTerm)
-    const matchesClass = classFilter === '' || stu.Emploi === classFilter
-    return matchesSearch && matchesClass
-  })
+  const filteredStudents = searchResults ?? students.filter(
+    (stu) => classFilter === '' || stu.Emploi === classFilter
+  )
 
   return (
     <div className="list-page">
@@ -80,7 +104,7 @@ export default function ListEtudiants() {
             type="text"
             placeholder="🔍 Rechercher par nom ou Matricule"
             value={searchTerm}
-            onChange={(e) => setSearchTerm(e.target.value.toLowerCase())}
+            onChange={(e) => setSearchTerm(e.target.value)}
           />
           <select value={classFilter} onChange={(e) => setClassFilter(e.target.value)}>
             <option value="">Toutes les postes</option>